@@ -2,30 +2,110 @@
 Database setup with SQLite and SQLModel
 """
 from sqlmodel import SQLModel, create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./dailycook.db")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Engine profile: "sqlite" (WAL, a read-only pool and one serialized writer connection) or
+# "default" (driver defaults, one pool for reads and writes). Chosen from the URL if unset.
+DB_PROFILE = os.getenv("DB_PROFILE", "")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+# Seconds a write waits for the writer connection before failing
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "30"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # per connection
 
+def default_profile(url: str) -> str:
+    """sqlite for file databases, default for everything else (including :memory:)"""
+    return "sqlite" if url.startswith("sqlite") and ":memory:" not in url else "default"
+
+def _sqlite_pragmas(read_only: bool):
+    """Connect hook applying the sqlite profile's pragmas to every new connection"""
+    pragmas = [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA synchronous=NORMAL",  # durable across crashes in WAL mode, fsync at checkpoints only
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    # WAL lets readers run alongside the writer; it is stored in the file, so the writer sets it
+    pragmas.insert(0, "PRAGMA query_only=ON" if read_only else "PRAGMA journal_mode=WAL")
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+def create_engines(url: str = DATABASE_URL, profile: str = "") -> tuple[AsyncEngine, AsyncEngine]:
+    """(writer, reader) engines for a profile; the same engine twice when reads are not split"""
+    profile = profile or default_profile(url)
+    if profile == "default":
+        engine = create_async_engine(url, echo=False)
+        return engine, engine
+    if profile != "sqlite":
+        raise ValueError(f"Unknown DB_PROFILE {profile!r} (expected sqlite or default)")
+
+    connect_args = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    # One connection: writes queue in the pool instead of failing with "database is locked"
+    writer = create_async_engine(
+        url, echo=False, pool_size=1, max_overflow=0, pool_timeout=DB_WRITE_TIMEOUT, connect_args=connect_args
+    )
+    reader = create_async_engine(
+        url, echo=False, pool_size=DB_READ_POOL_SIZE, max_overflow=0, connect_args=connect_args
+    )
+    event.listen(writer.sync_engine, "connect", _sqlite_pragmas(read_only=False))
+    event.listen(reader.sync_engine, "connect", _sqlite_pragmas(read_only=True))
+    return writer, reader
+
+engine, read_engine = create_engines(DATABASE_URL, DB_PROFILE)
+
+# Writes (and reads that must see them in the same transaction)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+# Read-only requests
+read_session = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 async def create_db_and_tables():
-    """Create all database tables"""
+    """Create all database tables and apply pending migrations"""
     from models.history import CookingHistory  # Import to register models
     from models.user import User, UserProfile  # Auth models
-    from models.meal_log import MealLog  # Meal logging
+    from models.meal_log import MealLog, MealLogItem  # Meal logging
+    from models.daily_nutrition import DailyNutrition  # Daily nutrition rollups
     from models.favorite import Favorite  # Favorites
     from models.goal import Goal  # Goals
     from models.recipe_counts import RecipeCounts  # Recipe counts
+    from models.generation_cache import GenerationCacheEntry  # AI generation cache
+    from models.ai_recipe import StoredAIRecipe  # Generated recipes
+    from models.daily_recommendation import DailyRecommendation  # Recommendations of the day
+    from models.ai_job import AIJob  # Queued AI generations
+    from migrations import run_migrations
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        applied = await conn.run_sync(run_migrations)
+    if applied:
+        print(f"Applied migrations: {', '.join(applied)}")
 
 async def get_session():
     """Dependency for getting database session"""
     async with async_session() as session:
         yield session
+
+async def get_read_session():
+    """Dependency for routes that only read (served by the read pool)"""
+    async with read_session() as session:
+        yield session
+
+async def dispose_engines():
+    """Close pooled connections (called on app shutdown)"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
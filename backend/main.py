@@ -7,7 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
 
-from routes import fridge, fitness, cuisine, drinks, daily, history, ai, auth, meals, favorites, goals, dashboard, admin
+from routes import fridge, fitness, cuisine, drinks, daily, history, ai, auth, meals, favorites, goals, dashboard, admin, jobs
 from database import create_db_and_tables
 from dotenv import load_dotenv
 
@@ -32,10 +32,35 @@ async def lifespan(app: FastAPI):
         redis = aioredis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), encoding="utf8", decode_responses=True)
         await redis.ping()  # Test connection
         FastAPICache.init(RedisBackend(redis), prefix="dailycook-cache")
+        
+        # Share AI generations across workers through Redis as well
+        from services.generation_cache import generation_cache
+        generation_cache.use_redis(redis)
         print("Redis cache initialized")
     except Exception as e:
         print(f"Redis not available, running without cache: {e}")
+    
+    # Pre-generate recommendations of the day now and after every midnight
+    from services.daily_recommendations import daily_recommendations
+    if os.getenv("GEMINI_API_KEY") and os.getenv("DAILY_PREGENERATE", "1") != "0":
+        from services.ai_service import warm_recommendations_of_day
+        daily_recommendations.start(lambda: warm_recommendations_of_day(
+            fitness.FITNESS_GOALS, cuisine.SUPPORTED_CUISINES, drinks.DRINK_CATEGORIES
+        ))
+    
+    # Run queued AI jobs in this process (set AI_JOB_WORKERS=0 when scripts/run_ai_worker.py does)
+    from services.job_queue import job_queue
+    job_queue.start()
     yield
+    
+    await job_queue.stop()
+    await daily_recommendations.stop()
+    from services.ai_service import shutdown_executor
+    shutdown_executor()
+    from services.clerk_auth import jwks_cache
+    await jwks_cache.aclose()
+    from database import dispose_engines
+    await dispose_engines()
 
 limiter = Limiter(key_func=get_remote_address)
 
@@ -78,6 +103,7 @@ app.include_router(drinks.router, prefix="/api/drinks", tags=["Drinks"])
 app.include_router(daily.router, prefix="/api/daily", tags=["Recipe of the Day"])
 app.include_router(history.router, prefix="/api/history", tags=["History"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI Generation"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["AI Jobs"])
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(meals.router, prefix="/api/meals", tags=["Meal Logging"])
 app.include_router(favorites.router, prefix="/api/favorites", tags=["Favorites"])
@@ -0,0 +1,177 @@
+"""
+Versioned schema migrations
+create_all only creates missing tables, so changes to existing tables (indexes, data fixes)
+are written here. Each migration runs once per database, in order, and is recorded in
+schema_migrations. Migrations must also be safe on a fresh database, where create_all has
+already built the tables from the current models.
+"""
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, inspect, select, text
+from sqlmodel import SQLModel
+import json
+import os
+import time
+
+# Rows read per batch when moving data between tables (memory stays constant)
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+
+# Kept out of SQLModel.metadata so create_all and the models never see it
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", Float, nullable=False),  # epoch seconds
+)
+
+# (version, name, function taking a sync connection), in version order
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    """Register a migration; versions must be unique and increasing"""
+    def register(fn):
+        assert not MIGRATIONS or version > MIGRATIONS[-1][0], "migration versions must increase"
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+def _create_indexes(conn, table_name: str, *names: str):
+    """Create indexes declared on a model, if they do not exist yet"""
+    for index in SQLModel.metadata.tables[table_name].indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+def _drop_indexes(conn, *names: str):
+    for name in names:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+# ============= MIGRATIONS =============
+
+@migration(1, "meal_logs_user_logged_at")
+def _meal_logs_user_logged_at(conn):
+    _create_indexes(conn, "meal_logs", "ix_meal_logs_user_logged_at")
+    _drop_indexes(conn, "ix_meal_logs_user_id")  # prefix of the composite index
+
+@migration(2, "goals_user_active_kind")
+def _goals_user_active_kind(conn):
+    _create_indexes(conn, "goals", "ix_goals_user_active_kind")
+    _drop_indexes(conn, "ix_goals_user_id")
+
+@migration(3, "favorites_unique_user_recipe")
+def _favorites_unique_user_recipe(conn):
+    # Keep the first of any duplicates saved before the check-then-insert race was closed
+    conn.exec_driver_sql(
+        "DELETE FROM favorites WHERE id NOT IN (SELECT MIN(id) FROM favorites GROUP BY user_id, recipe_id)"
+    )
+    _create_indexes(conn, "favorites", "ix_favorites_user_recipe")
+    _drop_indexes(conn, "ix_favorites_user_id")
+
+@migration(4, "cooking_history_date_cooked")
+def _cooking_history_date_cooked(conn):
+    _create_indexes(conn, "cooking_history", "ix_cooking_history_date_cooked")
+
+@migration(5, "users_created_at")
+def _users_created_at(conn):
+    _create_indexes(conn, "users", "ix_users_created_at")
+
+@migration(6, "meal_items")
+def _meal_items(conn):
+    """Move the JSON items of every meal into meal_items, then drop meal_logs.items"""
+    from models.meal_log import MealLogItem, food_key
+    
+    MealLogItem.__table__.create(conn, checkfirst=True)
+    if "items" not in {column["name"] for column in inspect(conn).get_columns("meal_logs")}:
+        return  # created without the column
+    
+    # Plain text statements: values are copied as stored, without the ORM's type conversions
+    read = text("SELECT id, user_id, logged_at, items FROM meal_logs WHERE id > :last ORDER BY id LIMIT :limit")
+    write = text(
+        "INSERT INTO meal_items (meal_id, user_id, logged_at, position, food_name, label, grams, quantity, "
+        "calories, protein_g, carbs_g, fats_g) VALUES (:meal_id, :user_id, :logged_at, :position, :food_name, "
+        ":label, :grams, :quantity, :calories, :protein_g, :carbs_g, :fats_g)"
+    )
+    last = 0
+    while True:
+        meals = conn.execute(read, {"last": last, "limit": MIGRATION_BATCH_SIZE}).all()
+        if not meals:
+            break
+        # Items were documented as {food_item, ...} before the API settled on food_name
+        rows = [
+            {
+                "meal_id": meal.id,
+                "user_id": meal.user_id,
+                "logged_at": meal.logged_at,
+                "position": position,
+                "food_name": food_key(item.get("food_name") or item.get("food_item") or ""),
+                "label": item.get("food_name") or item.get("food_item") or "",
+                "grams": item.get("grams"),
+                "quantity": item.get("quantity"),
+                "calories": item.get("calories", 0),
+                "protein_g": item.get("protein_g", 0),
+                "carbs_g": item.get("carbs_g", 0),
+                "fats_g": item.get("fats_g", 0),
+            }
+            for meal in meals
+            for position, item in enumerate(json.loads(meal.items or "[]"))
+        ]
+        if rows:
+            conn.execute(write, rows)
+        last = meals[-1].id
+    
+    conn.exec_driver_sql("ALTER TABLE meal_logs DROP COLUMN items")
+
+@migration(7, "daily_nutrition")
+def _daily_nutrition(conn):
+    """Backfill the daily rollups from existing meals"""
+    from models.daily_nutrition import DailyNutrition
+    from services.daily_nutrition import daily_nutrition
+    
+    DailyNutrition.__table__.create(conn, checkfirst=True)
+    daily_nutrition.rebuild(conn)
+
+@migration(8, "daily_nutrition_local_days")
+def _daily_nutrition_local_days(conn):
+    """Re-key the rollups from UTC days to each user's local days"""
+    from services.daily_nutrition import daily_nutrition
+    
+    daily_nutrition.rebuild(conn)
+
+@migration(9, "ai_jobs_active_key")
+def _ai_jobs_active_key(conn):
+    """Fail active duplicates submitted before deduplication was enforced, keeping the oldest"""
+    from models.ai_job import AIJob
+    
+    AIJob.__table__.create(conn, checkfirst=True)
+    conn.execute(
+        text(
+            "UPDATE ai_jobs SET status = 'failed', error = 'Duplicate submission', finished_at = :now "
+            "WHERE status IN ('queued', 'running') AND EXISTS (SELECT 1 FROM ai_jobs AS other "
+            "WHERE other.kind = ai_jobs.kind AND other.key = ai_jobs.key AND other.status IN ('queued', 'running') "
+            "AND (other.created_at < ai_jobs.created_at OR (other.created_at = ai_jobs.created_at AND other.id < ai_jobs.id)))"
+        ),
+        {"now": time.time()}
+    )
+    _create_indexes(conn, "ai_jobs", "ix_ai_jobs_active_key")
+
+@migration(10, "users_clerk_id")
+def _users_clerk_id(conn):
+    """Add users.clerk_id (Clerk sign-in) to tables created before it, with its unique index"""
+    from models.user import User
+    
+    if "clerk_id" not in {column["name"] for column in inspect(conn).get_columns("users")}:
+        column = User.__table__.c.clerk_id
+        conn.exec_driver_sql(f"ALTER TABLE users ADD COLUMN clerk_id {column.type.compile(conn.dialect)}")
+    _create_indexes(conn, "users", "ix_users_clerk_id")
+
+# ============= RUNNER =============
+
+def run_migrations(conn) -> list[str]:
+    """Apply pending migrations inside the caller's transaction; returns the names applied"""
+    schema_migrations.create(conn, checkfirst=True)
+    done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version in done:
+            continue
+        fn(conn)
+        conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=time.time()))
+        applied.append(name)
+    return applied
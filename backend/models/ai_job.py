@@ -0,0 +1,51 @@
+"""
+Queued AI generation jobs
+"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+from typing import Optional
+import json
+import time
+
+
+class AIJob(SQLModel, table=True):
+    """One AI generation submitted through /api/jobs and run by a queue worker"""
+    __tablename__ = "ai_jobs"
+    __table_args__ = (
+        # Claim query: next queued job by priority, then age
+        Index("ix_ai_jobs_queue", "status", "priority", "created_at"),
+        # At most one queued or running job per generation, however many processes submit
+        Index(
+            "ix_ai_jobs_active_key", "kind", "key", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')")
+        ),
+    )
+
+    id: str = Field(primary_key=True, max_length=32)
+    kind: str  # fridge
+    key: str = Field(index=True, max_length=64)  # generation-cache key, deduplicates submissions
+    owner: str = Field(index=True)  # "user:<id>" or "ip:<address>", for per-user fairness
+    priority: int = Field(default=0)  # higher runs first
+
+    # Handler arguments and result as JSON
+    params: str
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+    status: str = Field(default="queued")  # queued, running, done, failed
+    attempts: int = Field(default=0)
+    worker: Optional[str] = None  # process and task running the job
+
+    # Epoch seconds
+    created_at: float = Field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def get_params(self) -> dict:
+        """Parse params JSON"""
+        return json.loads(self.params)
+
+    def get_result(self) -> Optional[dict]:
+        """Parse result JSON"""
+        return json.loads(self.result) if self.result else None
@@ -0,0 +1,25 @@
+"""
+Stored AI-generated recipes, addressed by content hash
+"""
+from sqlmodel import SQLModel, Field
+import json
+import time
+
+
+class StoredAIRecipe(SQLModel, table=True):
+    """AI or fallback recipe served by /recipe/{id} after generation"""
+    __tablename__ = "ai_recipes"
+
+    id: str = Field(primary_key=True, max_length=100)
+    content_hash: str = Field(unique=True, index=True, max_length=64)
+
+    # Full Recipe as JSON
+    payload: str
+
+    # Epoch seconds; last_seen_at drives pruning of the table
+    created_at: float = Field(default_factory=time.time)
+    last_seen_at: float = Field(default_factory=time.time, index=True)
+
+    def get_payload(self) -> dict:
+        """Parse payload JSON"""
+        return json.loads(self.payload)
@@ -0,0 +1,20 @@
+"""
+Per-user daily nutrition rollups
+"""
+from sqlmodel import SQLModel, Field
+from datetime import date
+
+
+class DailyNutrition(SQLModel, table=True):
+    """A user's nutrition totals for one day, kept in step with meal_logs"""
+    __tablename__ = "daily_nutrition"
+
+    # Primary key order serves range reads of one user's days
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    day: date = Field(primary_key=True)
+
+    calories: int = Field(default=0)
+    protein_g: float = Field(default=0.0)
+    carbs_g: float = Field(default=0.0)
+    fats_g: float = Field(default=0.0)
+    meals_count: int = Field(default=0)
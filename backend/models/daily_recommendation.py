@@ -0,0 +1,30 @@
+"""
+Recommendation of the day, generated once per subject per day
+"""
+from sqlmodel import SQLModel, Field
+from typing import Optional
+import json
+import time
+
+
+class DailyRecommendation(SQLModel, table=True):
+    """One pre-generated fitness/cuisine/drink pick for a given day"""
+    __tablename__ = "daily_recommendations"
+
+    # "{kind}:{subject}:{day}", e.g. "fitness:muscle_gain:2025-01-31"
+    id: str = Field(primary_key=True, max_length=100)
+    kind: str = Field(index=True)  # fitness, cuisine, drink
+    subject: str  # goal, cuisine or drink category
+    day: str = Field(index=True)  # UTC date, YYYY-MM-DD
+
+    # Recipe or drink JSON; empty while the generating worker holds the claim
+    payload: Optional[str] = None
+    source: str = Field(default="ai")  # ai, previous, catalog
+
+    # Epoch seconds; claimed_at lets another worker take over an abandoned claim
+    claimed_at: float = Field(default_factory=time.time)
+    created_at: float = Field(default_factory=time.time)
+
+    def get_payload(self) -> Optional[dict]:
+        """Parse payload JSON"""
+        return json.loads(self.payload) if self.payload else None
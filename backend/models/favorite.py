@@ -2,6 +2,7 @@
 Favorite model for saving favorite recipes
 """
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime
 
@@ -9,9 +10,11 @@ from datetime import datetime
 class Favorite(SQLModel, table=True):
     """Database model for favorite recipes"""
     __tablename__ = "favorites"
+    # A recipe is favorited at most once per user
+    __table_args__ = (Index("ix_favorites_user_recipe", "user_id", "recipe_id", unique=True),)
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id", index=True)
+    user_id: int = Field(foreign_key="users.id")
     recipe_id: str = Field(index=True)
     recipe_name: str
     recipe_type: str = Field(default="recipe")  # recipe or drink
@@ -0,0 +1,29 @@
+"""
+Generation cache model for persisting AI-generated recipes
+"""
+from sqlmodel import SQLModel, Field
+import json
+import time
+
+
+class GenerationCacheEntry(SQLModel, table=True):
+    """Cached AI generation results, keyed by a hash of the normalized request"""
+    __tablename__ = "ai_generation_cache"
+
+    key: str = Field(primary_key=True, max_length=64)
+    kind: str = Field(index=True)  # recipe, fitness, cuisine, drink
+
+    # Generated payloads (JSON array, one entry per cached variant)
+    variants: str = Field(default="[]")
+
+    # Epoch seconds, so expiry checks are plain numeric comparisons
+    created_at: float = Field(default_factory=time.time)
+    expires_at: float = Field(index=True)
+
+    def get_variants(self) -> list:
+        """Parse variants JSON"""
+        return json.loads(self.variants) if self.variants else []
+
+    def set_variants(self, variants: list):
+        """Set variants as JSON"""
+        self.variants = json.dumps(variants)
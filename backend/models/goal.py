@@ -2,6 +2,7 @@
 Goal model for user nutrition/fitness goals
 """
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime, date
 from enum import Enum
@@ -19,9 +20,11 @@ class GoalKind(str, Enum):
 class Goal(SQLModel, table=True):
     """Database model for user goals"""
     __tablename__ = "goals"
+    # A user's active goals, optionally of one kind
+    __table_args__ = (Index("ix_goals_user_active_kind", "user_id", "is_active", "kind"),)
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id", index=True)
+    user_id: int = Field(foreign_key="users.id")
     
     kind: str  # calorie, protein, carbs, fats, weight
     target_value: float  # Target value (e.g., 2000 calories, 150g protein)
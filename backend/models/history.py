@@ -13,7 +13,7 @@ class CookingHistory(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     recipe_id: str
     recipe_name: str
-    date_cooked: datetime = Field(default_factory=datetime.utcnow)
+    date_cooked: datetime = Field(default_factory=datetime.utcnow, index=True)
     ingredients_used: str  # JSON string of ingredients
     calories: int
     protein_g: int
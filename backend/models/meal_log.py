@@ -2,10 +2,14 @@
 MealLog model for tracking daily food intake
 """
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-import json
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
 
 
 class MealType(str, Enum):
@@ -18,16 +22,15 @@ class MealType(str, Enum):
 class MealLog(SQLModel, table=True):
     """Database model for meal logging"""
     __tablename__ = "meal_logs"
+    # A user's meals in a time range (today, trends, goal progress)
+    __table_args__ = (Index("ix_meal_logs_user_logged_at", "user_id", "logged_at"),)
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id", index=True)
-    logged_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    user_id: int = Field(foreign_key="users.id")
+    logged_at: datetime = Field(default_factory=_utcnow, index=True)
     meal_type: str = Field(default="snack")  # breakfast, lunch, dinner, snack
     
-    # Items logged (JSON array of {food_item, grams, calories, protein_g, carbs_g, fats_g})
-    items: str = Field(default="[]")
-    
-    # Totals (computed from items)
+    # Totals (computed from the meal's items, stored in meal_items)
     calories_total: int = Field(default=0)
     protein_total: float = Field(default=0.0)
     carbs_total: float = Field(default=0.0)
@@ -37,21 +40,74 @@ class MealLog(SQLModel, table=True):
     notes: Optional[str] = None
     photo_url: Optional[str] = None
     
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
     
-    def get_items(self) -> list:
-        """Parse items JSON"""
-        return json.loads(self.items) if self.items else []
-    
-    def set_items(self, items_list: list):
-        """Set items as JSON and compute totals"""
-        self.items = json.dumps(items_list)
-        # Compute totals
+    def set_items(self, items_list: list) -> list["MealLogItem"]:
+        """Compute totals and build the item rows (meal_id is set once the meal has an id)"""
         self.calories_total = sum(item.get("calories", 0) for item in items_list)
         self.protein_total = sum(item.get("protein_g", 0) for item in items_list)
         self.carbs_total = sum(item.get("carbs_g", 0) for item in items_list)
         self.fats_total = sum(item.get("fats_g", 0) for item in items_list)
+        return [
+            MealLogItem.from_item(item, user_id=self.user_id, logged_at=self.logged_at, position=position)
+            for position, item in enumerate(items_list)
+        ]
+
+
+def food_key(name: str) -> str:
+    """Normalized food name used to group intake ("Paneer " and "paneer" are one food)"""
+    return " ".join(name.lower().split())
+
+
+class MealLogItem(SQLModel, table=True):
+    """One food in a logged meal"""
+    __tablename__ = "meal_items"
+    # Intake of one food over time ("how much paneer this month"), and top foods per user
+    __table_args__ = (Index("ix_meal_items_user_food_logged_at", "user_id", "food_name", "logged_at"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    meal_id: int = Field(foreign_key="meal_logs.id", index=True)
+    # Copied from the meal so per-food queries need no join
+    user_id: int = Field(foreign_key="users.id")
+    logged_at: datetime
+    position: int = Field(default=0)  # order within the meal
+    
+    food_name: str  # food_key of the name
+    label: str  # name as logged
+    grams: Optional[float] = None
+    quantity: Optional[str] = None
+    calories: int = Field(default=0)
+    protein_g: float = Field(default=0.0)
+    carbs_g: float = Field(default=0.0)
+    fats_g: float = Field(default=0.0)
+    
+    @classmethod
+    def from_item(cls, item: dict, **fields) -> "MealLogItem":
+        """Build a row from a MealItem dict"""
+        return cls(
+            food_name=food_key(item["food_name"]),
+            label=item["food_name"],
+            grams=item.get("grams"),
+            quantity=item.get("quantity"),
+            calories=item.get("calories", 0),
+            protein_g=item.get("protein_g", 0),
+            carbs_g=item.get("carbs_g", 0),
+            fats_g=item.get("fats_g", 0),
+            **fields
+        )
+    
+    def to_item(self) -> dict:
+        """The MealItem dict returned by the API"""
+        return {
+            "food_name": self.label,
+            "grams": self.grams,
+            "quantity": self.quantity,
+            "calories": self.calories,
+            "protein_g": self.protein_g,
+            "carbs_g": self.carbs_g,
+            "fats_g": self.fats_g
+        }
 
 
 # Request/Response models
@@ -88,6 +144,19 @@ class MealLogResponse(SQLModel):
     notes: Optional[str]
 
 
+class FoodIntake(SQLModel):
+    """How much of one food a user logged in a period"""
+    food_name: str
+    times_logged: int
+    grams: float  # items logged by quantity only add nothing here
+    calories: int
+    protein_g: float
+    carbs_g: float
+    fats_g: float
+    first_logged_at: Optional[datetime] = None
+    last_logged_at: Optional[datetime] = None
+
+
 class DailySummary(SQLModel):
     """Daily nutrition summary"""
     date: str
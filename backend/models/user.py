@@ -26,12 +26,13 @@ class User(SQLModel, table=True):
     __tablename__ = "users"
     
     id: Optional[int] = Field(default=None, primary_key=True)
+    clerk_id: Optional[str] = Field(default=None, unique=True, index=True)  # Clerk user id (token 'sub')
     email: str = Field(unique=True, index=True)
     hashed_password: str
     is_active: bool = Field(default=True)
     is_verified: bool = Field(default=False)
     is_admin: bool = Field(default=False)  # Admin flag
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Relationship
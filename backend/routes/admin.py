@@ -4,15 +4,16 @@ Admin routes for managing users and system data
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, func
-from datetime import datetime, date, timedelta
 
-from database import get_session
+from database import get_read_session, get_session
 from models.user import User, UserProfile, UserResponse
 from models.meal_log import MealLog
 from models.favorite import Favorite
 from models.goal import Goal
 from models.history import CookingHistory
 from services.auth_service import get_current_user_required
+from services.clerk_auth import claims_cache, identity_cache, jwks_cache
+from services.day_window import UTC, day_window, local_today
 
 router = APIRouter()
 
@@ -30,7 +31,7 @@ async def require_admin(current_user: User = Depends(get_current_user_required))
 @router.get("/stats")
 async def get_admin_stats(
     admin: User = Depends(require_admin),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get system statistics"""
     # User count
@@ -54,8 +55,7 @@ async def get_admin_stats(
     total_history = history_result.scalar_one()
     
     # Today's new users
-    today = date.today()
-    start_of_day = datetime.combine(today, datetime.min.time())
+    start_of_day, _ = day_window(local_today(UTC), UTC)
     today_users_result = await session.execute(
         select(func.count(User.id)).where(User.created_at >= start_of_day)
     )
@@ -68,7 +68,12 @@ async def get_admin_stats(
         "total_goals": total_goals,
         "total_history": total_history,
         "today_new_users": today_users,
-        "admin_email": admin.email
+        "admin_email": admin.email,
+        "auth": {
+            "jwks": jwks_cache.snapshot(),
+            "claims": claims_cache.snapshot(),
+            "identity": identity_cache.snapshot()
+        }
     }
 
 
@@ -77,7 +82,7 @@ async def list_users(
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
     admin: User = Depends(require_admin),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """List all users (admin only)"""
     result = await session.execute(
@@ -134,6 +139,7 @@ async def toggle_user_admin(
     
     user.is_admin = not user.is_admin
     await session.commit()
+    identity_cache.invalidate(user.clerk_id)
     
     return {"message": f"User {user.email} admin status: {user.is_admin}"}
 
@@ -168,5 +174,6 @@ async def delete_user(
     
     await session.delete(user)
     await session.commit()
+    identity_cache.invalidate(user.clerk_id)
     
     return {"message": f"User {user.email} deleted"}
@@ -3,6 +3,7 @@ AI-powered Recipe Generation Routes
 Generate recipes using Gemini AI
 """
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import os
@@ -31,10 +32,33 @@ class AIRecipeResponse(BaseModel):
 @router.get("/status")
 async def ai_status():
     """Check if AI features are available"""
+    from services.ai_service import (
+        AI_PROVIDER, ai_breaker, batch_stats, fridge_index, generation_flight, generation_stats, hedge_stats
+    )
+    from services.generation_cache import generation_cache
+    from services.daily_recommendations import daily_recommendations
+    from services.job_queue import job_queue
+    from services.nutrition import nutrition_table
+    
     available = is_ai_available()
+    provider = {"name": AI_PROVIDER}
+    if AI_PROVIDER == "fake":
+        from services.fake_model import get_fake_model
+        provider.update(get_fake_model().stats)
     return {
         "ai_available": available,
-        "message": "AI features enabled" if available else "Set GEMINI_API_KEY to enable AI features"
+        "message": "AI features enabled" if available else "Set GEMINI_API_KEY to enable AI features",
+        "provider": provider,
+        "generation": generation_stats.snapshot(),
+        "circuit": ai_breaker.snapshot(),
+        "cache": generation_cache.snapshot(),
+        "similar_fridges": fridge_index.snapshot(),
+        "coalescing": generation_flight.snapshot(),
+        "latency_budget": dict(hedge_stats),
+        "batching": dict(batch_stats),
+        "daily": daily_recommendations.snapshot(),
+        "jobs": job_queue.snapshot(),
+        "nutrition": nutrition_table.snapshot()
     }
 
 @router.post("/generate", response_model=AIRecipeResponse)
@@ -87,6 +111,59 @@ async def generate_ai_recipe(request: AIRecipeRequest):
         message=f"AI-generated recipe using: {', '.join(ingredients)}"
     )
 
+@router.post("/generate/stream")
+async def stream_ai_recipe(request: AIRecipeRequest):
+    """
+    Streaming variant of /generate using server-sent events.
+    
+    Emits a "field" event as each recipe field completes, then "recipe" with the
+    full stored recipe, or "error" if generation fails, and finally "done" with
+    ok (false after an error).
+    """
+    if not is_ai_available():
+        raise HTTPException(
+            status_code=503,
+            detail="AI features not available. Set GEMINI_API_KEY environment variable."
+        )
+    
+    from services.ai_service import stream_recipe_with_ai
+    from services.ai_recipe_store import ai_recipe_store
+    from services.normalizer import normalizer
+    from services.streaming import format_sse
+    
+    ingredients = normalizer.parse_input(request.ingredients)
+    
+    if not ingredients:
+        raise HTTPException(
+            status_code=400,
+            detail="Please provide at least one ingredient"
+        )
+    
+    async def events():
+        ok = False
+        async for event, data in stream_recipe_with_ai(
+            ingredients=ingredients,
+            diet=request.diet,
+            cuisine=request.cuisine,
+            goal=request.goal
+        ):
+            if event == "recipe":
+                recipe = await ai_recipe_store.save(data)
+                ok = True
+                yield format_sse("recipe", recipe.model_dump())
+            else:
+                yield format_sse(event, data)
+        if ok:
+            yield format_sse("done", {"ok": True, "message": f"AI-generated recipe using: {', '.join(ingredients)}"})
+        else:
+            yield format_sse("done", {"ok": False})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/substitute")
 async def suggest_substitutes(
     missing: str,
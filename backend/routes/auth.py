@@ -6,15 +6,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 import os
 
-from database import get_session
+from database import get_read_session, get_session
 from models.user import User, UserProfile, UserCreate, UserProfileResponse, UserProfileUpdate
-from services.clerk_auth import verify_clerk_token
+from services.clerk_auth import get_user_from_clerk_token, verify_clerk_token
+from services.daily_nutrition import daily_nutrition
+from services.day_window import is_timezone
 
 router = APIRouter()
 
 async def get_current_user(
     request: Request,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ) -> User:
     """
     Dependency to get current user from Clerk Token
@@ -31,50 +33,16 @@ async def get_current_user(
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
         
-    # 2. Sync User with local DB
-    # Clerk 'sub' is the User ID
-    clerk_id = claims.get("sub")
-    email = claims.get("email") # Note: might need to parse emails claim if complex
-    
-    # Fallback if email not in top level claims (Clerk implementation varies)
-    # Usually we get user info from Clerk API if needed, but for MVP trust token
-    
-    # Check if user exists by Clerk ID (or Email as fallback)
-    # Ideally add clerk_id to User model. For now, we reuse 'email' if available.
-    
-    if not email:
-        # Try to find email in other claims or error
-        # Assuming MVP setup for now
-        pass 
-
-    # Find user
-    statement = select(User).where(User.email == email) # Using email for now
-    result = await session.execute(statement)
-    user = result.scalar_one_or_none()
-    
+    # 2. Sync User with local DB (Clerk 'sub' is the User ID)
+    user = await get_user_from_clerk_token(session, claims)
     if not user:
-        # Create new user
-        user = User(
-            email=email,
-            hashed_password="CLERK_AUTH_NO_PASSWORD",
-            is_active=True,
-            is_verified=True
-        )
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-        
-        # Create Profile
-        profile = UserProfile(user_id=user.id, name="New User")
-        session.add(profile)
-        await session.commit()
-        
+        raise HTTPException(status_code=401, detail="Unknown user")
     return user
 
 @router.get("/me", response_model=UserProfileResponse)
 async def get_current_profile(
     current_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get current user's profile"""
     result = await session.execute(
@@ -118,6 +86,9 @@ async def update_profile(
     
     # Update fields
     update_data = profile_data.model_dump(exclude_unset=True)
+    if update_data.get("timezone") is not None and not is_timezone(update_data["timezone"]):
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+    timezone_changed = update_data.get("timezone") not in (None, profile.timezone)
     
     for field, value in update_data.items():
         if field == "dietary_preferences" and value is not None:
@@ -127,6 +98,11 @@ async def update_profile(
         else:
             setattr(profile, field, value)
     
+    if timezone_changed:
+        # Daily rollups are keyed by local day, so re-bucket this user's meals
+        await session.flush()
+        await (await session.connection()).run_sync(daily_nutrition.rebuild, current_user.id)
+    
     await session.commit()
     await session.refresh(profile)
     
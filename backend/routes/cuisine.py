@@ -8,6 +8,7 @@ from typing import Optional, Literal
 import os
 
 from services.recipe_engine import recipe_engine
+from services.ai_recipe_store import ai_recipe_store
 from models.recipe import RecipeCard, Recipe
 
 router = APIRouter()
@@ -52,10 +53,21 @@ async def get_cuisine_recipes(
     # Generate AI recommendation if enabled
     if include_ai and os.getenv("GEMINI_API_KEY"):
         try:
-            from services.ai_service import generate_cuisine_recipe
+            from services.ai_service import generate_cuisine_recipe, get_cuisine_recommendation_of_day
             
-            ai_recipe = await generate_cuisine_recipe(cuisine=cuisine, diet=diet)
+            # Without a diet filter, serve the pre-generated pick of the day
+            if diet is None and cuisine in SUPPORTED_CUISINES:
+                daily = await get_cuisine_recommendation_of_day(cuisine)
+                ai_recipe = daily["recipe"] if daily else None
+                source = daily["source"] if daily else None
+            else:
+                ai_recipe = await generate_cuisine_recipe(cuisine=cuisine, diet=diet)
+                source = "ai"
             if ai_recipe:
+                # Store for later retrieval (catalog picks already resolve by id)
+                if source != "catalog":
+                    ai_recipe = await ai_recipe_store.save(ai_recipe)
+                
                 # Convert to RecipeCard format
                 ai_card = RecipeCard(
                     id=ai_recipe.id,
@@ -69,9 +81,6 @@ async def get_cuisine_recipes(
                     servings=ai_recipe.servings
                 )
                 
-                # Store for later retrieval
-                recipe_engine._ai_recipes[ai_recipe.id] = ai_recipe
-                
                 ai_recommendation = {
                     "recipe": ai_card.model_dump(),
                     "cultural_note": getattr(ai_recipe, 'cultural_note', f"Explore authentic {cuisine} flavors!"),
@@ -105,16 +114,25 @@ async def get_cuisine_recommendation(
         cuisine = "Global"
     
     try:
-        from services.ai_service import generate_cuisine_recipe
+        from services.ai_service import generate_cuisine_recipe, get_cuisine_recommendation_of_day
         
-        recipe = await generate_cuisine_recipe(cuisine=cuisine, diet=diet, difficulty=difficulty)
+        # The default request is the pre-generated pick of the day; filters generate on demand
+        if diet is None and difficulty == "Easy":
+            daily = await get_cuisine_recommendation_of_day(cuisine)
+            recipe = daily["recipe"] if daily else None
+            source = daily["source"] if daily else None
+        else:
+            recipe = await generate_cuisine_recipe(cuisine=cuisine, diet=diet, difficulty=difficulty)
+            source = "ai"
         if recipe:
-            recipe_engine._ai_recipes[recipe.id] = recipe
+            if source != "catalog":
+                recipe = await ai_recipe_store.save(recipe)
             return {
                 "cuisine": cuisine,
                 "recipe": recipe,
                 "cultural_note": getattr(recipe, 'cultural_note', CUISINE_FACTS.get(cuisine)),
-                "message": f"Today's {cuisine} recommendation"
+                "message": f"Today's {cuisine} recommendation",
+                "source": source
             }
         raise HTTPException(status_code=500, detail="Failed to generate recommendation")
         
@@ -133,7 +151,7 @@ async def list_cuisines():
 @router.get("/recipe/{recipe_id}", response_model=Recipe)
 async def get_cuisine_recipe(recipe_id: str):
     """Get full recipe details"""
-    recipe = recipe_engine.get_recipe_detail(recipe_id)
+    recipe = await recipe_engine.fetch_recipe_detail(recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     return recipe
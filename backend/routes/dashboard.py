@@ -4,15 +4,16 @@ Dashboard routes for user overview and trends
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from datetime import date, datetime, timedelta
+from datetime import timedelta
 from typing import Optional
 
-from database import get_session
+from database import get_read_session
 from models.user import User, UserProfile
-from models.meal_log import MealLog
 from models.goal import Goal
 from models.favorite import Favorite
 from services.auth_service import get_current_user_required, get_current_user
+from services.daily_nutrition import daily_nutrition
+from services.day_window import UTC, get_timezone, local_today, user_timezone
 from services.recipe_engine import recipe_engine
 
 router = APIRouter()
@@ -21,13 +22,12 @@ router = APIRouter()
 @router.get("/today")
 async def get_today_dashboard(
     current_user: Optional[User] = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get today at-a-glance dashboard"""
-    today = date.today()
-    
     # If not authenticated, return public dashboard
     if not current_user:
+        today = local_today(UTC)
         # Get recipe of the day
         recipe_card, reason = recipe_engine.get_recipe_of_the_day()
         return {
@@ -40,24 +40,19 @@ async def get_today_dashboard(
             "message": "Login to track your nutrition and meals"
         }
     
-    # Get today's meals
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
-    
-    meals_result = await session.execute(
-        select(MealLog)
-        .where(MealLog.user_id == current_user.id)
-        .where(MealLog.logged_at >= start_of_day)
-        .where(MealLog.logged_at <= end_of_day)
-        .order_by(MealLog.logged_at)
+    # Get user profile for personalized recommendations and the user's day
+    profile_result = await session.execute(
+        select(UserProfile).where(UserProfile.user_id == current_user.id)
     )
-    meals = meals_result.scalars().all()
+    profile = profile_result.scalar_one_or_none()
+    today = local_today(get_timezone(profile.timezone if profile else None))
     
-    # Calculate totals
-    calories_total = sum(m.calories_total for m in meals)
-    protein_total = sum(m.protein_total for m in meals)
-    carbs_total = sum(m.carbs_total for m in meals)
-    fats_total = sum(m.fats_total for m in meals)
+    # Today's totals
+    totals = await daily_nutrition.get_day(session, current_user.id, today)
+    calories_total = totals.calories
+    protein_total = totals.protein_g
+    carbs_total = totals.carbs_g
+    fats_total = totals.fats_g
     
     # Get active goals
     goals_result = await session.execute(
@@ -87,12 +82,6 @@ async def get_today_dashboard(
             "progress_percent": min(100, (current / g.target_value * 100) if g.target_value > 0 else 0)
         })
     
-    # Get user profile for personalized recommendations
-    profile_result = await session.execute(
-        select(UserProfile).where(UserProfile.user_id == current_user.id)
-    )
-    profile = profile_result.scalar_one_or_none()
-    
     # Generate action card based on progress
     action_card = None
     calorie_goal = next((g for g in goal_progress if g["kind"] == "calorie"), None)
@@ -137,7 +126,7 @@ async def get_today_dashboard(
             "carbs_g": carbs_total,
             "fats_g": fats_total
         },
-        "meals_count": len(meals),
+        "meals_count": totals.meals_count,
         "goals": goal_progress,
         "action_card": action_card,
         "recipe_of_day": {
@@ -151,46 +140,25 @@ async def get_today_dashboard(
 async def get_nutrition_trends(
     days: int = Query(7, le=90),
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get nutrition trends over specified days"""
-    end_date = date.today()
+    end_date = local_today(await user_timezone(session, current_user.id))
     start_date = end_date - timedelta(days=days - 1)
     
-    # Get all meals in date range
-    start_datetime = datetime.combine(start_date, datetime.min.time())
-    end_datetime = datetime.combine(end_date, datetime.max.time())
-    
-    result = await session.execute(
-        select(MealLog)
-        .where(MealLog.user_id == current_user.id)
-        .where(MealLog.logged_at >= start_datetime)
-        .where(MealLog.logged_at <= end_datetime)
-        .order_by(MealLog.logged_at)
-    )
-    meals = result.scalars().all()
-    
-    # Group by date
-    daily_data = {}
-    for d in range(days):
-        day = start_date + timedelta(days=d)
-        daily_data[day.isoformat()] = {
-            "date": day.isoformat(),
-            "calories": 0,
-            "protein_g": 0,
-            "carbs_g": 0,
-            "fats_g": 0,
-            "meals_count": 0
+    # One rollup row per day in range
+    rollups = await daily_nutrition.get_days(session, current_user.id, start_date, end_date)
+    daily_data = {
+        r.day.isoformat(): {
+            "date": r.day.isoformat(),
+            "calories": r.calories,
+            "protein_g": r.protein_g,
+            "carbs_g": r.carbs_g,
+            "fats_g": r.fats_g,
+            "meals_count": r.meals_count
         }
-    
-    for meal in meals:
-        day_key = meal.logged_at.date().isoformat()
-        if day_key in daily_data:
-            daily_data[day_key]["calories"] += meal.calories_total
-            daily_data[day_key]["protein_g"] += meal.protein_total
-            daily_data[day_key]["carbs_g"] += meal.carbs_total
-            daily_data[day_key]["fats_g"] += meal.fats_total
-            daily_data[day_key]["meals_count"] += 1
+        for r in rollups
+    }
     
     # Calculate averages
     active_days = [d for d in daily_data.values() if d["meals_count"] > 0]
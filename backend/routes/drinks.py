@@ -60,12 +60,11 @@ async def get_drinks(
     # Generate AI recommendation if enabled
     if include_ai and os.getenv("GEMINI_API_KEY"):
         try:
-            from services.ai_service import generate_drink_recipe
+            from services.ai_service import get_drink_recommendation_of_day
             
-            ai_drink = await generate_drink_recipe(
-                category=category or "healthy",
-                diet="veg"
-            )
+            # Pre-generated pick of the day for the category
+            daily = await get_drink_recommendation_of_day(category or "healthy")
+            ai_drink = daily["drink"] if daily else None
             
             if ai_drink:
                 ai_recommendation = {
@@ -98,16 +97,24 @@ async def get_drink_recommendation(
         category = "healthy"
     
     try:
-        from services.ai_service import generate_drink_recipe
+        from services.ai_service import generate_drink_recipe, get_drink_recommendation_of_day
         
-        drink = await generate_drink_recipe(category=category, goal=goal)
+        # The default request is the pre-generated pick of the day; a goal generates on demand
+        if goal is None:
+            daily = await get_drink_recommendation_of_day(category)
+            drink = daily["drink"] if daily else None
+            source = daily["source"] if daily else None
+        else:
+            drink = await generate_drink_recipe(category=category, goal=goal)
+            source = "ai"
         if drink:
             return {
                 "category": category,
                 "drink": drink,
                 "best_time": drink.get('best_time', 'Anytime'),
                 "health_note": drink.get('health_note'),
-                "message": f"Today's {category} drink recommendation"
+                "message": f"Today's {category} drink recommendation",
+                "source": source
             }
         raise HTTPException(status_code=500, detail="Failed to generate recommendation")
         
@@ -2,10 +2,11 @@
 Favorites routes for saving favorite recipes
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
-from database import get_session
+from database import get_read_session, get_session
 from models.user import User
 from models.favorite import Favorite, FavoriteCreate, FavoriteResponse
 from services.auth_service import get_current_user_required
@@ -40,7 +41,15 @@ async def add_favorite(
     )
     
     session.add(favorite)
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError:
+        # A concurrent request favorited it first (unique user_id, recipe_id)
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Recipe already in favorites"
+        )
     await session.refresh(favorite)
     
     return FavoriteResponse(
@@ -56,7 +65,7 @@ async def add_favorite(
 @router.get("/", response_model=list[FavoriteResponse])
 async def get_favorites(
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get all user's favorites"""
     result = await session.execute(
@@ -83,7 +92,7 @@ async def get_favorites(
 async def check_favorite(
     recipe_id: str,
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Check if a recipe is favorited"""
     result = await session.execute(
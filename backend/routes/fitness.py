@@ -8,12 +8,15 @@ from typing import Optional, Literal
 import os
 
 from services.recipe_engine import recipe_engine
+from services.ai_recipe_store import ai_recipe_store
 from models.recipe import RecipeCard, Recipe
 
 router = APIRouter()
 
 NUTRITION_DISCLAIMER = "Nutrition values are estimates based on standard raw ingredients. Actual values may vary based on portion sizes and cooking methods."
 
+FITNESS_GOALS = ["fat_loss", "muscle_gain", "maintenance"]
+
 GOAL_TIPS = {
     "fat_loss": "Focus on high protein, low calorie foods. Avoid hidden sugars and processed foods.",
     "muscle_gain": "Consume protein within 30 mins post-workout. Aim for 1.6-2.2g protein per kg bodyweight.",
@@ -50,10 +53,21 @@ async def get_fitness_recipes(
     # Generate AI recommendation if enabled
     if include_ai and os.getenv("GEMINI_API_KEY"):
         try:
-            from services.ai_service import generate_fitness_recipe
+            from services.ai_service import generate_fitness_recipe, get_fitness_recommendation_of_day
             
-            ai_recipe = await generate_fitness_recipe(goal=goal, diet=diet)
+            # Without a diet filter, serve the pre-generated pick of the day
+            if diet is None:
+                daily = await get_fitness_recommendation_of_day(goal)
+                ai_recipe = daily["recipe"] if daily else None
+                source = daily["source"] if daily else None
+            else:
+                ai_recipe = await generate_fitness_recipe(goal=goal, diet=diet)
+                source = "ai"
             if ai_recipe:
+                # Store for later retrieval (catalog picks already resolve by id)
+                if source != "catalog":
+                    ai_recipe = await ai_recipe_store.save(ai_recipe)
+                
                 # Convert to RecipeCard format
                 ai_card = RecipeCard(
                     id=ai_recipe.id,
@@ -67,9 +81,6 @@ async def get_fitness_recipes(
                     servings=ai_recipe.servings
                 )
                 
-                # Store for later retrieval
-                recipe_engine._ai_recipes[ai_recipe.id] = ai_recipe
-                
                 ai_recommendation = {
                     "recipe": ai_card.model_dump(),
                     "fitness_tip": getattr(ai_recipe, 'fitness_tip', GOAL_TIPS.get(goal, '')),
@@ -100,16 +111,25 @@ async def get_fitness_recommendation(
         raise HTTPException(status_code=503, detail="AI features not available")
     
     try:
-        from services.ai_service import generate_fitness_recipe
+        from services.ai_service import generate_fitness_recipe, get_fitness_recommendation_of_day
         
-        recipe = await generate_fitness_recipe(goal=goal, diet=diet)
+        # The default request is the pre-generated pick of the day; diet filters generate on demand
+        if diet is None:
+            daily = await get_fitness_recommendation_of_day(goal)
+            recipe = daily["recipe"] if daily else None
+            source = daily["source"] if daily else None
+        else:
+            recipe = await generate_fitness_recipe(goal=goal, diet=diet)
+            source = "ai"
         if recipe:
-            recipe_engine._ai_recipes[recipe.id] = recipe
+            if source != "catalog":
+                recipe = await ai_recipe_store.save(recipe)
             return {
                 "goal": goal,
                 "recipe": recipe,
                 "tip": getattr(recipe, 'fitness_tip', GOAL_TIPS.get(goal)),
-                "message": f"Today's {goal.replace('_', ' ')} recommendation"
+                "message": f"Today's {goal.replace('_', ' ')} recommendation",
+                "source": source
             }
         raise HTTPException(status_code=500, detail="Failed to generate recommendation")
         
@@ -120,7 +140,7 @@ async def get_fitness_recommendation(
 @router.get("/recipe/{recipe_id}", response_model=Recipe)
 async def get_fitness_recipe(recipe_id: str):
     """Get full recipe details with nutrition info"""
-    recipe = recipe_engine.get_recipe_detail(recipe_id)
+    recipe = await recipe_engine.fetch_recipe_detail(recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     return recipe
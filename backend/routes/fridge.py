@@ -2,18 +2,28 @@
 Fridge Recipes API Routes
 Generate unique recipes based on available ingredients using AI
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Awaitable, Optional, TypeVar
+import asyncio
 import os
 import random
+import re
+import time
 
 from services.recipe_engine import recipe_engine
 from services.normalizer import normalizer
+from services.ai_recipe_store import ai_recipe_store
+from services.nutrition import nutrition_table
+from services.streaming import format_sse
 from models.recipe import RecipeCard, Recipe
 
 router = APIRouter()
 
+# Latency budget for the AI recipe on /match, in milliseconds (0 waits for the AI)
+FRIDGE_AI_BUDGET_MS = int(os.getenv("FRIDGE_AI_BUDGET_MS", "8000"))
+
 class FridgeRequest(BaseModel):
     """Request body for fridge recipe generation"""
     ingredients: str  # Comma-separated ingredients
@@ -28,6 +38,12 @@ class RecipeSuggestion(BaseModel):
     region: str
     missing_ingredients: list[str]
 
+class SimilarRecipeMatch(BaseModel):
+    """How a recipe reused from a nearly identical fridge differs from this one"""
+    similarity: float  # Jaccard similarity of the ingredient sets
+    missing_ingredients: list[str]  # used by the recipe, not in this fridge
+    unused_ingredients: list[str]  # in this fridge, not used by the recipe
+
 class FridgeResponse(BaseModel):
     """Response for fridge recipe generation"""
     normalized_ingredients: list[str]
@@ -36,9 +52,133 @@ class FridgeResponse(BaseModel):
     ai_generated: bool = False
     suggested_ingredients: list[str] = []  # 3-6 suggested additions
     recipe_suggestions: list[RecipeSuggestion] = []  # 2 popular recipes
+    pending_ai_upgrade: Optional[str] = None  # token for /upgrade/{token} when the AI ran over budget
+    similar_match: Optional[SimilarRecipeMatch] = None  # set when the recipe was generated for a similar fridge
+
+class FridgeUpgradeResponse(BaseModel):
+    """Result of polling a pending AI upgrade"""
+    status: str  # pending, ready, unavailable
+    recipe: Optional[RecipeCard] = None
+    suggested_ingredients: list[str] = []
+    recipe_suggestions: list[RecipeSuggestion] = []
+
+def _recipe_card(recipe: Recipe) -> RecipeCard:
+    """Card view of a generated recipe"""
+    return RecipeCard(
+        id=recipe.id,
+        name=recipe.name,
+        cuisine=recipe.cuisine,
+        difficulty=recipe.difficulty,
+        time_minutes=recipe.time_minutes,
+        required_ingredients=recipe.required_ingredients,
+        optional_ingredients=recipe.optional_ingredients or [],
+        nutrition=recipe.nutrition,
+        servings=recipe.servings
+    )
+
+def _ai_suggestions(recipe: Recipe) -> tuple[list[str], list[RecipeSuggestion]]:
+    """Suggested additions and popular alternatives returned by the model"""
+    suggested_ingredients = getattr(recipe, 'suggested_ingredients', []) or []
+    recipe_suggestions_raw = getattr(recipe, 'recipe_suggestions', []) or []
+    
+    # Convert raw suggestions to RecipeSuggestion objects
+    recipe_suggestions = []
+    for sug in recipe_suggestions_raw[:2]:
+        if isinstance(sug, dict):
+            recipe_suggestions.append(RecipeSuggestion(
+                name=sug.get('name', 'Unknown Recipe'),
+                region=sug.get('region', 'Global'),
+                missing_ingredients=sug.get('missing_ingredients', [])
+            ))
+    return suggested_ingredients[:6], recipe_suggestions
+
+def _similar_match(similar) -> SimilarRecipeMatch:
+    """Response view of an ai_service.NearDuplicate"""
+    return SimilarRecipeMatch(
+        similarity=similar.similarity,
+        missing_ingredients=similar.missing_ingredients,
+        unused_ingredients=similar.unused_ingredients
+    )
+
+def _near_miss_suggestions(normalized: list[str], diet: Optional[str]) -> list[RecipeSuggestion]:
+    """Catalog recipes that need one or two more ingredients"""
+    return [
+        RecipeSuggestion(name=recipe["name"], region=recipe["cuisine"], missing_ingredients=missing)
+        for recipe, missing in recipe_engine.find_near_misses(normalized, max_missing=2, diet=diet)
+    ]
+
+T = TypeVar("T")
+
+class StageTimings:
+    """Wall-clock duration of each stage of one request, for the Server-Timing header"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, tuple[float, str]] = {}  # name -> (ms, description)
+    
+    async def timed(self, name: str, stage: Awaitable[T]) -> T:
+        started = time.perf_counter()
+        try:
+            return await stage
+        finally:
+            self.record(name, started)
+    
+    def record(self, name: str, started: float):
+        """Record a stage that began at started (perf_counter seconds) and just ended"""
+        self.stages[name] = ((time.perf_counter() - started) * 1000, "")
+    
+    def note(self, name: str, description: str):
+        """Annotate a stage, e.g. one that was still running when the response was assembled"""
+        ms = self.stages.get(name, ((time.perf_counter() - self.started) * 1000, ""))[0]
+        self.stages[name] = (ms, description)
+    
+    def as_dict(self) -> dict[str, float]:
+        timings = {name: round(ms, 1) for name, (ms, _) in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return timings
+    
+    def header(self) -> str:
+        """Server-Timing value, e.g. 'catalog;dur=1.2, ai;dur=2301.5, total;dur=2310.0'"""
+        parts = []
+        for name, ms in self.as_dict().items():
+            description = self.stages.get(name, (0.0, ""))[1]
+            parts.append(f'{name};dur={ms}' + (f';desc="{description}"' if description else ""))
+        return ", ".join(parts)
+
+def _start_local_stages(
+    normalized: list[str], diet: Optional[str], timings: StageTimings
+) -> tuple["asyncio.Task[list[RecipeCard]]", "asyncio.Task[list[RecipeSuggestion]]"]:
+    """
+    Start catalog matching and near-miss suggestions off the event loop, so they run while
+    the AI recipe is generated. Catalog matches are used on every path, near-misses
+    whenever the backup recipe is served.
+    """
+    catalog_matches = asyncio.create_task(timings.timed(
+        "catalog", asyncio.to_thread(recipe_engine.match_by_ingredients, normalized, 2, diet)
+    ))
+    near_misses = asyncio.create_task(timings.timed(
+        "near_miss", asyncio.to_thread(_near_miss_suggestions, normalized, diet)
+    ))
+    return catalog_matches, near_misses
+
+async def _local_result(task: "asyncio.Task[list]", name: str, timings: StageTimings, deadline: Optional[float]) -> list:
+    """A local stage's result, or [] if it failed or is still running at deadline (perf_counter seconds)"""
+    if not task.done():
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        await asyncio.wait([task], timeout=timeout)
+    if not task.done():
+        task.cancel()
+        timings.note(name, "over budget")
+        return []
+    if task.cancelled():
+        return []
+    if task.exception() is not None:
+        print(f"Fridge {name} stage failed: {task.exception()}")
+        return []
+    return task.result()
 
 @router.post("/match", response_model=FridgeResponse)
-async def create_recipes(request: FridgeRequest):
+async def create_recipes(request: FridgeRequest, response: Response):
     """
     CREATE unique recipes based on available ingredients - ALWAYS returns a recipe.
     
@@ -47,6 +187,17 @@ async def create_recipes(request: FridgeRequest):
     2. Adjusts ingredient quantities based on servings (1-10 people)
     3. Suggests 3-6 ingredients to enhance the recipe
     4. Suggests 2 popular recipes with missing ingredients
+    
+    Catalog matching and near-miss suggestions run concurrently with the AI generation and
+    their results are shared by every branch below. Stage durations are reported in the
+    Server-Timing response header.
+    
+    A recipe already generated for a nearly identical fridge (same diet and portions, Jaccard
+    similarity above FRIDGE_SIMILARITY_THRESHOLD) is reused, with the differences in similar_match.
+    
+    If the AI takes longer than FRIDGE_AI_BUDGET_MS, the best local result (backup recipe,
+    catalog matches and near-misses) is returned right away with a pending_ai_upgrade token;
+    the AI recipe finishes in the background and can be fetched from /upgrade/{token}.
     """
     # Parse and normalize ingredients
     normalized = normalizer.parse_input(request.ingredients)
@@ -61,91 +212,124 @@ async def create_recipes(request: FridgeRequest):
     servings = max(1, min(10, request.servings or 2))
     serving_size = max(100, min(500, request.serving_size or 200))
     
+    timings = StageTimings()
+    catalog_task, near_miss_task = _start_local_stages(normalized, request.diet, timings)
+    try:
+        result = await _assemble_fridge_response(
+            request, normalized, servings, serving_size, catalog_task, near_miss_task, timings
+        )
+    finally:
+        for task in (catalog_task, near_miss_task):
+            task.cancel()
+    response.headers["Server-Timing"] = timings.header()
+    return result
+
+async def _assemble_fridge_response(
+    request: FridgeRequest,
+    normalized: list[str],
+    servings: int,
+    serving_size: int,
+    catalog_task: "asyncio.Task[list[RecipeCard]]",
+    near_miss_task: "asyncio.Task[list[RecipeSuggestion]]",
+    timings: StageTimings
+) -> FridgeResponse:
+    """Run the AI stage, then build the /match response from the stages that finished"""
+    # Local stages get whatever is left of the AI budget once the AI stage is settled
+    deadline = timings.started + FRIDGE_AI_BUDGET_MS / 1000 if FRIDGE_AI_BUDGET_MS > 0 else None
+    
     # ALWAYS try AI generation - never return empty
     if os.getenv("GEMINI_API_KEY"):
         try:
-            from services.ai_service import generate_recipe_with_ai
+            from services.ai_service import (
+                find_similar_recipe, generate_recipe_with_ai, recipe_generation_key, run_within_budget
+            )
             
             # Random cuisine styles for variety if not specified
             cuisines = ["Indian", "Chinese", "Italian", "Japanese", "Mexican", "Thai"]
             selected_cuisine = request.cuisine or random.choice(cuisines)
             
-            print(f"AI Creation: Generating recipe for {servings} people, {serving_size}g/serving")
-            
-            ai_recipe = await generate_recipe_with_ai(
-                ingredients=normalized,
-                diet=request.diet,
-                cuisine=selected_cuisine,
-                servings=servings,
-                serving_size=serving_size
-            )
+            similar = await timings.timed("similar", find_similar_recipe(
+                normalized, request.diet, selected_cuisine, None, servings, serving_size,
+                any_cuisine=request.cuisine is None
+            ))
+            if similar:
+                print(f"AI Creation: Reusing recipe from a similar fridge ({similar.similarity:.2f})")
+                finished, ai_recipe = True, similar.recipe
+            else:
+                print(f"AI Creation: Generating recipe for {servings} people, {serving_size}g/serving")
+                finished, ai_recipe = await timings.timed("ai", run_within_budget(
+                    generate_recipe_with_ai(
+                        ingredients=normalized,
+                        diet=request.diet,
+                        cuisine=selected_cuisine,
+                        servings=servings,
+                        serving_size=serving_size
+                    ),
+                    FRIDGE_AI_BUDGET_MS / 1000
+                ))
             
             using_backup = False
+            pending_token = None
             
-            # If AI fails (returns None), use backup generator
+            if not finished:
+                # Over budget: answer locally, the AI recipe lands in the generation cache later
+                print(f"AI generation exceeded {FRIDGE_AI_BUDGET_MS}ms budget. Serving local result.")
+                timings.note("ai", "over budget")
+                pending_token = recipe_generation_key(
+                    normalized, request.diet, selected_cuisine, None, servings, serving_size
+                )
+            
+            # If AI fails or is still running, use backup generator
             if not ai_recipe:
-                print("AI generation failed/returned None. Using backup generator.")
+                if finished:
+                    print("AI generation failed/returned None. Using backup generator.")
                 from services.backup_generator import generate_backup_recipe
-                ai_recipe = generate_backup_recipe(
+                ai_recipe = await timings.timed("backup", asyncio.to_thread(
+                    generate_backup_recipe,
                     ingredients=normalized,
                     diet=request.diet,
                     servings=servings,
                     serving_size=serving_size
-                )
+                ))
                 using_backup = True
             
             if ai_recipe:
                 print(f"Creation successful: {ai_recipe.name} (Backup: {using_backup})")
                 
-                # Convert to RecipeCard
-                ai_card = RecipeCard(
-                    id=ai_recipe.id,
-                    name=ai_recipe.name,
-                    cuisine=ai_recipe.cuisine,
-                    difficulty=ai_recipe.difficulty,
-                    time_minutes=ai_recipe.time_minutes,
-                    required_ingredients=ai_recipe.required_ingredients,
-                    optional_ingredients=ai_recipe.optional_ingredients or [],
-                    nutrition=ai_recipe.nutrition,
-                    servings=ai_recipe.servings
-                )
-                
-                # Store AI recipe in engine cache for later retrieval
-                recipe_engine._ai_recipes[ai_recipe.id] = ai_recipe
-                
-                # Extract suggestions
-                suggested_ingredients = getattr(ai_recipe, 'suggested_ingredients', []) or []
-                recipe_suggestions_raw = getattr(ai_recipe, 'recipe_suggestions', []) or []
+                # Store for later retrieval (content-addressed id, shared across workers)
+                ai_recipe = await timings.timed("store", ai_recipe_store.save(ai_recipe))
+                ai_card = _recipe_card(ai_recipe)
                 
-                # Convert raw suggestions to RecipeSuggestion objects
-                recipe_suggestions = []
-                for sug in recipe_suggestions_raw[:2]:
-                    if isinstance(sug, dict):
-                        recipe_suggestions.append(RecipeSuggestion(
-                            name=sug.get('name', 'Unknown Recipe'),
-                            region=sug.get('region', 'Global'),
-                            missing_ingredients=sug.get('missing_ingredients', [])
-                        ))
+                if using_backup:
+                    suggested_ingredients = []
+                    recipe_suggestions = await _local_result(near_miss_task, "near_miss", timings, deadline)
+                else:
+                    suggested_ingredients, recipe_suggestions = _ai_suggestions(ai_recipe)
                 
                 # Also get similar database recipes as suggestions
-                db_recipes = recipe_engine.match_by_ingredients(
-                    available=normalized,
-                    max_missing=2,
-                    diet=request.diet
-                )[:2]
+                db_recipes = (await _local_result(catalog_task, "catalog", timings, deadline))[:2]
                 
                 all_recipes = [ai_card] + db_recipes
                 
                 msg_prefix = "✨ Created" if not using_backup else "Created"
-                msg_suffix = "" if not using_backup else " (AI unavailable, using backup)"
+                if pending_token:
+                    msg_suffix = " (AI recipe still cooking)"
+                elif using_backup:
+                    msg_suffix = " (AI unavailable, using backup)"
+                elif similar and similar.missing_ingredients:
+                    msg_suffix = f" (also uses: {', '.join(similar.missing_ingredients)})"
+                else:
+                    msg_suffix = ""
                 
                 return FridgeResponse(
                     normalized_ingredients=normalized,
                     recipes=all_recipes,
                     message=f"{msg_prefix} '{ai_recipe.name}' for {servings} people{msg_suffix}",
                     ai_generated=not using_backup,
-                    suggested_ingredients=suggested_ingredients[:6],
-                    recipe_suggestions=recipe_suggestions
+                    suggested_ingredients=suggested_ingredients,
+                    recipe_suggestions=recipe_suggestions,
+                    pending_ai_upgrade=pending_token,
+                    similar_match=_similar_match(similar) if similar else None
                 )
                 
         except Exception as e:
@@ -153,12 +337,8 @@ async def create_recipes(request: FridgeRequest):
             import traceback
             traceback.print_exc()
 
-    # Fallback: Search database (last resort)
-    recipes = recipe_engine.match_by_ingredients(
-        available=normalized,
-        max_missing=2,
-        diet=request.diet
-    )
+    # Fallback: Search database (last resort), the only result here so wait for it
+    recipes = await _local_result(catalog_task, "catalog", timings, None)
     
     # Even without AI, suggest some common ingredients
     common_suggestions = [
@@ -179,10 +359,191 @@ async def create_recipes(request: FridgeRequest):
         recipe_suggestions=[]
     )
 
+@router.post("/match/stream")
+async def stream_recipes(request: FridgeRequest):
+    """
+    Streaming variant of /match using server-sent events.
+    
+    Events:
+    - field: {"name", "value"} as each recipe field completes (name, ingredients, steps, ...)
+    - similar: {"similarity", "missing_ingredients", "unused_ingredients"} when the recipe is
+      reused from a nearly identical fridge
+    - recipe: the stored recipe card once the full recipe is validated
+    - matches: similar database recipes
+    - error: AI failure message (a backup recipe is streamed instead)
+    - done: end of stream, with per-stage timings in milliseconds
+    """
+    normalized = normalizer.parse_input(request.ingredients)
+    
+    if not normalized:
+        raise HTTPException(
+            status_code=400, 
+            detail="Please enter at least one ingredient"
+        )
+    
+    servings = max(1, min(10, request.servings or 2))
+    serving_size = max(100, min(500, request.serving_size or 200))
+    cuisines = ["Indian", "Chinese", "Italian", "Japanese", "Mexican", "Thai"]
+    selected_cuisine = request.cuisine or random.choice(cuisines)
+    
+    async def events():
+        timings = StageTimings()
+        catalog_task = asyncio.create_task(timings.timed(
+            "catalog", asyncio.to_thread(recipe_engine.match_by_ingredients, normalized, 2, request.diet)
+        ))
+        try:
+            async for event in stream_events(timings, catalog_task):
+                yield event
+        finally:
+            catalog_task.cancel()
+    
+    async def stream_events(timings: StageTimings, catalog_task: "asyncio.Task[list[RecipeCard]]"):
+        ai_recipe = None
+        
+        if os.getenv("GEMINI_API_KEY"):
+            from services.ai_service import find_similar_recipe
+            
+            similar = await timings.timed("similar", find_similar_recipe(
+                normalized, request.diet, selected_cuisine, None, servings, serving_size,
+                any_cuisine=request.cuisine is None
+            ))
+            if similar:
+                ai_recipe = similar.recipe
+                yield format_sse("similar", _similar_match(similar).model_dump())
+                for name, value in ai_recipe.model_dump(exclude={"id"}).items():
+                    yield format_sse("field", {"name": name, "value": value})
+        
+        if os.getenv("GEMINI_API_KEY") and ai_recipe is None:
+            from services.ai_service import stream_recipe_with_ai
+            
+            ai_started = time.perf_counter()
+            async for event, data in stream_recipe_with_ai(
+                ingredients=normalized,
+                diet=request.diet,
+                cuisine=selected_cuisine,
+                servings=servings,
+                serving_size=serving_size
+            ):
+                if event == "recipe":
+                    ai_recipe = data
+                else:
+                    yield format_sse(event, data)
+            timings.record("ai", ai_started)
+        
+        using_backup = ai_recipe is None
+        if using_backup:
+            from services.backup_generator import generate_backup_recipe
+            ai_recipe = generate_backup_recipe(
+                ingredients=normalized,
+                diet=request.diet,
+                servings=servings,
+                serving_size=serving_size
+            )
+            for name, value in ai_recipe.model_dump(exclude={"id"}).items():
+                yield format_sse("field", {"name": name, "value": value})
+        
+        ai_recipe = await timings.timed("store", ai_recipe_store.save(ai_recipe))
+        card = _recipe_card(ai_recipe)
+        yield format_sse("recipe", {"recipe": card.model_dump(), "ai_generated": not using_backup})
+        
+        db_recipes = (await _local_result(catalog_task, "catalog", timings, None))[:2]
+        yield format_sse("matches", {
+            "normalized_ingredients": normalized,
+            "recipes": [r.model_dump() for r in db_recipes]
+        })
+        yield format_sse("done", {
+            "message": f"Created '{ai_recipe.name}' for {servings} people",
+            "timings": timings.as_dict()
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/upgrade/{token}", response_model=FridgeUpgradeResponse)
+async def get_upgrade(token: str):
+    """
+    Poll for the AI recipe that was still generating when /match answered.
+    "unavailable" means the generation failed, or ran on another worker and has not finished yet.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", token):
+        raise HTTPException(status_code=404, detail="Unknown upgrade token")
+    
+    from services.ai_service import get_pending_recipe
+    status, recipe = await get_pending_recipe(token)
+    if recipe is None:
+        return FridgeUpgradeResponse(status=status)
+    
+    recipe = await ai_recipe_store.save(recipe)
+    suggested_ingredients, recipe_suggestions = _ai_suggestions(recipe)
+    return FridgeUpgradeResponse(
+        status=status,
+        recipe=_recipe_card(recipe),
+        suggested_ingredients=suggested_ingredients,
+        recipe_suggestions=recipe_suggestions
+    )
+
 @router.get("/recipe/{recipe_id}", response_model=Recipe)
-async def get_recipe(recipe_id: str):
-    """Get full recipe details by ID"""
-    recipe = recipe_engine.get_recipe_detail(recipe_id)
+async def get_recipe(recipe_id: str, servings: Optional[int] = Query(None, ge=1, le=10)):
+    """Get full recipe details by ID, optionally with quantities rescaled for a number of people"""
+    recipe = await recipe_engine.fetch_recipe_detail(recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    if servings and servings != recipe.servings:
+        recipe = nutrition_table.rescale(recipe, servings)
     return recipe
+
+async def run_fridge_job(params: dict) -> dict:
+    """
+    Queue handler for /api/jobs/fridge: the /match result for a submitted fridge, computed
+    by a job-queue worker (AI recipe, or the backup recipe if the AI fails).
+    """
+    normalized = params["ingredients"]
+    diet, cuisine = params.get("diet"), params["cuisine"]
+    servings, serving_size = params["servings"], params["serving_size"]
+    
+    timings = StageTimings()
+    catalog_task, near_miss_task = _start_local_stages(normalized, diet, timings)
+    try:
+        ai_recipe, similar = None, None
+        if os.getenv("GEMINI_API_KEY"):
+            from services.ai_service import find_similar_recipe, generate_recipe_with_ai
+            similar = await find_similar_recipe(
+                normalized, diet, cuisine, None, servings, serving_size, any_cuisine=params.get("any_cuisine", False)
+            )
+            if similar:
+                ai_recipe = similar.recipe
+            else:
+                ai_recipe = await generate_recipe_with_ai(
+                    ingredients=normalized, diet=diet, cuisine=cuisine, servings=servings, serving_size=serving_size
+                )
+        
+        using_backup = ai_recipe is None
+        if using_backup:
+            from services.backup_generator import generate_backup_recipe
+            ai_recipe = generate_backup_recipe(
+                ingredients=normalized, diet=diet, servings=servings, serving_size=serving_size
+            )
+            suggested_ingredients = []
+            recipe_suggestions = await _local_result(near_miss_task, "near_miss", timings, None)
+        else:
+            suggested_ingredients, recipe_suggestions = _ai_suggestions(ai_recipe)
+        
+        ai_recipe = await ai_recipe_store.save(ai_recipe)
+        db_recipes = (await _local_result(catalog_task, "catalog", timings, None))[:2]
+    finally:
+        for task in (catalog_task, near_miss_task):
+            task.cancel()
+    
+    suffix = " (AI unavailable, using backup)" if using_backup else ""
+    return FridgeResponse(
+        normalized_ingredients=normalized,
+        recipes=[_recipe_card(ai_recipe)] + db_recipes,
+        message=f"{'Created' if using_backup else '✨ Created'} '{ai_recipe.name}' for {servings} people{suffix}",
+        ai_generated=not using_backup,
+        suggested_ingredients=suggested_ingredients,
+        recipe_suggestions=recipe_suggestions,
+        similar_match=_similar_match(similar) if similar else None
+    ).model_dump()
@@ -4,13 +4,14 @@ Goals routes for managing nutrition/fitness goals
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 
-from database import get_session
+from database import get_read_session, get_session
 from models.user import User
 from models.goal import Goal, GoalCreate, GoalUpdate, GoalResponse, GoalProgress
-from models.meal_log import MealLog
 from services.auth_service import get_current_user_required
+from services.daily_nutrition import daily_nutrition
+from services.day_window import local_today, user_timezone
 
 router = APIRouter()
 
@@ -63,7 +64,7 @@ async def create_goal(
 async def get_goals(
     active_only: bool = True,
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get user's goals"""
     query = select(Goal).where(Goal.user_id == current_user.id)
@@ -95,23 +96,13 @@ async def get_goal_progress(
     session: AsyncSession = Depends(get_session)
 ):
     """Get goal progress with today's nutrition totals"""
-    # Get today's meals
-    today = date.today()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
-    
-    meals_result = await session.execute(
-        select(MealLog)
-        .where(MealLog.user_id == current_user.id)
-        .where(MealLog.logged_at >= start_of_day)
-        .where(MealLog.logged_at <= end_of_day)
-    )
-    meals = meals_result.scalars().all()
-    
-    daily_calories = sum(m.calories_total for m in meals)
-    daily_protein = sum(m.protein_total for m in meals)
-    daily_carbs = sum(m.carbs_total for m in meals)
-    daily_fats = sum(m.fats_total for m in meals)
+    # Today's totals
+    tz = await user_timezone(session, current_user.id)
+    totals = await daily_nutrition.get_day(session, current_user.id, local_today(tz))
+    daily_calories = totals.calories
+    daily_protein = totals.protein_g
+    daily_carbs = totals.carbs_g
+    daily_fats = totals.fats_g
     
     # Get active goals and update current values
     goals_result = await session.execute(
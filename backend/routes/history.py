@@ -6,12 +6,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from sqlmodel import func, select
 from datetime import datetime, timedelta
 import json
 from collections import Counter
 
-from database import get_session
+from database import get_read_session, get_session
 from models.history import CookingHistory, HistoryEntry, InsightData
 from services.recipe_engine import recipe_engine
 
@@ -45,7 +45,7 @@ async def save_to_history(
     from models.recipe_counts import RecipeCounts
     
     # Get recipe details
-    recipe = recipe_engine.get_recipe_detail(request.recipe_id)
+    recipe = await recipe_engine.fetch_recipe_detail(request.recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     
@@ -88,7 +88,7 @@ async def save_to_history(
 async def get_history(
     limit: int = 20,
     offset: int = 0,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get cooking history, most recent first"""
     statement = (
@@ -117,16 +117,15 @@ async def get_history(
     ]
     
     # Get total count
-    count_statement = select(CookingHistory)
-    count_result = await session.execute(count_statement)
-    total = len(count_result.scalars().all())
+    count_result = await session.execute(select(func.count(CookingHistory.id)))
+    total = count_result.scalar_one()
     
     return HistoryResponse(entries=history_entries, total=total)
 
 @router.get("/insights", response_model=InsightsResponse)
 async def get_insights(
     days: int = 7,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     Get nutrition insights from cooking history.
@@ -225,7 +224,7 @@ async def delete_history_entry(
 @router.get("/counts/{recipe_id}")
 async def get_recipe_counts(
     recipe_id: str,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get made/loved counts for a recipe"""
     from models.recipe_counts import RecipeCounts
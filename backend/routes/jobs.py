@@ -0,0 +1,154 @@
+"""
+AI Job API Routes
+Submit AI generations to the job queue, then poll or stream their results
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Literal, Optional
+import hashlib
+
+from models.user import User
+from routes.fridge import FridgeRequest, run_fridge_job
+from services.auth_service import get_current_user
+from services.job_queue import QueueFullError, job_queue
+from services.normalizer import normalizer
+from services.streaming import format_sse
+
+router = APIRouter()
+
+job_queue.register("fridge", run_fridge_job)
+
+# Interactive jobs (someone is waiting on the result) run before background prefetches
+PRIORITIES = {"interactive": 1, "background": 0}
+
+CUISINES = ["Indian", "Chinese", "Italian", "Japanese", "Mexican", "Thai"]
+
+class FridgeJobRequest(FridgeRequest):
+    """Fridge request submitted to the job queue"""
+    priority: Literal["interactive", "background"] = "interactive"
+
+class JobResponse(BaseModel):
+    """State of a queued AI job"""
+    id: str
+    kind: str
+    status: str  # queued, running, done, failed
+    position: int = 0  # queued jobs ahead of this one
+    attempts: int = 0
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+def _pick_cuisine(ingredients: list[str]) -> str:
+    """
+    Cuisine for a request without one, chosen from the ingredients rather than at random so
+    identical submissions get the same generation key (and share one job)
+    """
+    digest = hashlib.sha256(",".join(sorted(ingredients)).encode("utf-8")).digest()
+    return CUISINES[digest[0] % len(CUISINES)]
+
+def _owner(request: Request, user: Optional[User]) -> str:
+    """Who a job counts against for per-user fairness"""
+    if user is not None:
+        return f"user:{user.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+async def _job_response(job) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        position=await job_queue.position(job),
+        attempts=job.attempts,
+        result=job.get_result(),
+        error=job.error
+    )
+
+@router.post("/fridge", status_code=202)
+async def submit_fridge_job(
+    body: FridgeJobRequest,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    Queue a fridge recipe generation and return 202 right away.
+    The result (same shape as /api/fridge/match) is available from the poll_url, or pushed
+    over server-sent events from the stream_url. An identical request that is already
+    queued or running returns the existing job.
+    """
+    normalized = normalizer.parse_input(body.ingredients)
+    if not normalized:
+        raise HTTPException(status_code=400, detail="Please enter at least one ingredient")
+
+    from services.ai_service import recipe_generation_key
+
+    servings = max(1, min(10, body.servings or 2))
+    serving_size = max(100, min(500, body.serving_size or 200))
+    selected_cuisine = body.cuisine or _pick_cuisine(normalized)
+    params = {
+        "ingredients": normalized,
+        "diet": body.diet,
+        "cuisine": selected_cuisine,
+        "any_cuisine": body.cuisine is None,
+        "servings": servings,
+        "serving_size": serving_size
+    }
+    key = recipe_generation_key(normalized, body.diet, selected_cuisine, None, servings, serving_size)
+
+    try:
+        job, deduplicated = await job_queue.submit(
+            "fridge", key, params, _owner(request, current_user), PRIORITIES[body.priority]
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    poll_url = f"/api/jobs/{job.id}"
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": poll_url},
+        content={
+            "id": job.id,
+            "status": job.status,
+            "deduplicated": deduplicated,
+            "poll_url": poll_url,
+            "stream_url": f"{poll_url}/stream"
+        }
+    )
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Poll a job; result is set once status is done"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await _job_response(job)
+
+@router.get("/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Follow a job using server-sent events.
+
+    Events:
+    - status: the job (id, status, position) on every status change
+    - result: the result once the job is done
+    - error: failure message if the job failed
+    - done: end of stream
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in job_queue.watch(job_id):
+            state = await _job_response(job)
+            yield format_sse("status", state.model_dump(exclude={"result", "error"}))
+            if job.status == "done":
+                yield format_sse("result", state.result)
+            elif job.status == "failed":
+                yield format_sse("error", {"message": state.error})
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
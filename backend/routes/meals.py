@@ -2,21 +2,66 @@
 Meal logging routes for tracking daily food intake
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import literal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
-from datetime import datetime, date, timedelta
-import json
+from sqlmodel import delete, func, select
+from datetime import datetime, date, timedelta, timezone
 
-from database import get_session
+from database import get_read_session, get_session
 from models.user import User
 from models.meal_log import (
-    MealLog, MealLogCreate, MealLogResponse, MealItem, DailySummary
+    MealLog, MealLogItem, MealLogCreate, MealLogResponse, MealItem, DailySummary, FoodIntake, food_key
 )
 from services.auth_service import get_current_user_required
+from services.daily_nutrition import daily_nutrition
+from services.day_window import day_window, local_today, user_timezone
 
 router = APIRouter()
 
 
+async def _meal_responses(session: AsyncSession, meals: list[MealLog]) -> list[MealLogResponse]:
+    """Build responses for meals, loading all of their items with one query"""
+    items = {m.id: [] for m in meals}
+    if meals:
+        result = await session.execute(
+            select(MealLogItem)
+            .where(MealLogItem.meal_id.in_(list(items)))
+            .order_by(MealLogItem.meal_id, MealLogItem.position)
+        )
+        for row in result.scalars():
+            items[row.meal_id].append(row.to_item())
+    
+    return [
+        MealLogResponse(
+            id=m.id,
+            user_id=m.user_id,
+            logged_at=m.logged_at,
+            meal_type=m.meal_type,
+            items=items[m.id],
+            calories_total=m.calories_total,
+            protein_total=m.protein_total,
+            carbs_total=m.carbs_total,
+            fats_total=m.fats_total,
+            notes=m.notes
+        )
+        for m in meals
+    ]
+
+
+def _intake_columns():
+    """Per-food aggregates over meal_items"""
+    return (
+        func.count(MealLogItem.id).label("times_logged"),
+        func.coalesce(func.sum(MealLogItem.grams), 0.0).label("grams"),
+        func.coalesce(func.sum(MealLogItem.calories), 0).label("calories"),
+        func.coalesce(func.sum(MealLogItem.protein_g), 0.0).label("protein_g"),
+        func.coalesce(func.sum(MealLogItem.carbs_g), 0.0).label("carbs_g"),
+        func.coalesce(func.sum(MealLogItem.fats_g), 0.0).label("fats_g"),
+        func.min(MealLogItem.logged_at).label("first_logged_at"),
+        func.max(MealLogItem.logged_at).label("last_logged_at"),
+    )
+
+
 @router.post("/", response_model=MealLogResponse, status_code=status.HTTP_201_CREATED)
 async def log_meal(
     meal_data: MealLogCreate,
@@ -29,23 +74,27 @@ async def log_meal(
         user_id=current_user.id,
         meal_type=meal_data.meal_type,
         notes=meal_data.notes,
-        logged_at=meal_data.logged_at or datetime.utcnow()
+        logged_at=meal_data.logged_at or datetime.now(timezone.utc)
     )
     
-    # Set items and compute totals
+    # Compute totals and build the item rows
     items_list = [item.model_dump() for item in meal_data.items]
-    meal.set_items(items_list)
+    rows = meal.set_items(items_list)
     
     session.add(meal)
+    await session.flush()  # assigns meal.id
+    for row in rows:
+        row.meal_id = meal.id
+    session.add_all(rows)
+    await daily_nutrition.record(session, meal, await user_timezone(session, current_user.id))
     await session.commit()
-    await session.refresh(meal)
     
     return MealLogResponse(
         id=meal.id,
         user_id=meal.user_id,
         logged_at=meal.logged_at,
         meal_type=meal.meal_type,
-        items=meal.get_items(),
+        items=[row.to_item() for row in rows],
         calories_total=meal.calories_total,
         protein_total=meal.protein_total,
         carbs_total=meal.carbs_total,
@@ -57,46 +106,33 @@ async def log_meal(
 @router.get("/today", response_model=DailySummary)
 async def get_today_meals(
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get all meals logged today with summary"""
-    today = date.today()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
+    tz = await user_timezone(session, current_user.id)
+    today = local_today(tz)
+    start_of_day, end_of_day = day_window(today, tz)
     
     result = await session.execute(
         select(MealLog)
         .where(MealLog.user_id == current_user.id)
         .where(MealLog.logged_at >= start_of_day)
-        .where(MealLog.logged_at <= end_of_day)
+        .where(MealLog.logged_at < end_of_day)
         .order_by(MealLog.logged_at)
     )
     meals = result.scalars().all()
     
     # Build response
-    meal_responses = [
-        MealLogResponse(
-            id=m.id,
-            user_id=m.user_id,
-            logged_at=m.logged_at,
-            meal_type=m.meal_type,
-            items=m.get_items(),
-            calories_total=m.calories_total,
-            protein_total=m.protein_total,
-            carbs_total=m.carbs_total,
-            fats_total=m.fats_total,
-            notes=m.notes
-        )
-        for m in meals
-    ]
+    meal_responses = await _meal_responses(session, meals)
+    totals = await daily_nutrition.get_day(session, current_user.id, today)
     
     return DailySummary(
         date=today.isoformat(),
-        calories_total=sum(m.calories_total for m in meals),
-        protein_total=sum(m.protein_total for m in meals),
-        carbs_total=sum(m.carbs_total for m in meals),
-        fats_total=sum(m.fats_total for m in meals),
-        meals_count=len(meals),
+        calories_total=totals.calories,
+        protein_total=totals.protein_g,
+        carbs_total=totals.carbs_g,
+        fats_total=totals.fats_g,
+        meals_count=totals.meals_count,
         meals=meal_responses
     )
 
@@ -106,36 +142,60 @@ async def get_meals(
     date_filter: date = Query(None, alias="date"),
     limit: int = Query(20, le=100),
     current_user: User = Depends(get_current_user_required),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """Get meals with optional date filter"""
     query = select(MealLog).where(MealLog.user_id == current_user.id)
     
     if date_filter:
-        start = datetime.combine(date_filter, datetime.min.time())
-        end = datetime.combine(date_filter, datetime.max.time())
-        query = query.where(MealLog.logged_at >= start).where(MealLog.logged_at <= end)
+        start, end = day_window(date_filter, await user_timezone(session, current_user.id))
+        query = query.where(MealLog.logged_at >= start).where(MealLog.logged_at < end)
     
     query = query.order_by(MealLog.logged_at.desc()).limit(limit)
     
     result = await session.execute(query)
     meals = result.scalars().all()
     
-    return [
-        MealLogResponse(
-            id=m.id,
-            user_id=m.user_id,
-            logged_at=m.logged_at,
-            meal_type=m.meal_type,
-            items=m.get_items(),
-            calories_total=m.calories_total,
-            protein_total=m.protein_total,
-            carbs_total=m.carbs_total,
-            fats_total=m.fats_total,
-            notes=m.notes
-        )
-        for m in meals
-    ]
+    return await _meal_responses(session, meals)
+
+
+@router.get("/foods", response_model=list[FoodIntake])
+async def get_top_foods(
+    days: int = Query(30, ge=1, le=365),
+    limit: int = Query(10, le=50),
+    current_user: User = Depends(get_current_user_required),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Foods logged most in the last N days, by calories"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    result = await session.execute(
+        select(MealLogItem.food_name, *_intake_columns())
+        .where(MealLogItem.user_id == current_user.id)
+        .where(MealLogItem.logged_at >= since)
+        .group_by(MealLogItem.food_name)
+        .order_by(func.sum(MealLogItem.calories).desc())
+        .limit(limit)
+    )
+    return [FoodIntake(**row._mapping) for row in result]
+
+
+@router.get("/foods/{food_name}", response_model=FoodIntake)
+async def get_food_intake(
+    food_name: str,
+    days: int = Query(30, ge=1, le=365),
+    current_user: User = Depends(get_current_user_required),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """How much of one food was logged in the last N days"""
+    key = food_key(food_name)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    result = await session.execute(
+        select(literal(key).label("food_name"), *_intake_columns())
+        .where(MealLogItem.user_id == current_user.id)
+        .where(MealLogItem.food_name == key)
+        .where(MealLogItem.logged_at >= since)
+    )
+    return FoodIntake(**result.one()._mapping)
 
 
 @router.delete("/{meal_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -158,5 +218,7 @@ async def delete_meal(
             detail="Meal not found"
         )
     
+    await session.execute(delete(MealLogItem).where(MealLogItem.meal_id == meal.id))
+    await daily_nutrition.record(session, meal, await user_timezone(session, current_user.id), sign=-1)
     await session.delete(meal)
     await session.commit()
@@ -0,0 +1,124 @@
+"""
+End-to-end benchmark of the AI routes against the offline model (no key or network needed)
+Run: python -m scripts.benchmark_ai [--requests 40] [--concurrency 8] [--flows fridge,fitness]
+
+Requests go through the full FastAPI app in-process, against a fresh temporary database.
+The model is services.fake_model.FakeModel unless AI_PROVIDER is set; tune it with the
+AI_FAKE_* variables (latency distribution, error and quota rates, streaming) and replay
+real responses captured with AI_RECORDINGS_PATH.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before the app (and its settings) are imported
+os.environ.setdefault("AI_PROVIDER", "fake")
+if os.environ["AI_PROVIDER"] == "fake":
+    os.environ.setdefault("GEMINI_API_KEY", "offline")  # the routes only check that a key is set
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/benchmark.db")
+os.environ.setdefault("DAILY_PREGENERATE", "0")
+
+from httpx import AsyncClient, ASGITransport
+
+from database import create_db_and_tables
+from main import app
+from routes.cuisine import SUPPORTED_CUISINES
+from routes.drinks import DRINK_CATEGORIES
+from routes.fitness import FITNESS_GOALS
+
+PANTRY = ["eggs", "onion", "tomato", "rice", "chicken", "spinach", "paneer", "potato",
+          "garlic", "ginger", "lentils", "bread", "cheese", "mushroom", "carrot", "peas"]
+DIETS = ["veg", "egg", "non-veg"]
+
+
+def fridge_request(rng: random.Random, stream: bool = False):
+    ingredients = ", ".join(rng.sample(PANTRY, rng.randint(2, 5)))
+    path = "/api/fridge/match/stream" if stream else "/api/fridge/match"
+    return "POST", path, {"json": {"ingredients": ingredients, "cuisine": rng.choice(SUPPORTED_CUISINES)}}
+
+
+FLOWS = {
+    "fridge": fridge_request,
+    "fridge_stream": lambda rng: fridge_request(rng, stream=True),
+    "fitness": lambda rng: ("GET", f"/api/fitness/recommendation/{rng.choice(FITNESS_GOALS)}",
+                            {"params": {"diet": rng.choice(DIETS)}}),
+    "cuisine": lambda rng: ("GET", f"/api/cuisine/recommendation/{rng.choice(SUPPORTED_CUISINES)}",
+                            {"params": {"diet": rng.choice(DIETS)}}),
+    "drinks": lambda rng: ("GET", f"/api/drinks/recommendation/{rng.choice(DRINK_CATEGORIES)}",
+                           {"params": {"goal": rng.choice(["energy", "recovery", "hydration"])}}),
+}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def run_flow(client: AsyncClient, flow: str, requests: int, concurrency: int, rng: random.Random) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses, ai_generated = [], {}, 0
+
+    async def one():
+        nonlocal ai_generated
+        method, path, kwargs = FLOWS[flow](rng)
+        async with semaphore:
+            started = time.perf_counter()
+            res = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+        if flow == "fridge" and res.status_code == 200 and res.json().get("ai_generated"):
+            ai_generated += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    return {
+        "flow": flow,
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies),
+        "statuses": statuses,
+        "ai_generated": ai_generated if flow == "fridge" else None,
+    }
+
+
+async def benchmark(flows: list[str], requests: int, concurrency: int, seed: int):
+    await create_db_and_tables()
+    rng = random.Random(seed)
+
+    print(f"provider={os.environ['AI_PROVIDER']} latency={os.getenv('AI_FAKE_LATENCY_MS', 'default')} "
+          f"requests={requests} concurrency={concurrency}")
+    print(f"{'flow':<14} {'req/s':>7} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8}  statuses")
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for flow in flows:
+            result = await run_flow(client, flow, requests, concurrency, rng)
+            extra = f" ai_generated={result['ai_generated']}/{requests}" if result["ai_generated"] is not None else ""
+            print(f"{flow:<14} {result['rps']:>7.1f} {result['p50']:>8.0f} {result['p95']:>8.0f} "
+                  f"{result['max']:>8.0f}  {result['statuses']}{extra}")
+
+        status = (await client.get("/api/ai/status")).json()
+        print(f"model calls={status['generation']['calls']} failures={status['generation']['failures']} "
+              f"cache hits={status['cache'].get('hits')} coalesced={status['coalescing']['coalesced']} "
+              f"circuit={status['circuit']['state']}")
+
+    from services.ai_service import shutdown_executor
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="requests per flow")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--flows", default=",".join(FLOWS), help=f"comma-separated subset of {','.join(FLOWS)}")
+    parser.add_argument("--seed", type=int, default=7, help="seed for the request mix")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.flows.split(","), args.requests, args.concurrency, args.seed))
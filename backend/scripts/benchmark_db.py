@@ -0,0 +1,123 @@
+"""
+Mixed read/write benchmark of the database engine profiles
+Run: python -m scripts.benchmark_db [--writers 4] [--readers 16] [--seconds 5] [--profiles default,sqlite]
+
+Each profile gets a fresh temporary SQLite file. Writer tasks log meals while reader tasks run the
+dashboard's "meals today" query, all in one event loop like the app. Reports throughput, p95
+latency and how many operations failed with "database is locked".
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel
+
+from database import create_engines
+from models.meal_log import MealLog
+from models.user import User
+
+USERS = 50
+
+INSERT_MEAL = text(
+    "INSERT INTO meal_logs (user_id, logged_at, meal_type, calories_total, protein_total, "
+    "carbs_total, fats_total, created_at, updated_at) "
+    "VALUES (:user_id, :now, 'snack', :calories, 10, 20, 5, :now, :now)"
+)
+SELECT_TODAY = text(
+    "SELECT id, calories_total FROM meal_logs WHERE user_id = :user_id AND logged_at >= :since "
+    "ORDER BY logged_at DESC"
+)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def run_profile(profile: str, writers: int, readers: int, seconds: float, seed: int) -> dict:
+    url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    writer, reader = create_engines(url, profile)
+    async with writer.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all, tables=[User.__table__, MealLog.__table__])
+
+    rng = random.Random(seed)
+    since = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    latencies = {"read": [], "write": []}
+    locked = {"read": 0, "write": 0}
+    deadline = time.perf_counter() + seconds
+
+    async def write_loop():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with writer.begin() as conn:
+                    await conn.execute(INSERT_MEAL, {
+                        "user_id": rng.randint(1, USERS),
+                        "now": datetime.now(timezone.utc),
+                        "calories": rng.randint(100, 900),
+                    })
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked["write"] += 1
+                continue
+            latencies["write"].append((time.perf_counter() - started) * 1000)
+
+    async def read_loop():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with reader.connect() as conn:
+                    (await conn.execute(SELECT_TODAY, {"user_id": rng.randint(1, USERS), "since": since})).all()
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked["read"] += 1
+                continue
+            latencies["read"].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[write_loop() for _ in range(writers)], *[read_loop() for _ in range(readers)])
+    elapsed = time.perf_counter() - started
+
+    await writer.dispose()
+    if reader is not writer:
+        await reader.dispose()
+    return {
+        "profile": profile,
+        "reads": len(latencies["read"]) / elapsed,
+        "writes": len(latencies["write"]) / elapsed,
+        "read_p95": percentile(latencies["read"], 95),
+        "write_p95": percentile(latencies["write"], 95),
+        "locked": locked,
+    }
+
+
+async def benchmark(profiles: list[str], writers: int, readers: int, seconds: float, seed: int):
+    print(f"writers={writers} readers={readers} seconds={seconds}")
+    print(f"{'profile':<9} {'reads/s':>8} {'writes/s':>9} {'read_p95':>9} {'write_p95':>10}  locked")
+    for profile in profiles:
+        result = await run_profile(profile, writers, readers, seconds, seed)
+        print(f"{profile:<9} {result['reads']:>8.0f} {result['writes']:>9.0f} {result['read_p95']:>9.1f} "
+              f"{result['write_p95']:>10.1f}  {result['locked']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4, help="concurrent writer tasks")
+    parser.add_argument("--readers", type=int, default=16, help="concurrent reader tasks")
+    parser.add_argument("--seconds", type=float, default=5, help="duration per profile")
+    parser.add_argument("--profiles", default="default,sqlite", help="comma-separated engine profiles")
+    parser.add_argument("--seed", type=int, default=7, help="seed for the user mix")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.profiles.split(","), args.writers, args.readers, args.seconds, args.seed))
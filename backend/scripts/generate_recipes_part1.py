@@ -28,7 +28,8 @@ data = {
         "toor dal": ["arhar dal", "pigeon peas"],
         "moong dal": ["mung dal", "mung beans", "green gram"],
         "basmati rice": ["rice", "chawal"],
-        "wheat flour": ["atta", "whole wheat flour", "flour"]
+        "wheat flour": ["atta", "whole wheat flour", "flour"],
+        "kidney beans": ["rajma", "red kidney beans"]
     }
 }
 
@@ -0,0 +1,80 @@
+"""
+Measure prompt size, output tokens and latency of the AI generators
+Run: python -m scripts.measure_prompts [--runs 3] [--free-text]
+
+Without GEMINI_API_KEY only prompt sizes are reported (tokens estimated as chars / 4).
+With a key, input tokens come from count_tokens, and each kind is generated --runs times,
+reporting output tokens and end-to-end latency. --free-text disables the JSON schema
+to compare against unconstrained output.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services import ai_service
+from services.response_schema import DRINK_SCHEMA, FRIDGE_RECIPE_SCHEMA, RECIPE_SCHEMA, json_config
+
+
+def sample_prompts() -> dict[str, tuple[str, dict]]:
+    """One representative prompt per kind, with its response schema"""
+    fridge, _ = ai_service._build_recipe_prompt(
+        ["chicken", "rice", "onion", "tomato"], "non-veg", "Indian", None, 2, 200
+    )
+    fitness, _ = ai_service._fitness_prompt("muscle_gain", None, 30)
+    cuisine, _ = ai_service._cuisine_prompt("Japanese", None, "Easy")
+    drink, _ = ai_service._drink_prompt("healthy", None, None)
+    return {
+        "fridge": (fridge, FRIDGE_RECIPE_SCHEMA),
+        "fitness": (fitness, RECIPE_SCHEMA),
+        "cuisine": (cuisine, RECIPE_SCHEMA),
+        "drink": (drink, DRINK_SCHEMA),
+    }
+
+
+async def measure(runs: int, free_text: bool):
+    prompts = sample_prompts()
+    model = ai_service.get_gemini_model() if ai_service.GEMINI_API_KEY else None
+
+    print(f"{'kind':<8} {'chars':>6} {'in_tok':>7} {'out_tok':>8} {'avg_ms':>8} {'parsed':>7}")
+    for kind, (prompt, schema) in prompts.items():
+        if model is None:
+            print(f"{kind:<8} {len(prompt):>6} {len(prompt) // 4:>6}~ {'-':>8} {'-':>8} {'-':>7}")
+            continue
+
+        input_tokens = model.count_tokens(prompt).total_tokens
+        kwargs = {} if free_text else {"generation_config": json_config(schema)}
+        output_tokens, elapsed, parsed = [], [], 0
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = await ai_service.run_generation(model, prompt, **kwargs)
+            elapsed.append((time.perf_counter() - started) * 1000)
+            output_tokens.append(response.usage_metadata.candidates_token_count)
+            try:
+                ai_service.extract_json_from_response(response.text)
+                parsed += 1
+            except ValueError:
+                pass
+
+        print(
+            f"{kind:<8} {len(prompt):>6} {input_tokens:>7} {sum(output_tokens) / runs:>8.0f} "
+            f"{sum(elapsed) / runs:>8.0f} {parsed:>4}/{runs}"
+        )
+
+    ai_service.shutdown_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="generations per kind")
+    parser.add_argument("--free-text", action="store_true", help="disable schema-constrained JSON output")
+    args = parser.parse_args()
+    asyncio.run(measure(args.runs, args.free_text))
@@ -0,0 +1,40 @@
+"""
+Rebuild the daily_nutrition rollups from meal_logs
+Run: python -m scripts.rebuild_daily_nutrition [--user 42]
+
+Meal routes keep the rollups up to date; run this after changing meal_logs outside the API
+(imports, manual fixes). The rebuild groups meals by local date in SQL, one INSERT ... SELECT
+per timezone in use, in a single transaction, so readers see either the old or the new totals.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import create_db_and_tables, dispose_engines, engine
+from services.daily_nutrition import daily_nutrition
+
+
+async def rebuild(user_id):
+    await create_db_and_tables()
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        rows = await conn.run_sync(daily_nutrition.rebuild, user_id)
+    scope = f"user {user_id}" if user_id is not None else "all users"
+    print(f"Rebuilt {rows} daily rollups for {scope} in {(time.perf_counter() - started) * 1000:.0f}ms")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user", type=int, default=None, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.user))
@@ -0,0 +1,40 @@
+"""
+Standalone AI job worker: runs jobs queued through /api/jobs outside the web processes
+Run: AI_JOB_WORKERS=4 python -m scripts.run_ai_worker
+
+Start the web app with AI_JOB_WORKERS=0 so that only worker processes claim jobs.
+Several workers can share one database; each job is claimed by exactly one of them.
+"""
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import create_db_and_tables
+from services.job_queue import job_queue
+import routes.jobs  # noqa: F401  registers the job handlers
+
+
+async def run_worker():
+    await create_db_and_tables()
+    job_queue.start()
+    print(f"AI job worker started with {job_queue.workers} workers")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_queue.stop()
+        from services.ai_service import shutdown_executor
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        print("AI job worker stopped")
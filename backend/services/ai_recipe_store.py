@@ -0,0 +1,192 @@
+"""
+AI Recipe Store
+Content-addressed store for generated recipes: an in-process LRU backed by the ai_recipes table,
+so /recipe/{id} resolves on any worker and after restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from models.recipe import Recipe
+
+AI_RECIPE_MEMORY_ENTRIES = int(os.getenv("AI_RECIPE_MEMORY_ENTRIES", "2000"))
+AI_RECIPE_MAX_ROWS = int(os.getenv("AI_RECIPE_MAX_ROWS", "100000"))
+# Saving a recipe this worker already stored refreshes its row's last_seen_at at most this often
+AI_RECIPE_TOUCH_SECONDS = float(os.getenv("AI_RECIPE_TOUCH_SECONDS", "3600"))
+
+# Prune least-recently-seen rows every N saves
+PRUNE_EVERY = 200
+
+
+def content_hash(recipe: Recipe) -> str:
+    """Hash of a recipe's content, ignoring its id"""
+    content = recipe.model_dump(exclude={"id"})
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def content_id(recipe: Recipe, digest: str) -> str:
+    """
+    Stable id for a recipe's content: the original prefix (ai, fitness, cuisine, backup),
+    a readable slug of the name, and a hash fragment so different recipes never collide.
+    """
+    prefix = recipe.id.split("-", 1)[0] if recipe.id else "ai"
+    slug = re.sub(r"[^a-z0-9]+", "-", recipe.name.lower()).strip("-")[:40]
+    return f"{prefix}-{slug}-{digest[:12]}" if slug else f"{prefix}-{digest[:12]}"
+
+
+class AIRecipeStore:
+    """Bounded, shared store of generated recipes deduplicated by content"""
+
+    def __init__(
+        self,
+        max_entries: int = AI_RECIPE_MEMORY_ENTRIES,
+        max_rows: int = AI_RECIPE_MAX_ROWS,
+        touch_seconds: float = AI_RECIPE_TOUCH_SECONDS,
+        session_factory=None,
+        persistent: bool = True
+    ):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.touch_seconds = touch_seconds
+        self.persistent = persistent
+        self._session_factory = session_factory
+        # A factory passed in (tests, scripts) serves reads as well
+        self._read_session_factory = session_factory
+        self._memory: "OrderedDict[str, Recipe]" = OrderedDict()
+        # id -> when this worker last wrote its row (ids in memory only)
+        self._written: dict[str, float] = {}
+        self._saves = 0
+        self.stats = {"saves": 0, "deduplicated": 0, "memory_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0}
+
+    def _get_session_factory(self):
+        if self._session_factory is None:
+            from database import async_session
+            self._session_factory = async_session
+        return self._session_factory
+
+    def _get_read_session_factory(self):
+        """Read-only lookups use the read pool, so they never queue behind writes"""
+        if self._read_session_factory is None:
+            from database import read_session
+            self._read_session_factory = read_session
+        return self._read_session_factory
+
+    def remember(self, recipe: Recipe) -> Recipe:
+        """Address a recipe by its content and keep it in memory; returns the re-identified recipe"""
+        digest = content_hash(recipe)
+        stored = recipe.model_copy(update={"id": content_id(recipe, digest)})
+        self._memory_put(stored)
+        return stored
+
+    async def save(self, recipe: Recipe) -> Recipe:
+        """Store a recipe in memory and in the shared table; returns it with its content id"""
+        digest = content_hash(recipe)
+        known = content_id(recipe, digest) in self._memory
+        stored = self.remember(recipe)
+        self.stats["saves"] += 1
+        written = self._written.get(stored.id)
+        if not self.persistent or (written is not None and time.time() - written < self.touch_seconds):
+            # Daily picks and repeat generations are saved on every request: skip the writer
+            if known:
+                self.stats["deduplicated"] += 1
+            return stored
+
+        try:
+            from models.ai_recipe import StoredAIRecipe
+            async with self._get_session_factory()() as session:
+                existing = await session.get(StoredAIRecipe, stored.id)
+                if existing:
+                    existing.last_seen_at = time.time()
+                    self.stats["deduplicated"] += 1
+                else:
+                    session.add(StoredAIRecipe(
+                        id=stored.id,
+                        content_hash=digest,
+                        payload=stored.model_dump_json()
+                    ))
+                await session.commit()
+                if stored.id in self._memory:
+                    self._written[stored.id] = time.time()
+
+                self._saves += 1
+                if self._saves % PRUNE_EVERY == 0:
+                    await self._prune(session)
+        except Exception as e:
+            # Another worker may have inserted the same content first; memory copy still serves
+            self.stats["errors"] += 1
+            print(f"AI recipe store write failed: {e}")
+        return stored
+
+    def get_cached(self, recipe_id: str) -> Optional[Recipe]:
+        """In-process lookup only"""
+        recipe = self._memory.get(recipe_id)
+        if recipe is not None:
+            self._memory.move_to_end(recipe_id)
+            self.stats["memory_hits"] += 1
+        return recipe
+
+    async def get(self, recipe_id: str) -> Optional[Recipe]:
+        """Look up a recipe in memory, then in the shared table"""
+        recipe = self.get_cached(recipe_id)
+        if recipe is not None or not self.persistent:
+            return recipe
+
+        try:
+            from models.ai_recipe import StoredAIRecipe
+            async with self._get_read_session_factory()() as session:
+                row = await session.get(StoredAIRecipe, recipe_id)
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                recipe = Recipe(**row.get_payload())
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"AI recipe store read failed: {e}")
+            return None
+
+        self.stats["persistent_hits"] += 1
+        self._memory_put(recipe)
+        return recipe
+
+    def forget(self, recipe_id: str):
+        """Drop a recipe from the in-process tier"""
+        self._memory.pop(recipe_id, None)
+        self._written.pop(recipe_id, None)
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {**self.stats, "memory_entries": len(self._memory), "max_entries": self.max_entries}
+
+    def _memory_put(self, recipe: Recipe):
+        self._memory[recipe.id] = recipe
+        self._memory.move_to_end(recipe.id)
+        while len(self._memory) > self.max_entries:
+            evicted, _ = self._memory.popitem(last=False)
+            self._written.pop(evicted, None)
+
+    async def _prune(self, session):
+        """Delete the least-recently-seen rows beyond max_rows"""
+        from sqlmodel import select, delete
+        from models.ai_recipe import StoredAIRecipe
+
+        cutoff = await session.execute(
+            select(StoredAIRecipe.last_seen_at)
+            .order_by(StoredAIRecipe.last_seen_at.desc())
+            .offset(self.max_rows)
+            .limit(1)
+        )
+        oldest_kept = cutoff.scalar_one_or_none()
+        if oldest_kept is not None:
+            await session.execute(
+                delete(StoredAIRecipe).where(StoredAIRecipe.last_seen_at <= oldest_kept)
+            )
+            await session.commit()
+
+
+# Singleton instance
+ai_recipe_store = AIRecipeStore()
@@ -2,134 +2,424 @@
 Gemini AI Service for LLM-powered recipe generation
 """
 import google.generativeai as genai
+import asyncio
 import json
 import os
 import re
 import random
-from typing import Optional
-from models.recipe import Recipe, Nutrition
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple, Optional
+from google.api_core import exceptions as google_exceptions
+from models.recipe import Recipe, Nutrition, Drink
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.daily_recommendations import daily_recommendations
+from services.generation_cache import generation_cache, make_generation_key
+from services.nutrition import nutrition_table
+from services.response_schema import DRINK_SCHEMA, FRIDGE_RECIPE_SCHEMA, RECIPE_SCHEMA, array_of, json_config
+from services.similarity_index import MinHashLSH, SimilarMatch
+from services.single_flight import SingleFlight
+from services.streaming import IncrementalJSONParser
 
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# "gemini", or "fake" for the offline stand-in in services.fake_model (no key or network needed)
+AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini").lower()
+
+# Concurrency limits for model calls (per process)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS", str(AI_MAX_CONCURRENCY)))
+# Upper bound for one (possibly shared) generation, in seconds
+AI_GENERATION_TIMEOUT = float(os.getenv("AI_GENERATION_TIMEOUT", "60"))
 
 def get_gemini_model():
-    """Initialize and return Gemini model"""
+    """
+    Initialize and return Gemini model (or the offline stand-in when AI_PROVIDER=fake).
+    With AI_RECORDINGS_PATH set, real responses are also recorded for later replay.
+    """
+    if AI_PROVIDER == "fake":
+        from services.fake_model import get_fake_model
+        return get_fake_model()
+    
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY environment variable not set")
     
     genai.configure(api_key=GEMINI_API_KEY)
-    return genai.GenerativeModel(
+    model = genai.GenerativeModel(
         'models/gemini-2.5-flash',
         generation_config={
             "temperature": 0.7,
             "top_p": 0.95,
         }
     )
+    
+    from services.fake_model import AI_RECORDINGS_PATH, RecordingModel
+    if AI_RECORDINGS_PATH:
+        return RecordingModel(model, AI_RECORDINGS_PATH)
+    return model
+
+# ============= EXECUTION =============
+
+class GenerationStats:
+    """Counters for model calls: queueing, concurrency, latency and token usage"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_call_ms = 0.0
+        self.max_call_ms = 0.0
+        self.metered_calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+    
+    def record_usage(self, usage):
+        """Add a response's usage_metadata (prompt and output token counts)"""
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        if isinstance(prompt_tokens, int) and isinstance(output_tokens, int):
+            self.metered_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+    
+    def record_wait(self, wait_ms: float):
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+    
+    def record_call(self, call_ms: float, failed: bool):
+        self.calls += 1
+        if failed:
+            self.failures += 1
+        self.total_call_ms += call_ms
+        self.max_call_ms = max(self.max_call_ms, call_ms)
+    
+    def snapshot(self) -> dict:
+        """Current values, suitable for a status endpoint"""
+        return {
+            "max_concurrency": AI_MAX_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "failures": self.failures,
+            "avg_queue_wait_ms": round(self.total_wait_ms / self.calls, 1) if self.calls else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_ms, 1),
+            "avg_call_ms": round(self.total_call_ms / self.calls, 1) if self.calls else 0.0,
+            "max_call_ms": round(self.max_call_ms, 1),
+            "avg_prompt_tokens": round(self.prompt_tokens / self.metered_calls, 1) if self.metered_calls else 0.0,
+            "avg_output_tokens": round(self.output_tokens / self.metered_calls, 1) if self.metered_calls else 0.0
+        }
+
+
+generation_stats = GenerationStats()
 
-RECIPE_GENERATION_PROMPT = """You are a creative home cooking chef. Your task is to ALWAYS CREATE a recipe with ANY ingredients provided - never refuse. Also suggest improvements and popular alternatives.
-
-**Available Ingredients:** {ingredients}
-**Diet Preference:** {diet}
-**Cuisine Style:** {cuisine}
-**Fitness Goal:** {goal}
-**Servings:** {servings} people
-**Serving Size:** {serving_size}g per person
-
-**CRITICAL RULES:**
-1. **ALWAYS create a recipe** - even with 1-2 ingredients, create something simple and delicious.
-2. Create a UNIQUE recipe name - be creative! Use fusion names, local twists, or fun descriptive names.
-3. Use ONLY provided ingredients + basic pantry (salt, pepper, oil, water, common spices).
-4. **Adjust ingredient quantities for {servings} people, each serving being {serving_size}g.**
-5. Maximum 6 clear steps, each under 15 words.
-6. **Nutrition values must be PER SERVING.**
-7. **ALWAYS suggest 3-6 ingredients** that would enhance this recipe in "suggested_ingredients".
-8. **ALWAYS suggest 2 popular recipes** the user could make with a few more ingredients in "recipe_suggestions".
-
-**VARIETY:** Consider:
-- Cooking techniques: stir-fry, sauté, roast, steam, one-pot.
-- Textures: crispy, creamy, crunchy, tender.
-- Flavor profiles: spicy, tangy, savory, umami.
-
-Generate JSON with this structure:
-{{
-  "id": "ai-{recipe_slug}",
-  "name": "Creative Unique Recipe Name",
-  "cuisine": "{cuisine}",
-  "category": "food",
-  "fitness_tags": ["balanced"],
-  "diet": "veg|non-veg",
-  "difficulty": "Easy|Medium",
-  "time_minutes": 15,
-  "required_ingredients": ["200g ingredient1", "100g ingredient2"],
-  "optional_ingredients": ["optional enhancement"],
-  "cookware": ["pan"],
-  "steps": [
-    "Step 1: Specific action",
-    "Step 2: Next action"
-  ],
-  "common_mistakes": [
-    "Pro tip 1",
-    "Pro tip 2"
-  ],
-  "nutrition": {{
-    "calories": 250,
-    "protein_g": 20,
-    "carbs_g": 15,
-    "fats_g": 12
-  }},
-  "servings": {servings},
-  "serving_size_g": {serving_size},
-  "cooking_impact": "What makes this dish special",
-  "suggested_ingredients": [
-    "paneer - adds protein and creaminess",
-    "garam masala - enhances flavor",
-    "cream - makes it richer",
-    "bell pepper - adds crunch and color"
-  ],
-  "recipe_suggestions": [
-    {{
-      "name": "Paneer Butter Masala",
-      "region": "Punjab, India",
-      "missing_ingredients": ["paneer", "butter", "cream"]
-    }},
-    {{
-      "name": "Thai Basil Stir-Fry",
-      "region": "Thailand",
-      "missing_ingredients": ["basil", "fish sauce", "thai chili"]
-    }}
-  ]
-}}"""
+# Blocking SDK calls run here so they never stall the event loop
+_executor = ThreadPoolExecutor(max_workers=AI_EXECUTOR_WORKERS, thread_name_prefix="gemini")
+
+# One semaphore per event loop (asyncio primitives are bound to the loop that first waits on them)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+# Fails calls fast while Gemini is down or rate-limiting, so callers go straight to their fallback
+ai_breaker = CircuitBreaker("Gemini")
+
+def _is_quota_error(error: Exception) -> bool:
+    return isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests))
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Wait the provider asked for in a quota error ("retry in 37.2s" / retry_delay {seconds: 37})"""
+    match = re.search(r"retry in ([\d.]+)s|retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+    if not match:
+        return None
+    return float(match.group(1) or match.group(2))
+
+@asynccontextmanager
+async def _generation_slot():
+    """
+    Hold one of the AI_MAX_CONCURRENCY call slots.
+    Raises CircuitOpenError right away, without queueing, while ai_breaker is open.
+    Callers beyond the limit queue on a semaphore; wait time and call latency are recorded,
+    and each call's outcome is fed to ai_breaker.
+    """
+    if not ai_breaker.allow():
+        raise CircuitOpenError(ai_breaker.name, ai_breaker.retry_in())
+    
+    queued_at = time.perf_counter()
+    generation_stats.waiting += 1
+    try:
+        await _get_semaphore().acquire()
+    except BaseException:
+        # Never started: give back a half-open probe
+        ai_breaker.record_cancelled(0.0)
+        raise
+    finally:
+        generation_stats.waiting -= 1
+    
+    started_at = time.perf_counter()
+    generation_stats.record_wait((started_at - queued_at) * 1000)
+    generation_stats.in_flight += 1
+    failed = True
+    try:
+        yield
+        failed = False
+    except Exception as e:
+        ai_breaker.record_failure(
+            (time.perf_counter() - started_at) * 1000,
+            quota=_is_quota_error(e),
+            retry_after=_retry_after_seconds(e) if _is_quota_error(e) else None
+        )
+        raise
+    except BaseException:
+        # Cancelled, or a stream closed early by its consumer
+        ai_breaker.record_cancelled((time.perf_counter() - started_at) * 1000)
+        raise
+    else:
+        ai_breaker.record_success((time.perf_counter() - started_at) * 1000)
+    finally:
+        generation_stats.in_flight -= 1
+        generation_stats.record_call((time.perf_counter() - started_at) * 1000, failed)
+        _get_semaphore().release()
+
+async def run_generation(model, prompt, **kwargs):
+    """Run model.generate_content on the bounded executor"""
+    async with _generation_slot():
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            _executor, lambda: model.generate_content(prompt, **kwargs)
+        )
+        generation_stats.record_usage(getattr(response, "usage_metadata", None))
+        return response
+
+async def run_generation_stream(model, prompt, **kwargs) -> AsyncIterator[str]:
+    """
+    Stream text chunks from model.generate_content(stream=True).
+    The SDK iterator is drained on the bounded executor and handed back through a queue;
+    it stops early if the consumer goes away.
+    """
+    async with _generation_slot():
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+        
+        def produce():
+            try:
+                usage = None
+                for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                    if stop.is_set():
+                        break
+                    usage = getattr(chunk, "usage_metadata", usage)
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text or "")
+                # The final chunk carries the totals for the whole response
+                generation_stats.record_usage(usage)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        
+        producer = loop.run_in_executor(_executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            if producer.done():
+                producer.exception()
+
+def shutdown_executor():
+    """Stop the model-call thread pool (called on app shutdown)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+# ============= CACHING & COALESCING =============
+
+# Concurrent requests with the same generation key share one model call
+generation_flight = SingleFlight("ai-generation", timeout=AI_GENERATION_TIMEOUT)
+
+async def _cached_generation(
+    key: str,
+    kind: str,
+    generate: Callable[[], Awaitable],
+    as_recipe: bool = True
+):
+    """
+    Serve a generation from the cache, or run it and store the result.
+    Recipes are cached as plain dicts and re-validated on the way out.
+    On a miss, identical concurrent requests await a single in-flight generation.
+    """
+    cached = await generation_cache.get(key)
+    if cached is not None:
+        try:
+            return Recipe(**cached) if as_recipe else json.loads(json.dumps(cached))
+        except Exception as e:
+            print(f"Discarding invalid cached {kind} generation: {e}")
+    
+    async def generate_and_store():
+        result = await generate()
+        if result is not None:
+            payload = result.model_dump() if as_recipe else result
+            await generation_cache.put(key, payload, kind=kind)
+        return result
+    
+    try:
+        return await generation_flight.do(key, generate_and_store)
+    except asyncio.TimeoutError:
+        print(f"AI {kind} generation timed out after {AI_GENERATION_TIMEOUT:.0f}s")
+        return None
+
+# ============= LATENCY BUDGETS =============
+
+# Generations that outlived their request's budget, kept referenced until they finish
+_background_generations: set = set()
+hedge_stats = {"within_budget": 0, "over_budget": 0, "upgrades_ready": 0, "upgrades_failed": 0}
+
+def _finish_background(task: asyncio.Task):
+    _background_generations.discard(task)
+    if task.cancelled() or task.exception() is not None or task.result() is None:
+        hedge_stats["upgrades_failed"] += 1
+    else:
+        hedge_stats["upgrades_ready"] += 1
+
+async def run_within_budget(generation: Awaitable, budget_seconds: float) -> tuple[bool, Any]:
+    """
+    Await a generation for at most budget_seconds.
+    Returns (True, result) if it finished in time. Otherwise returns (False, None) and the
+    generation keeps running in the background, so its result still lands in the generation cache.
+    A budget of 0 or less waits without limit.
+    """
+    task = asyncio.ensure_future(generation)
+    if budget_seconds <= 0:
+        return True, await task
+    
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout=budget_seconds)
+    except asyncio.TimeoutError:
+        hedge_stats["over_budget"] += 1
+        _background_generations.add(task)
+        task.add_done_callback(_finish_background)
+        return False, None
+    
+    hedge_stats["within_budget"] += 1
+    return True, result
+
+async def get_pending_recipe(key: str) -> tuple[str, Optional[Recipe]]:
+    """
+    Look up a recipe generation that outlived its budget.
+    Returns ("ready", recipe) once it is cached, ("pending", None) while it is still running
+    in this process, or ("unavailable", None) if it failed or is unknown here.
+    """
+    cached = await generation_cache.peek(key)
+    if cached is not None:
+        try:
+            return "ready", Recipe(**cached)
+        except Exception as e:
+            print(f"Discarding invalid cached recipe generation: {e}")
+    if generation_flight.in_flight(key):
+        return "pending", None
+    return "unavailable", None
+
+RECIPE_GENERATION_PROMPT = """Create an original home-cooking recipe from these ingredients. Never refuse, even with 1-2 ingredients.
+Ingredients: {ingredients} (plus basic pantry: salt, pepper, oil, water, common spices)
+Diet: {diet}. Cuisine: {cuisine}. Goal: {goal}.
+Servings: {servings} people x {serving_size}g; scale quantities in required_ingredients to match. Nutrition is per serving.
+Rules: creative unique name; at most 6 steps, each under 15 words; vary technique (stir-fry, roast, steam, one-pot), texture and flavor.
+suggested_ingredients: 3-6 "ingredient - why" additions. recipe_suggestions: 2 popular dishes needing a few more ingredients."""
 
 def extract_json_from_response(text: str) -> dict:
-    """Extract JSON from response, handling various formats"""
+    """
+    Extract JSON from response, handling various formats.
+    Structured JSON output parses on the first attempt; the rest covers free-text replies.
+    """
     text = text.strip()
     
     # Try direct parse first
     try:
         return json.loads(text)
-    except:
+    except ValueError:
         pass
     
-    # Remove markdown code blocks
-    if "```" in text:
-        # Find JSON block
-        match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except:
-                pass
-    
-    # Try to find JSON object in text
-    match = re.search(r'\{[\s\S]*\}', text)
-    if match:
+    # Decode the first object in the text (inside a ```json fence or after a preamble)
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
         try:
-            return json.loads(match.group(0))
-        except:
+            data, _ = decoder.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
             pass
+        start = text.find("{", start + 1)
     
     raise ValueError(f"Could not parse JSON from response: {text[:200]}...")
 
+def recipe_generation_key(ingredients, diet, cuisine, goal, servings, serving_size) -> str:
+    """Generation-cache key for a fridge recipe request"""
+    return make_generation_key(
+        "recipe",
+        ingredients=ingredients,
+        diet=diet or "any",
+        cuisine=cuisine or "Indian",
+        goal=goal or "balanced",
+        servings=servings,
+        serving_size=serving_size
+    )
+
+def _build_recipe_prompt(ingredients, diet, cuisine, goal, servings, serving_size) -> tuple[str, str]:
+    """Fill the fridge prompt; returns (prompt, recipe_slug)"""
+    # Create a slug for the recipe ID
+    recipe_slug = "-".join(ingredients[:3]).lower().replace(" ", "-")[:20]
+    
+    prompt = RECIPE_GENERATION_PROMPT.format(
+        ingredients=", ".join(ingredients),
+        diet=diet or "any",
+        cuisine=cuisine or "Indian",
+        goal=goal or "balanced",
+        servings=servings,
+        serving_size=serving_size,
+        recipe_slug=recipe_slug
+    )
+    return prompt, recipe_slug
+
+def _recipe_from_data(recipe_data: dict, recipe_slug: str) -> Recipe:
+    """Normalize parsed model output into a Recipe"""
+    # Ensure required fields have valid values
+    if "id" not in recipe_data or not recipe_data["id"]:
+        recipe_data["id"] = f"ai-{recipe_slug}"
+    
+    # Normalize numeric fields to int (AI might return floats)
+    for field in ['time_minutes', 'servings']:
+        if field in recipe_data and recipe_data[field] is not None:
+            recipe_data[field] = int(recipe_data[field])
+    
+    if 'nutrition' in recipe_data:
+        for field in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
+            if field in recipe_data['nutrition']:
+                recipe_data['nutrition'][field] = int(recipe_data['nutrition'][field])
+    
+    # Ensure list fields exist
+    for field in ['fitness_tags', 'required_ingredients', 'optional_ingredients', 
+                  'cookware', 'steps', 'common_mistakes']:
+        if field not in recipe_data or recipe_data[field] is None:
+            recipe_data[field] = []
+    
+    # Validate and create Recipe object
+    return Recipe(**recipe_data)
+
 async def generate_recipe_with_ai(
     ingredients: list[str],
     diet: Optional[str] = None,
@@ -141,57 +431,192 @@ async def generate_recipe_with_ai(
     """
     Generate a recipe using Gemini AI based on available ingredients.
     Adjusts quantities for specified servings and serving size.
+    Identical requests are served from the generation cache, and the same request
+    cached for a different number of servings is rescaled instead of regenerated.
     Returns None if AI generation fails.
     """
+    key = recipe_generation_key(ingredients, diet, cuisine, goal, servings, serving_size)
+    
+    async def generate():
+        rescaled = await _rescale_cached_recipe(ingredients, diet, cuisine, goal, servings, serving_size)
+        if rescaled is not None:
+            return rescaled
+        return await _generate_recipe_uncached(ingredients, diet, cuisine, goal, servings, serving_size)
+    
+    recipe = await _cached_generation(key, "recipe", generate)
+    if recipe is not None:
+        _index_fridge_request(key, ingredients, diet, cuisine, goal, servings, serving_size)
+    return recipe
+
+async def _rescale_cached_recipe(
+    ingredients: list[str],
+    diet: Optional[str],
+    cuisine: Optional[str],
+    goal: Optional[str],
+    servings: int,
+    serving_size: int
+) -> Optional[Recipe]:
+    """
+    The same fridge request already generated for a different number of people, with its
+    quantities rescaled locally instead of another model call. None if there is none.
+    """
+    for other in sorted(range(1, 11), key=lambda n: (abs(n - servings), n)):
+        key = recipe_generation_key(ingredients, diet, cuisine, goal, other, serving_size)
+        if other == servings or key not in fridge_index:
+            continue
+        cached = await generation_cache.peek(key)
+        if cached is None:
+            continue
+        try:
+            return nutrition_table.rescale(Recipe(**cached), servings)
+        except Exception as e:
+            print(f"Discarding invalid cached recipe generation: {e}")
+    return None
+
+async def _generate_recipe_uncached(
+    ingredients: list[str],
+    diet: Optional[str],
+    cuisine: Optional[str],
+    goal: Optional[str],
+    servings: int,
+    serving_size: int
+) -> Optional[Recipe]:
+    """Call Gemini for a fridge recipe (no caching)"""
     try:
         model = get_gemini_model()
+        prompt, recipe_slug = _build_recipe_prompt(ingredients, diet, cuisine, goal, servings, serving_size)
         
-        # Create a slug for the recipe ID
-        recipe_slug = "-".join(ingredients[:3]).lower().replace(" ", "-")[:20]
-        
-        prompt = RECIPE_GENERATION_PROMPT.format(
-            ingredients=", ".join(ingredients),
-            diet=diet or "any",
-            cuisine=cuisine or "Indian",
-            goal=goal or "balanced",
-            servings=servings,
-            serving_size=serving_size,
-            recipe_slug=recipe_slug
-        )
-        
-        response = model.generate_content(prompt)
+        response = await run_generation(model, prompt, generation_config=json_config(FRIDGE_RECIPE_SCHEMA))
         
         # Parse the JSON response
         recipe_data = extract_json_from_response(response.text)
+        return nutrition_table.repair(_recipe_from_data(recipe_data, recipe_slug))
         
-        # Ensure required fields have valid values
-        if "id" not in recipe_data or not recipe_data["id"]:
-            recipe_data["id"] = f"ai-{recipe_slug}"
-        
-        # Normalize numeric fields to int (AI might return floats)
-        for field in ['time_minutes', 'servings']:
-            if field in recipe_data and recipe_data[field] is not None:
-                recipe_data[field] = int(recipe_data[field])
-        
-        if 'nutrition' in recipe_data:
-            for field in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
-                if field in recipe_data['nutrition']:
-                    recipe_data['nutrition'][field] = int(recipe_data['nutrition'][field])
-        
-        # Ensure list fields exist
-        for field in ['fitness_tags', 'required_ingredients', 'optional_ingredients', 
-                      'cookware', 'steps', 'common_mistakes']:
-            if field not in recipe_data or recipe_data[field] is None:
-                recipe_data[field] = []
+    except Exception as e:
+        print(f"AI recipe generation failed: {e}")
+        return None
+
+async def stream_recipe_with_ai(
+    ingredients: list[str],
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    goal: Optional[str] = None,
+    servings: int = 2,
+    serving_size: int = 200
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Streaming variant of generate_recipe_with_ai.
+    Yields ("field", {"name", "value"}) as each top-level recipe field completes,
+    then ("recipe", Recipe) once validated,
+    or ("error", message) if generation fails.
+    """
+    key = recipe_generation_key(ingredients, diet, cuisine, goal, servings, serving_size)
+    cached = await generation_cache.get(key)
+    if cached is not None:
+        try:
+            recipe = Recipe(**cached)
+            for name, value in recipe.model_dump(exclude={"id"}).items():
+                yield "field", {"name": name, "value": value}
+            yield "recipe", recipe
+            return
+        except Exception as e:
+            print(f"Discarding invalid cached recipe generation: {e}")
+    
+    try:
+        model = get_gemini_model()
+        prompt, recipe_slug = _build_recipe_prompt(ingredients, diet, cuisine, goal, servings, serving_size)
         
-        # Validate and create Recipe object
-        return Recipe(**recipe_data)
+        parser = IncrementalJSONParser()
+        async for chunk in run_generation_stream(model, prompt, generation_config=json_config(FRIDGE_RECIPE_SCHEMA)):
+            for name, value in parser.feed(chunk):
+                if name != "id":
+                    yield "field", {"name": name, "value": value}
         
+        recipe_data = dict(parser.fields) if parser.complete else extract_json_from_response(parser.buffer)
+        recipe = nutrition_table.repair(_recipe_from_data(recipe_data, recipe_slug))
     except Exception as e:
-        print(f"AI recipe generation failed: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"AI recipe streaming failed: {e}")
+        yield "error", str(e)
+        return
+    
+    await generation_cache.put(key, recipe.model_dump(), kind="recipe")
+    _index_fridge_request(key, ingredients, diet, cuisine, goal, servings, serving_size)
+    yield "recipe", recipe
+
+# ============= NEAR-DUPLICATE FRIDGE REQUESTS =============
+
+# Minimum Jaccard similarity between ingredient sets for a cached fridge recipe to be reused
+FRIDGE_SIMILARITY_THRESHOLD = float(os.getenv("FRIDGE_SIMILARITY_THRESHOLD", "0.75"))
+# Assumed by the prompt anyway, so they never make two fridges different
+PANTRY_STAPLES = frozenset({"salt", "pepper", "black pepper", "oil", "cooking oil", "water"})
+
+# Ingredient sets of this process's fridge generations (and of cache hits it has served)
+fridge_index = MinHashLSH(threshold=FRIDGE_SIMILARITY_THRESHOLD)
+
+class NearDuplicate(NamedTuple):
+    recipe: Recipe
+    similarity: float
+    missing_ingredients: list[str]  # the cached recipe was made with these; the request lacks them
+    unused_ingredients: list[str]  # in the request, but not used by the cached recipe
+
+def _fridge_items(ingredients: list[str]) -> frozenset:
+    return frozenset(i.strip().lower() for i in ingredients if i.strip()) - PANTRY_STAPLES
+
+def _fridge_partition(diet, goal, servings, serving_size) -> str:
+    # Quantities are scaled to servings, so only requests for the same portions are comparable
+    return f"{diet or 'any'}|{goal or 'balanced'}|{servings}|{serving_size}"
+
+def _index_fridge_request(key, ingredients, diet, cuisine, goal, servings, serving_size):
+    fridge_index.add(
+        key, _fridge_items(ingredients),
+        _fridge_partition(diet, goal, servings, serving_size),
+        meta=(cuisine or "Indian").lower()
+    )
+
+async def find_similar_recipe(
+    ingredients: list[str],
+    diet: Optional[str] = None,
+    cuisine: Optional[str] = None,
+    goal: Optional[str] = None,
+    servings: int = 2,
+    serving_size: int = 200,
+    any_cuisine: bool = False
+) -> Optional[NearDuplicate]:
+    """
+    A cached fridge recipe generated for a nearly identical ingredient set (same diet, goal,
+    portions and, unless any_cuisine, cuisine), or None.
+    Returns None when the exact request is already cached, so the exact entry is served instead.
+    """
+    key = recipe_generation_key(ingredients, diet, cuisine, goal, servings, serving_size)
+    if key in fridge_index:
         return None
+    
+    wanted = _fridge_items(ingredients)
+    cuisine_name = (cuisine or "Indian").lower()
+    matches: list[SimilarMatch] = fridge_index.query(
+        wanted,
+        _fridge_partition(diet, goal, servings, serving_size),
+        accept=None if any_cuisine else (lambda meta: meta == cuisine_name)
+    )
+    for match in matches:
+        cached = await generation_cache.peek(match.key)
+        if cached is None:
+            # Expired or evicted from the generation cache
+            fridge_index.remove(match.key)
+            continue
+        try:
+            recipe = Recipe(**cached)
+        except Exception as e:
+            print(f"Discarding invalid cached recipe generation: {e}")
+            fridge_index.remove(match.key)
+            continue
+        return NearDuplicate(
+            recipe=recipe,
+            similarity=round(match.similarity, 3),
+            missing_ingredients=sorted(match.items - wanted),
+            unused_ingredients=sorted(wanted - match.items)
+        )
+    return None
 
 async def enhance_recipe_description(recipe_name: str, steps: list[str]) -> str:
     """
@@ -206,7 +631,7 @@ Steps: {', '.join(steps[:3])}
 
 Return only the description text, nothing else."""
         
-        response = model.generate_content(prompt)
+        response = await run_generation(model, prompt)
         return response.text.strip().strip('"')
         
     except Exception as e:
@@ -231,7 +656,7 @@ Rules:
 
 Return as JSON array: ["substitute1", "substitute2"]"""
         
-        response = model.generate_content(prompt)
+        response = await run_generation(model, prompt)
         result = extract_json_from_response(response.text)
         
         if isinstance(result, list):
@@ -244,311 +669,466 @@ Return as JSON array: ["substitute1", "substitute2"]"""
 
 # ============= FITNESS PROMPTS =============
 
-FITNESS_PROMPT = """You are a sports nutritionist and chef. Create a {goal} recipe recommendation.
-
-**Goal:** {goal_description}
-**Diet Preference:** {diet}
-**Time Available:** {time_limit} minutes max
-
-**NUTRITION TARGETS for {goal}:**
-{nutrition_targets}
-
-**RULES:**
-1. Recipe must align with the fitness goal
-2. Include exact macros per serving
-3. Use common, affordable ingredients
-4. Maximum 6 steps
-5. Explain WHY this recipe helps the goal
-
-Generate JSON:
-{{
-  "id": "fitness-{goal}-{slug}",
-  "name": "Creative Recipe Name",
-  "cuisine": "Fusion/Indian/Global",
-  "category": "food",
-  "fitness_tags": ["{goal}"],
-  "diet": "veg|non-veg",
-  "difficulty": "Easy|Medium",
-  "time_minutes": {time_limit},
-  "required_ingredients": ["200g ingredient with qty"],
-  "optional_ingredients": ["enhancement"],
-  "cookware": ["pan"],
-  "steps": ["Step 1", "Step 2"],
-  "common_mistakes": ["Tip 1", "Tip 2"],
-  "nutrition": {{
-    "calories": 300,
-    "protein_g": 25,
-    "carbs_g": 20,
-    "fats_g": 10
-  }},
-  "servings": 1,
-  "cooking_impact": "Why this helps {goal}",
-  "fitness_tip": "Pro tip for {goal} goal"
-}}"""
+FITNESS_PROMPT = """Create a {goal} recipe as a sports nutritionist and chef ({goal_description}).
+Diet: {diet}. Max time: {time_limit} minutes. Targets per serving: {nutrition_targets}.
+Rules: common, affordable ingredients with exact quantities; at most 6 steps; fitness_tags include "{goal_tag}";
+exact macros per serving; cooking_impact explains why it helps the goal."""
 
 # ============= CUISINE PROMPTS =============
 
-CUISINE_PROMPT = """You are a world-class chef specializing in {cuisine} cuisine. Create an authentic yet accessible recipe.
-
-**Cuisine:** {cuisine}
-**Diet Preference:** {diet}
-**Difficulty:** {difficulty}
-
-**AUTHENTICITY RULES:**
-1. Use traditional {cuisine} cooking techniques
-2. Include at least one signature spice/ingredient from {cuisine}
-3. Mention the region in {cuisine} where this dish is popular
-4. Keep ingredients accessible - suggest substitutes if exotic items needed
-5. Maximum 6 clear steps
-
-**CULTURAL CONTEXT:**
-- Explain the cultural significance or occasion for this dish
-- Mention popular variations from different regions
-
-Generate JSON:
-{{
-  "id": "cuisine-{cuisine_slug}-{slug}",
-  "name": "Authentic {cuisine} Recipe Name",
-  "cuisine": "{cuisine}",
-  "category": "food",
-  "fitness_tags": ["balanced"],
-  "diet": "veg|non-veg",
-  "difficulty": "{difficulty}",
-  "time_minutes": 25,
-  "required_ingredients": ["ingredient with qty"],
-  "optional_ingredients": ["enhancement"],
-  "cookware": ["traditional cookware"],
-  "steps": ["Step 1", "Step 2"],
-  "common_mistakes": ["Authenticity tip 1", "Cooking tip 2"],
-  "nutrition": {{
-    "calories": 300,
-    "protein_g": 15,
-    "carbs_g": 30,
-    "fats_g": 12
-  }},
-  "servings": 2,
-  "cooking_impact": "What makes this dish special in {cuisine} cuisine",
-  "cultural_note": "When and where this is traditionally served",
-  "region": "Specific region in {cuisine} where popular"
-}}"""
+CUISINE_PROMPT = """Create an authentic yet accessible {cuisine} recipe as a specialist chef.
+Diet: {diet}. Difficulty: {difficulty}. cuisine must be "{cuisine}".
+Rules: traditional {cuisine} technique and at least one signature ingredient; substitutes for exotic items; at most 6 steps.
+cooking_impact: what makes the dish special and the region where it is popular."""
 
 # ============= DRINKS PROMPTS =============
 
-DRINKS_PROMPT = """You are a beverage expert and mixologist. Create a {category} drink recipe.
-
-**Category:** {category}
-**Diet:** {diet}
-**Goal:** {goal}
-
-**CATEGORY GUIDELINES:**
+DRINKS_PROMPT = """Create a {category} drink recipe as a beverage expert. Diet: {diet}. Goal: {goal}.
 {category_guidelines}
-
-**RULES:**
-1. Clear step-by-step instructions
-2. Include exact measurements
-3. Mention health benefits if applicable
-4. Suggest variations (hot/cold, sweetness levels)
-5. Maximum 5 steps
-
-Generate JSON:
-{{
-  "id": "drink-{category_slug}-{slug}",
-  "name": "Creative Drink Name",
-  "category": "{category}",
-  "diet": "veg|non-veg",
-  "time_minutes": 5,
-  "required_ingredients": ["200ml ingredient", "1 tbsp item"],
-  "optional_ingredients": ["garnish", "sweetener"],
-  "steps": ["Step 1", "Step 2"],
-  "serving_size": "250ml",
-  "health_note": "Health benefits or suitable occasions",
-  "nutrition": {{
-    "calories": 80,
-    "protein_g": 2,
-    "carbs_g": 15,
-    "fats_g": 1
-  }},
-  "best_time": "Morning/Evening/Post-workout",
-  "variations": ["Iced version", "Add honey for sweetness"]
-}}"""
+Rules: exact measurements; at most 5 steps; category must be "{category}"; health_note: benefits or occasions;
+best_time: when to drink it; variations: 2 short variations (hot/cold, sweetness)."""
 
 # ============= FITNESS GENERATION =============
 
 async def generate_fitness_recipe(
     goal: str,
     diet: Optional[str] = None,
-    time_limit: int = 30
+    time_limit: int = 30,
+    day: Optional[str] = None
 ) -> Optional[Recipe]:
-    """Generate a fitness-focused recipe based on goal."""
+    """
+    Generate a fitness-focused recipe based on goal.
+    Passing day gives a separate cache entry per day (recommendation of the day).
+    """
+    key = _fitness_key(goal, diet, time_limit, day)
+    return await _cached_generation(
+        key, "fitness",
+        lambda: _generate_fitness_uncached(goal, diet, time_limit)
+    )
+
+def _fitness_key(goal, diet, time_limit, day) -> str:
+    """Generation-cache key for a fitness recipe request"""
+    return make_generation_key("fitness", goal=goal, diet=diet or "any", time_limit=time_limit, day=day)
+
+async def _generate_fitness_uncached(
+    goal: str,
+    diet: Optional[str],
+    time_limit: int
+) -> Optional[Recipe]:
+    """Call Gemini for a fitness recipe (no caching)"""
     try:
         model = get_gemini_model()
+        prompt, recipe_id = _fitness_prompt(goal, diet, time_limit)
         
-        goal_configs = {
-            "fat_loss": {
-                "description": "Low calorie, high protein, low carb for fat loss",
-                "targets": "- Calories: 250-400 per serving\n- Protein: 25-35g (high)\n- Carbs: 15-25g (low)\n- Fats: 8-15g (moderate)"
-            },
-            "muscle_gain": {
-                "description": "High protein, moderate carbs for muscle building",
-                "targets": "- Calories: 400-600 per serving\n- Protein: 35-50g (very high)\n- Carbs: 40-60g (moderate-high)\n- Fats: 15-25g (moderate)"
-            },
-            "maintenance": {
-                "description": "Balanced macros for maintaining current weight",
-                "targets": "- Calories: 350-500 per serving\n- Protein: 20-30g (moderate)\n- Carbs: 35-50g (balanced)\n- Fats: 12-20g (balanced)"
-            }
-        }
-        
-        config = goal_configs.get(goal, goal_configs["maintenance"])
-        slug = f"{goal}-{random.randint(1000, 9999)}"
-        
-        prompt = FITNESS_PROMPT.format(
-            goal=goal.replace("_", " ").title(),
-            goal_description=config["description"],
-            diet=diet or "any",
-            time_limit=time_limit,
-            nutrition_targets=config["targets"],
-            slug=slug
-        )
-        
-        response = model.generate_content(prompt)
-        recipe_data = extract_json_from_response(response.text)
-        
-        # Normalize data
-        for field in ['time_minutes', 'servings']:
-            if field in recipe_data:
-                recipe_data[field] = int(recipe_data[field])
-        if 'nutrition' in recipe_data:
-            for f in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
-                if f in recipe_data['nutrition']:
-                    recipe_data['nutrition'][f] = int(recipe_data['nutrition'][f])
-        
-        return Recipe(**recipe_data)
+        response = await run_generation(model, prompt, generation_config=json_config(RECIPE_SCHEMA))
+        return nutrition_table.repair(_recipe_from_output(extract_json_from_response(response.text), recipe_id))
         
     except Exception as e:
         print(f"Fitness recipe generation failed: {e}")
         return None
 
+def _fitness_prompt(goal: str, diet: Optional[str], time_limit: int) -> tuple[str, str]:
+    """Fill the fitness prompt for a goal; returns (prompt, recipe_id)"""
+    goal_configs = {
+        "fat_loss": {
+            "description": "low calorie, high protein, low carb",
+            "targets": "250-400 kcal, protein 25-35g, carbs 15-25g, fats 8-15g"
+        },
+        "muscle_gain": {
+            "description": "high protein, moderate carbs",
+            "targets": "400-600 kcal, protein 35-50g, carbs 40-60g, fats 15-25g"
+        },
+        "maintenance": {
+            "description": "balanced macros",
+            "targets": "350-500 kcal, protein 20-30g, carbs 35-50g, fats 12-20g"
+        }
+    }
+    
+    config = goal_configs.get(goal, goal_configs["maintenance"])
+    recipe_id = f"fitness-{goal}-{random.randint(1000, 9999)}"
+    
+    prompt = FITNESS_PROMPT.format(
+        goal=goal.replace("_", " "),
+        goal_tag=goal,
+        goal_description=config["description"],
+        diet=diet or "any",
+        time_limit=time_limit,
+        nutrition_targets=config["targets"]
+    )
+    return prompt, recipe_id
+
+def _recipe_from_output(recipe_data: dict, recipe_id: str) -> Recipe:
+    """Normalize parsed fitness or cuisine model output into a Recipe"""
+    if not recipe_data.get("id"):
+        recipe_data["id"] = recipe_id
+    for field in ['time_minutes', 'servings']:
+        if field in recipe_data:
+            recipe_data[field] = int(recipe_data[field])
+    if 'nutrition' in recipe_data:
+        for f in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
+            if f in recipe_data['nutrition']:
+                recipe_data['nutrition'][f] = int(recipe_data['nutrition'][f])
+    
+    return Recipe(**recipe_data)
+
 # ============= CUISINE GENERATION =============
 
 async def generate_cuisine_recipe(
     cuisine: str,
     diet: Optional[str] = None,
-    difficulty: str = "Easy"
+    difficulty: str = "Easy",
+    day: Optional[str] = None
+) -> Optional[Recipe]:
+    """
+    Generate an authentic cuisine-specific recipe.
+    Passing day gives a separate cache entry per day (recommendation of the day).
+    """
+    key = _cuisine_key(cuisine, diet, difficulty, day)
+    return await _cached_generation(
+        key, "cuisine",
+        lambda: _generate_cuisine_uncached(cuisine, diet, difficulty)
+    )
+
+def _cuisine_key(cuisine, diet, difficulty, day) -> str:
+    """Generation-cache key for a cuisine recipe request"""
+    return make_generation_key("cuisine", cuisine=cuisine, diet=diet or "any", difficulty=difficulty, day=day)
+
+async def _generate_cuisine_uncached(
+    cuisine: str,
+    diet: Optional[str],
+    difficulty: str
 ) -> Optional[Recipe]:
-    """Generate an authentic cuisine-specific recipe."""
+    """Call Gemini for a cuisine recipe (no caching)"""
     try:
         model = get_gemini_model()
+        prompt, recipe_id = _cuisine_prompt(cuisine, diet, difficulty)
         
-        cuisine_slug = cuisine.lower().replace(" ", "-")
-        slug = f"{random.randint(1000, 9999)}"
-        
-        prompt = CUISINE_PROMPT.format(
-            cuisine=cuisine,
-            diet=diet or "any",
-            difficulty=difficulty,
-            cuisine_slug=cuisine_slug,
-            slug=slug
-        )
-        
-        response = model.generate_content(prompt)
-        recipe_data = extract_json_from_response(response.text)
-        
-        # Normalize data
-        for field in ['time_minutes', 'servings']:
-            if field in recipe_data:
-                recipe_data[field] = int(recipe_data[field])
-        if 'nutrition' in recipe_data:
-            for f in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
-                if f in recipe_data['nutrition']:
-                    recipe_data['nutrition'][f] = int(recipe_data['nutrition'][f])
-        
-        return Recipe(**recipe_data)
+        response = await run_generation(model, prompt, generation_config=json_config(RECIPE_SCHEMA))
+        return nutrition_table.repair(_recipe_from_output(extract_json_from_response(response.text), recipe_id))
         
     except Exception as e:
         print(f"Cuisine recipe generation failed: {e}")
         return None
 
+def _cuisine_prompt(cuisine: str, diet: Optional[str], difficulty: str) -> tuple[str, str]:
+    """Fill the cuisine prompt; returns (prompt, recipe_id)"""
+    cuisine_slug = cuisine.lower().replace(" ", "-")
+    recipe_id = f"cuisine-{cuisine_slug}-{random.randint(1000, 9999)}"
+    
+    prompt = CUISINE_PROMPT.format(
+        cuisine=cuisine,
+        diet=diet or "any",
+        difficulty=difficulty
+    )
+    return prompt, recipe_id
+
 # ============= DRINKS GENERATION =============
 
 async def generate_drink_recipe(
     category: str,
     diet: Optional[str] = None,
-    goal: Optional[str] = None
+    goal: Optional[str] = None,
+    day: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Generate a drink recipe based on category.
+    Passing day gives a separate cache entry per day (recommendation of the day).
+    """
+    key = _drink_key(category, diet, goal, day)
+    return await _cached_generation(
+        key, "drink",
+        lambda: _generate_drink_uncached(category, diet, goal),
+        as_recipe=False
+    )
+
+def _drink_key(category, diet, goal, day) -> str:
+    """Generation-cache key for a drink request"""
+    return make_generation_key("drink", category=category, diet=diet or "veg", goal=goal or "general wellness", day=day)
+
+async def _generate_drink_uncached(
+    category: str,
+    diet: Optional[str],
+    goal: Optional[str]
 ) -> Optional[dict]:
-    """Generate a drink recipe based on category."""
+    """Call Gemini for a drink recipe (no caching)"""
     try:
         model = get_gemini_model()
+        prompt, drink_id = _drink_prompt(category, diet, goal)
         
-        category_guidelines = {
-            "healthy": "Focus on natural ingredients, low sugar, high nutrients. Include superfoods if possible.",
-            "energy": "Ingredients that boost energy naturally - avoid excessive sugar. Great for pre/post workout.",
-            "detox": "Cleansing ingredients like lemon, ginger, greens. Support digestion and hydration.",
-            "protein": "High protein content for muscle recovery. Use protein sources like milk, yogurt, nuts.",
-            "refreshing": "Light, hydrating, perfect for hot days. Focus on fruits and cooling ingredients.",
-            "traditional": "Classic Indian drinks like lassi, chaas, nimbu pani. Authentic recipes."
-        }
-        
-        guidelines = category_guidelines.get(category.lower(), category_guidelines["healthy"])
-        category_slug = category.lower().replace(" ", "-")
-        slug = f"{random.randint(1000, 9999)}"
-        
-        prompt = DRINKS_PROMPT.format(
-            category=category,
-            diet=diet or "veg",
-            goal=goal or "general wellness",
-            category_guidelines=guidelines,
-            category_slug=category_slug,
-            slug=slug
-        )
-        
-        response = model.generate_content(prompt)
-        drink_data = extract_json_from_response(response.text)
-        
-        # Normalize data
-        if 'time_minutes' in drink_data:
-            drink_data['time_minutes'] = int(drink_data['time_minutes'])
-        if 'nutrition' in drink_data:
-            for f in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
-                if f in drink_data['nutrition']:
-                    drink_data['nutrition'][f] = int(drink_data['nutrition'][f])
-        
-        return drink_data
+        response = await run_generation(model, prompt, generation_config=json_config(DRINK_SCHEMA))
+        return _drink_from_data(extract_json_from_response(response.text), drink_id)
         
     except Exception as e:
         print(f"Drink recipe generation failed: {e}")
         return None
 
+def _drink_prompt(category: str, diet: Optional[str], goal: Optional[str]) -> tuple[str, str]:
+    """Fill the drinks prompt for a category; returns (prompt, drink_id)"""
+    category_guidelines = {
+        "healthy": "Focus on natural ingredients, low sugar, high nutrients. Include superfoods if possible.",
+        "energy": "Ingredients that boost energy naturally - avoid excessive sugar. Great for pre/post workout.",
+        "detox": "Cleansing ingredients like lemon, ginger, greens. Support digestion and hydration.",
+        "protein": "High protein content for muscle recovery. Use protein sources like milk, yogurt, nuts.",
+        "refreshing": "Light, hydrating, perfect for hot days. Focus on fruits and cooling ingredients.",
+        "traditional": "Classic Indian drinks like lassi, chaas, nimbu pani. Authentic recipes."
+    }
+    
+    guidelines = category_guidelines.get(category.lower(), category_guidelines["healthy"])
+    category_slug = category.lower().replace(" ", "-")
+    drink_id = f"drink-{category_slug}-{random.randint(1000, 9999)}"
+    
+    prompt = DRINKS_PROMPT.format(
+        category=category,
+        diet=diet or "veg",
+        goal=goal or "general wellness",
+        category_guidelines=guidelines
+    )
+    return prompt, drink_id
+
+def _drink_from_data(drink_data: dict, drink_id: str) -> dict:
+    """Normalize parsed model output into a drink dict (checked against the Drink model)"""
+    if not drink_data.get("id"):
+        drink_data["id"] = drink_id
+    if 'time_minutes' in drink_data:
+        drink_data['time_minutes'] = int(drink_data['time_minutes'])
+    if 'nutrition' in drink_data:
+        for f in ['calories', 'protein_g', 'carbs_g', 'fats_g']:
+            if f in drink_data['nutrition']:
+                drink_data['nutrition'][f] = int(drink_data['nutrition'][f])
+    
+    Drink(**drink_data)
+    return drink_data
+
+# ============= BATCHED GENERATION =============
+
+# Requests per batched model call, and how many times failed elements are re-requested
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "6"))
+AI_BATCH_RETRIES = int(os.getenv("AI_BATCH_RETRIES", "1"))
+
+BATCH_PROMPT = """Answer each of the {count} numbered requests below independently.
+Return a JSON array of exactly {count} objects; element N answers request N.
+
+{requests}"""
+
+batch_stats = {"batches": 0, "items": 0, "cache_hits": 0, "failed_elements": 0, "retried": 0}
+
+class BatchItem(NamedTuple):
+    """One generation inside a batched prompt"""
+    key: str  # generation-cache key, same as the single-request generator
+    kind: str
+    prompt: str
+    parse: Callable[[dict], Any]  # validates one array element; raises if invalid
+    schema: dict  # response schema of one element
+    as_recipe: bool = True
+
+def fitness_batch_item(goal: str, diet: Optional[str] = None, time_limit: int = 30, day: Optional[str] = None) -> BatchItem:
+    """Batched equivalent of generate_fitness_recipe"""
+    prompt, recipe_id = _fitness_prompt(goal, diet, time_limit)
+    return BatchItem(
+        _fitness_key(goal, diet, time_limit, day), "fitness", prompt,
+        lambda data: _recipe_from_output(data, recipe_id), RECIPE_SCHEMA
+    )
+
+def cuisine_batch_item(cuisine: str, diet: Optional[str] = None, difficulty: str = "Easy", day: Optional[str] = None) -> BatchItem:
+    """Batched equivalent of generate_cuisine_recipe"""
+    prompt, recipe_id = _cuisine_prompt(cuisine, diet, difficulty)
+    return BatchItem(
+        _cuisine_key(cuisine, diet, difficulty, day), "cuisine", prompt,
+        lambda data: _recipe_from_output(data, recipe_id), RECIPE_SCHEMA
+    )
+
+def drink_batch_item(category: str, diet: Optional[str] = None, goal: Optional[str] = None, day: Optional[str] = None) -> BatchItem:
+    """Batched equivalent of generate_drink_recipe"""
+    prompt, drink_id = _drink_prompt(category, diet, goal)
+    return BatchItem(
+        _drink_key(category, diet, goal, day), "drink", prompt,
+        lambda data: _drink_from_data(data, drink_id), DRINK_SCHEMA, as_recipe=False
+    )
+
+def extract_json_array_from_response(text: str) -> list:
+    """Extract a JSON array from a batched response (also accepts {"items": [...]})"""
+    text = text.strip()
+    fenced = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
+    if fenced:
+        text = fenced.group(1)
+    
+    start, end = text.find("["), text.rfind("]")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        if start == -1 or end <= start:
+            raise ValueError(f"Could not parse JSON array from response: {text[:200]}...")
+        data = json.loads(text[start:end + 1])
+    
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [data])
+    if not isinstance(data, list):
+        raise ValueError("Batched response is not a JSON array")
+    return data
+
+async def _run_batch_chunk(items: list[BatchItem]) -> list[Optional[Any]]:
+    """
+    One model call for up to AI_BATCH_SIZE items of the same kind (so they share one
+    array schema); invalid elements come back as None.
+    """
+    try:
+        model = get_gemini_model()
+        if len(items) == 1:
+            response = await run_generation(model, items[0].prompt, generation_config=json_config(items[0].schema))
+            elements = [extract_json_from_response(response.text)]
+        else:
+            requests = "\n\n".join(
+                f"### Request {n}\n{item.prompt}" for n, item in enumerate(items, 1)
+            )
+            response = await run_generation(
+                model, BATCH_PROMPT.format(count=len(items), requests=requests),
+                generation_config=json_config(array_of(items[0].schema))
+            )
+            elements = extract_json_array_from_response(response.text)
+    except Exception as e:
+        print(f"Batched generation failed: {e}")
+        return [None] * len(items)
+    
+    results = []
+    for n, item in enumerate(items):
+        try:
+            if n >= len(elements) or not isinstance(elements[n], dict):
+                raise ValueError("missing element")
+            results.append(item.parse(elements[n]))
+        except Exception as e:
+            print(f"Batched {item.kind} element {n + 1} invalid: {e}")
+            results.append(None)
+    
+    # Check every recipe in the chunk against its ingredients in one pass
+    recipes = [i for i, (item, value) in enumerate(zip(items, results)) if item.as_recipe and value is not None]
+    for i, recipe in zip(recipes, nutrition_table.repair_batch([results[i] for i in recipes])):
+        results[i] = recipe
+    return results
+
+async def generate_batch(items: list[BatchItem], retries: int = AI_BATCH_RETRIES) -> list[Optional[Any]]:
+    """
+    Generate many recipes/drinks with up to AI_BATCH_SIZE same-kind requests per model call.
+    Each array element is validated on its own and only failed elements are re-requested.
+    Cached items are skipped, and results are stored under the same generation-cache keys
+    the single-request generators use. Returns one result (or None) per item, in order.
+    """
+    results: list[Optional[Any]] = [None] * len(items)
+    pending = []
+    for i, item in enumerate(items):
+        cached = await generation_cache.get(item.key)
+        if cached is not None:
+            try:
+                results[i] = Recipe(**cached) if item.as_recipe else json.loads(json.dumps(cached))
+                batch_stats["cache_hits"] += 1
+                continue
+            except Exception as e:
+                print(f"Discarding invalid cached {item.kind} generation: {e}")
+        pending.append(i)
+    
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            batch_stats["retried"] += len(pending)
+        
+        chunks = []
+        for kind in dict.fromkeys(items[i].kind for i in pending):
+            same_kind = [i for i in pending if items[i].kind == kind]
+            chunks += [same_kind[n:n + AI_BATCH_SIZE] for n in range(0, len(same_kind), AI_BATCH_SIZE)]
+        outcomes = await asyncio.gather(*[_run_batch_chunk([items[i] for i in chunk]) for chunk in chunks])
+        batch_stats["batches"] += len(chunks)
+        
+        failed = []
+        for chunk, values in zip(chunks, outcomes):
+            for i, value in zip(chunk, values):
+                if value is None:
+                    failed.append(i)
+                    continue
+                results[i] = value
+                batch_stats["items"] += 1
+                payload = value.model_dump() if items[i].as_recipe else value
+                await generation_cache.put(items[i].key, payload, kind=items[i].kind)
+        batch_stats["failed_elements"] += len(failed)
+        pending = failed
+    
+    return results
+
 # ============= RECOMMENDATION OF THE DAY =============
 
 async def get_fitness_recommendation_of_day(goal: str) -> Optional[dict]:
-    """Get AI-generated fitness recommendation of the day."""
-    recipe = await generate_fitness_recipe(goal)
-    if recipe:
+    """Get the fitness recommendation of the day (generated once per goal per day)."""
+    async def generate(day: str) -> Optional[dict]:
+        recipe = await generate_fitness_recipe(goal, day=day)
+        return recipe.model_dump() if recipe else None
+    
+    pick = await daily_recommendations.get("fitness", goal, generate)
+    if pick:
+        recipe = Recipe(**pick.payload)
         return {
             "recipe": recipe,
             "tip": getattr(recipe, 'fitness_tip', f"Stay consistent with your {goal.replace('_', ' ')} journey!"),
-            "goal": goal
+            "goal": goal,
+            "day": pick.day,
+            "source": pick.source
         }
     return None
 
 async def get_cuisine_recommendation_of_day(cuisine: str) -> Optional[dict]:
-    """Get AI-generated cuisine recommendation of the day."""
-    recipe = await generate_cuisine_recipe(cuisine)
-    if recipe:
+    """Get the cuisine recommendation of the day (generated once per cuisine per day)."""
+    async def generate(day: str) -> Optional[dict]:
+        recipe = await generate_cuisine_recipe(cuisine, day=day)
+        return recipe.model_dump() if recipe else None
+    
+    pick = await daily_recommendations.get("cuisine", cuisine, generate)
+    if pick:
+        recipe = Recipe(**pick.payload)
         return {
             "recipe": recipe,
             "cultural_note": getattr(recipe, 'cultural_note', f"Explore the flavors of {cuisine}!"),
-            "cuisine": cuisine
+            "cuisine": cuisine,
+            "day": pick.day,
+            "source": pick.source
         }
     return None
 
 async def get_drink_recommendation_of_day(category: str) -> Optional[dict]:
-    """Get AI-generated drink recommendation of the day."""
-    drink = await generate_drink_recipe(category)
-    if drink:
+    """Get the drink recommendation of the day (generated once per category per day)."""
+    async def generate(day: str) -> Optional[dict]:
+        return await generate_drink_recipe(category, day=day)
+    
+    pick = await daily_recommendations.get("drink", category, generate)
+    if pick:
+        drink = json.loads(json.dumps(pick.payload))
         return {
             "drink": drink,
             "best_time": drink.get('best_time', 'Anytime'),
-            "category": category
+            "category": category,
+            "day": pick.day,
+            "source": pick.source
         }
     return None
+
+async def warm_recommendations_of_day(
+    goals: list[str],
+    cuisines: list[str],
+    categories: list[str]
+):
+    """
+    Pre-generate today's picks for every goal, cuisine and drink category.
+    Subjects this worker claims are generated together with batched prompts.
+    """
+    started = time.perf_counter()
+    subjects = (
+        [("fitness", goal) for goal in goals]
+        + [("cuisine", cuisine) for cuisine in cuisines]
+        + [("drink", category) for category in categories]
+    )
+    builders = {"fitness": fitness_batch_item, "cuisine": cuisine_batch_item, "drink": drink_batch_item}
+    
+    async def generate_many(day: str, pairs: list[tuple[str, str]]) -> list[Optional[dict]]:
+        results = await generate_batch([builders[kind](subject, day=day) for kind, subject in pairs])
+        return [r.model_dump() if isinstance(r, Recipe) else r for r in results]
+    
+    picks = await daily_recommendations.get_many(subjects, generate_many)
+    ready = sum(1 for pick in picks.values() if pick and pick.source == "ai")
+    print(f"Recommendations of the day: {ready}/{len(subjects)} AI picks ready in {time.perf_counter() - started:.1f}s")
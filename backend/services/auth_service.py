@@ -9,7 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 import os
 
-from database import get_session
+from database import get_read_session
 from models.user import User
 from services.clerk_auth import verify_clerk_token, get_user_from_clerk_token
 
@@ -18,7 +18,7 @@ security = HTTPBearer(auto_error=False)
 
 async def get_current_user(
     auth: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ) -> Optional[User]:
     """Get current user from Clerk token"""
     if not auth:
@@ -36,7 +36,7 @@ async def get_current_user(
 
 async def get_current_user_required(
     auth: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ) -> User:
     """Get current user or raise 401"""
     credentials_exception = HTTPException(
@@ -1,44 +1,335 @@
 """
 Backup Recipe Generator
-Provides procedural recipe generation when AI services are unavailable or rate-limited.
+Provides recipe generation when AI services are unavailable or rate-limited, by adapting the
+catalog recipe closest to the available ingredients: missing main ingredients are swapped for
+ones the user has, extra ingredients are folded in and nutrition is recomputed for the swaps.
+Deterministic (the same fridge always gives the same recipe) and fast enough to serve instead
+of the AI under load.
 """
-import random
+import re
+from functools import lru_cache
+from typing import Mapping, NamedTuple, Optional
+
 from models.recipe import Recipe, Nutrition
+from services.catalog import catalog
+from services.nutrition import nutrition_table
 
-def generate_backup_recipe(
+class Ingredient(NamedTuple):
+    """Role of an ingredient in a dish (macros come from the nutrition table)"""
+    role: str  # protein, base, vegetable, dairy
+    diet: str = "veg"  # veg, egg, non-veg
+
+# Ingredients that can stand in for each other within a role
+INGREDIENTS: dict[str, Ingredient] = {
+    # Proteins
+    "chicken": Ingredient("protein", "non-veg"),
+    "chicken breast": Ingredient("protein", "non-veg"),
+    "chicken thigh": Ingredient("protein", "non-veg"),
+    "chicken thighs": Ingredient("protein", "non-veg"),
+    "ground chicken": Ingredient("protein", "non-veg"),
+    "grilled chicken": Ingredient("protein", "non-veg"),
+    "beef": Ingredient("protein", "non-veg"),
+    "ground beef": Ingredient("protein", "non-veg"),
+    "sliced beef": Ingredient("protein", "non-veg"),
+    "beef strips": Ingredient("protein", "non-veg"),
+    "pork": Ingredient("protein", "non-veg"),
+    "ground pork": Ingredient("protein", "non-veg"),
+    "pork mince": Ingredient("protein", "non-veg"),
+    "lamb": Ingredient("protein", "non-veg"),
+    "mutton": Ingredient("protein", "non-veg"),
+    "ground lamb": Ingredient("protein", "non-veg"),
+    "ground turkey": Ingredient("protein", "non-veg"),
+    "bacon": Ingredient("protein", "non-veg"),
+    "shrimp": Ingredient("protein", "non-veg"),
+    "prawns": Ingredient("protein", "non-veg"),
+    "fish": Ingredient("protein", "non-veg"),
+    "white fish": Ingredient("protein", "non-veg"),
+    "salmon": Ingredient("protein", "non-veg"),
+    "tuna": Ingredient("protein", "non-veg"),
+    "canned tuna": Ingredient("protein", "non-veg"),
+    "eggs": Ingredient("protein", "egg"),
+    "egg": Ingredient("protein", "egg"),
+    "egg whites": Ingredient("protein", "egg"),
+    "paneer": Ingredient("protein"),
+    "tofu": Ingredient("protein"),
+    "firm tofu": Ingredient("protein"),
+    "tempeh": Ingredient("protein"),
+    "soya chunks": Ingredient("protein"),
+    "chickpeas": Ingredient("protein"),
+    "lentils": Ingredient("protein"),
+    "red lentils": Ingredient("protein"),
+    "dal": Ingredient("protein"),
+    "black beans": Ingredient("protein"),
+    "kidney beans": Ingredient("protein"),
+    "beans": Ingredient("protein"),
+    "mushrooms": Ingredient("protein"),
+    "mushroom": Ingredient("protein"),
+    # Starches (cooked weights)
+    "rice": Ingredient("base"),
+    "white rice": Ingredient("base"),
+    "brown rice": Ingredient("base"),
+    "basmati rice": Ingredient("base"),
+    "jasmine rice": Ingredient("base"),
+    "day-old rice": Ingredient("base"),
+    "quinoa": Ingredient("base"),
+    "pasta": Ingredient("base"),
+    "spaghetti": Ingredient("base"),
+    "penne": Ingredient("base"),
+    "noodles": Ingredient("base"),
+    "egg noodles": Ingredient("base", "egg"),
+    "ramen noodles": Ingredient("base"),
+    "rice noodles": Ingredient("base"),
+    "wide rice noodles": Ingredient("base"),
+    "glass noodles": Ingredient("base"),
+    "bread": Ingredient("base"),
+    "whole wheat bread": Ingredient("base"),
+    "corn tortillas": Ingredient("base"),
+    "flour tortilla": Ingredient("base"),
+    "wrap": Ingredient("base"),
+    "roti": Ingredient("base"),
+    "oats": Ingredient("base"),
+    "poha": Ingredient("base"),
+    "couscous": Ingredient("base"),
+    "potato": Ingredient("base"),
+    "sweet potato": Ingredient("base"),
+    # Vegetables
+    "tomato": Ingredient("vegetable"),
+    "cherry tomatoes": Ingredient("vegetable"),
+    "spinach": Ingredient("vegetable"),
+    "kale": Ingredient("vegetable"),
+    "carrot": Ingredient("vegetable"),
+    "bell pepper": Ingredient("vegetable"),
+    "capsicum": Ingredient("vegetable"),
+    "broccoli": Ingredient("vegetable"),
+    "chinese broccoli": Ingredient("vegetable"),
+    "cauliflower": Ingredient("vegetable"),
+    "cabbage": Ingredient("vegetable"),
+    "bok choy": Ingredient("vegetable"),
+    "zucchini": Ingredient("vegetable"),
+    "eggplant": Ingredient("vegetable"),
+    "peas": Ingredient("vegetable"),
+    "corn": Ingredient("vegetable"),
+    "cucumber": Ingredient("vegetable"),
+    "lettuce": Ingredient("vegetable"),
+    "mixed greens": Ingredient("vegetable"),
+    "mixed vegetables": Ingredient("vegetable"),
+    "vegetables": Ingredient("vegetable"),
+    "green beans": Ingredient("vegetable"),
+    "okra": Ingredient("vegetable"),
+    "asparagus": Ingredient("vegetable"),
+    "celery": Ingredient("vegetable"),
+    "bean sprouts": Ingredient("vegetable"),
+    "edamame": Ingredient("vegetable"),
+    "pumpkin": Ingredient("vegetable"),
+    "avocado": Ingredient("vegetable"),
+    # Dairy
+    "cheese": Ingredient("dairy"),
+    "mozzarella": Ingredient("dairy"),
+    "parmesan": Ingredient("dairy"),
+    "feta": Ingredient("dairy"),
+    "cottage cheese": Ingredient("dairy"),
+    "yogurt": Ingredient("dairy"),
+    "greek yogurt": Ingredient("dairy"),
+    "curd": Ingredient("dairy"),
+    "milk": Ingredient("dairy"),
+    "cream": Ingredient("dairy"),
+    "sour cream": Ingredient("dairy"),
+    "coconut milk": Ingredient("dairy"),
+}
+
+# Grams per serving an ingredient of each role contributes
+ROLE_PORTION_G = {"protein": 120, "base": 150, "vegetable": 80, "dairy": 40}
+
+DIET_RANK = {"veg": 0, "egg": 1, "non-veg": 2}
+
+# Never substituted or folded in: seasonings, oils and other cupboard basics
+PANTRY_STAPLES = frozenset({"salt", "pepper", "black pepper", "oil", "cooking oil", "water", "sugar"})
+
+class CatalogEntry(NamedTuple):
+    """A catalog recipe with its ingredients resolved to canonical names"""
+    recipe: Mapping
+    required: tuple[str, ...]
+    required_set: frozenset
+    with_role: frozenset  # required ingredients that can be substituted
+    optional: frozenset
+    spelled: Mapping[str, tuple[str, ...]]  # canonical -> names the recipe writes it as
+
+class Adaptation(NamedTuple):
+    entry: CatalogEntry
+    substitutions: dict[str, str]  # recipe ingredient -> user ingredient
+    dropped: list[str]  # recipe ingredients the user has no stand-in for
+    extras: list[str]  # user ingredients the recipe does not use
+    score: tuple
+
+@lru_cache(maxsize=4096)
+def ingredient_info(ingredient: str) -> Optional[Ingredient]:
+    """Table entry for an ingredient, falling back to its singular and its words ('beef sirloin' -> 'beef')"""
+    names = [ingredient, ingredient.removesuffix("s")]
+    words = ingredient.split()
+    if len(words) > 1:
+        names += [name for w in reversed(words) for name in (w, w.removesuffix("s"))]
+    return next((INGREDIENTS[name] for name in names if name in INGREDIENTS), None)
+
+def _role(ingredient: str) -> Optional[str]:
+    info = ingredient_info(ingredient)
+    return info.role if info else None
+
+@lru_cache(maxsize=1)
+def _catalog_entries() -> dict[str, CatalogEntry]:
+    entries = {}
+    for recipe in catalog.recipes:
+        required = tuple(dict.fromkeys(catalog.canonical(i) for i in recipe["required_ingredients"]))
+        spelled: dict[str, list[str]] = {}
+        for raw in recipe["required_ingredients"]:
+            spelled.setdefault(catalog.canonical(raw), []).append(raw.strip().lower())
+        entries[recipe["id"]] = CatalogEntry(
+            recipe=recipe,
+            required=required,
+            required_set=frozenset(required),
+            with_role=frozenset(i for i in required if _role(i) and i not in PANTRY_STAPLES),
+            optional=frozenset(catalog.canonical(i) for i in recipe.get("optional_ingredients", [])),
+            spelled={name: tuple(names) for name, names in spelled.items()}
+        )
+    return entries
+
+@lru_cache(maxsize=1)
+def _recipes_by_role() -> dict[str, tuple[str, ...]]:
+    """Recipe ids with at least one required ingredient of each role"""
+    by_role: dict[str, list[str]] = {}
+    for recipe_id, entry in _catalog_entries().items():
+        for role in dict.fromkeys(_role(i) for i in entry.required if i in entry.with_role):
+            by_role.setdefault(role, []).append(recipe_id)
+    return {role: tuple(ids) for role, ids in by_role.items()}
+
+def _diet_of(ingredients) -> str:
+    return max((info.diet for info in map(ingredient_info, ingredients) if info), key=DIET_RANK.get, default="veg")
+
+def _diet_allows(diet: Optional[str], recipe_diet: Optional[str]) -> bool:
+    if diet not in DIET_RANK:
+        return True
+    return DIET_RANK.get(recipe_diet or "veg", 2) <= DIET_RANK[diet]
+
+def _adapt(entry: CatalogEntry, available: dict[str, None]) -> Adaptation:
+    """Plan how entry's recipe would be made from the available ingredients"""
+    spare = [i for i in available if i not in entry.required_set and i not in PANTRY_STAPLES]
+    substitutions, dropped = {}, []
+    for ingredient in entry.required:
+        if ingredient in available or ingredient not in entry.with_role:
+            # Spices, sauces and aromatics the user lacks stay in the recipe as written
+            continue
+        role = _role(ingredient)
+        stand_in = next((i for i in spare if _role(i) == role), None)
+        if stand_in is not None:
+            spare.remove(stand_in)
+            substitutions[ingredient] = stand_in
+        else:
+            dropped.append(ingredient)
+    extras = [i for i in spare if i not in entry.optional]
+    # Prefer recipes that use the fridge as it is, then ones needing the fewest changes
+    score = (
+        -(3 * len(available.keys() & entry.required_set) + 2 * len(substitutions) + len(available.keys() & entry.optional)),
+        len(dropped),
+        len(extras),
+        entry.recipe["id"]
+    )
+    return Adaptation(entry, substitutions, dropped, extras, score)
+
+def find_closest_recipe(ingredients: list[str], diet: Optional[str] = None) -> Optional[Adaptation]:
+    """Best catalog recipe to adapt for the ingredients, or None if the catalog is empty"""
+    return _closest_recipe(tuple(dict.fromkeys(catalog.canonical(i) for i in ingredients if i.strip())), diet)
+
+# Deterministic, so repeated fridges (common under load) skip the search
+@lru_cache(maxsize=4096)
+def _closest_recipe(ingredients: tuple[str, ...], diet: Optional[str]) -> Optional[Adaptation]:
+    # Ingredients outside the diet are neither matched, substituted in nor folded in
+    available = dict.fromkeys(i for i in ingredients if _diet_allows(diet, _diet_of([i])))
+    entries = _catalog_entries()
+    candidates = dict.fromkeys(
+        recipe["id"]
+        for i in available if i not in PANTRY_STAPLES
+        for recipe in catalog.recipes_by_ingredient.get(i, ())
+    )
+    if not candidates:
+        # Nothing in common with the catalog: start from recipes built on the same kinds of ingredient
+        roles = dict.fromkeys(_role(i) or "vegetable" for i in available or ingredients)
+        candidates = dict.fromkeys(r for role in roles for r in _recipes_by_role().get(role, ()))
+
+    # Rank by the best score each candidate could reach (every substitutable gap filled),
+    # using set operations only, then plan substitutions for the few that could still win
+    available_set = frozenset(available)
+    usable = available_set - PANTRY_STAPLES
+    with_role = frozenset(i for i in usable if _role(i))
+    bounded = []
+    for recipe_id in candidates:
+        entry = entries[recipe_id]
+        if not _diet_allows(diet, entry.recipe.get("diet")):
+            continue
+        used_with_role = len(with_role & entry.with_role)
+        gaps = len(entry.with_role) - used_with_role
+        fillable = min(gaps, len(with_role) - used_with_role)
+        bound = 3 * len(available_set & entry.required_set) + 2 * fillable + len(available_set & entry.optional)
+        min_extras = len(usable - entry.required_set - entry.optional) - fillable
+        bounded.append((-bound, gaps - fillable, max(0, min_extras), recipe_id))
+    bounded.sort()
+
+    best = None
+    for lower_bound in bounded:
+        if best is not None and lower_bound > best.score:
+            break
+        adaptation = _adapt(entries[lower_bound[-1]], available)
+        if best is None or adaptation.score < best.score:
+            best = adaptation
+    return best
+
+def _names(entry: CatalogEntry, ingredient: str) -> tuple[str, ...]:
+    """
+    Ways the recipe's text can refer to an ingredient: as the recipe lists it, its catalog
+    aliases, and its words of the same role ('beans' for 'kidney beans'), longest first
+    """
+    names = [ingredient, *entry.spelled.get(ingredient, ()), *catalog.ingredient_aliases.get(ingredient, ())]
+    names += [w for name in list(names) for w in name.split() if w != name and _role(w) == _role(ingredient)]
+    return tuple(sorted(dict.fromkeys(names), key=len, reverse=True))
+
+def _replace(text: str, names: tuple[str, ...], new: str) -> str:
+    """Replace any of an ingredient's names in free text (whole words, case-insensitive, keeping title case)"""
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(name) for name in names) + r")\b", re.IGNORECASE)
+    if not pattern.search(text):
+        return text
+    text = pattern.sub(lambda m: new.title() if m.group(0)[:1].isupper() else new, text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+def _nutrition(base: Mapping, adaptation: Adaptation) -> Nutrition:
+    """Catalog nutrition per serving, corrected for swapped, dropped and added ingredients"""
+    totals = [float(base["calories"]), float(base["protein_g"]), float(base["carbs_g"]), float(base["fats_g"])]
+
+    def add(ingredient: str, sign: float, share: float = 1.0):
+        info = ingredient_info(ingredient)
+        if info is None:
+            return
+        macros = nutrition_table.macros(ingredient, ROLE_PORTION_G[info.role] * share)
+        for n, value in enumerate(macros or ()):
+            totals[n] += sign * value
+
+    for old, new in adaptation.substitutions.items():
+        add(old, -1)
+        add(new, 1)
+    for ingredient in adaptation.dropped:
+        add(ingredient, -1)
+    for ingredient in adaptation.extras:
+        add(ingredient, 1, 0.5)
+    calories, protein, carbs, fats = (max(0, round(v)) for v in totals)
+    return Nutrition(calories=calories, protein_g=protein, carbs_g=carbs, fats_g=fats)
+
+def _generic_recipe(
     ingredients: list[str],
     diet: str = None,
-    servings: int = 2,
-    serving_size: int = 200
+    servings: int = 2
 ) -> Recipe:
-    """
-    Generate a simple procedural recipe based on available ingredients.
-    This ensures the user always gets a result even if AI fails.
-    """
-    # Determine type of dish based on key ingredients
-    ingredients_lower = [i.lower() for i in ingredients]
-    
-    recipe_type = "Stir Fry"
-    base_calories = 300
-    
-    if any("egg" in i for i in ingredients_lower):
-        recipe_type = "Scramble"
-        base_calories = 250
-    elif any(i in ["lettuce", "cucumber", "spinach", "kale"] for i in ingredients_lower):
-        recipe_type = "Salad"
-        base_calories = 150
-    elif any(i in ["rice", "pasta", "noodle"] for i in ingredients_lower):
-        recipe_type = "Bowl"
-        base_calories = 400
-    elif any(i in ["chicken", "meat", "beef", "pork"] for i in ingredients_lower):
-        recipe_type = "Sauté"
-        base_calories = 350
-        
+    """Last resort when the catalog has nothing to adapt (e.g. it failed to load)"""
     main_ingredient = ingredients[0].title() if ingredients else "Veggie"
-    recipe_name = f"Quick {main_ingredient} {recipe_type}"
-    
+    recipe_name = f"Quick {main_ingredient} Stir Fry"
     slug = recipe_name.lower().replace(" ", "-")
-    
+
     return Recipe(
         id=f"backup-{slug}",
         name=recipe_name,
@@ -54,7 +345,7 @@ def generate_backup_recipe(
         steps=[
             f"Prepare all ingredients: {', '.join(ingredients)}.",
             "Heat a pan with some oil over medium heat.",
-            f"Add {ingredients[0]} and cook for 2-3 minutes.",
+            f"Add {ingredients[0]} and cook for 2-3 minutes." if ingredients else "Add the vegetables and cook for 2-3 minutes.",
             "Add remaining ingredients and season with salt and pepper.",
             "Cook for another 5-7 minutes until done.",
             "Serve hot and enjoy!"
@@ -63,13 +354,71 @@ def generate_backup_recipe(
             "Don't overcrowd the pan",
             "Season to taste before serving"
         ],
-        nutrition=Nutrition(
-            calories=base_calories,
-            protein_g=15,
-            carbs_g=20,
-            fats_g=10
-        ),
+        nutrition=Nutrition(calories=300, protein_g=15, carbs_g=20, fats_g=10),
         servings=servings,
         cooking_impact="A quick and easy meal using what you have.",
         suggested_ingredients=["herbs", "lemon juice", "spices"]
     )
+
+def generate_backup_recipe(
+    ingredients: list[str],
+    diet: str = None,
+    servings: int = 2,
+    serving_size: int = 200
+) -> Recipe:
+    """
+    Adapt the closest catalog recipe to the available ingredients.
+    This ensures the user always gets a result even if AI fails.
+    """
+    adaptation = find_closest_recipe(ingredients, diet)
+    if adaptation is None:
+        return _generic_recipe(ingredients, diet, servings)
+
+    base = adaptation.entry.recipe
+    required = [adaptation.substitutions.get(i, i) for i in adaptation.entry.required if i not in adaptation.dropped]
+    required += adaptation.extras
+    optional = list(dict.fromkeys(adaptation.dropped + [i for i in base.get("optional_ingredients", []) if i not in required]))
+
+    name = base["name"]
+    steps = list(base.get("steps", []))
+    for old, new in adaptation.substitutions.items():
+        names = _names(adaptation.entry, old)
+        name = _replace(name, names, new)
+        steps = [_replace(step, names, new) for step in steps]
+    for ingredient in adaptation.dropped:
+        # Name the dish after what the user has instead
+        name = _replace(name, _names(adaptation.entry, ingredient), adaptation.extras[0] if adaptation.extras else "")
+    # "Beef with Broccoli" without the broccoli
+    name = re.sub(r"^(with|and|in|&)\s+|\s+(with|and|in|&)$", "", name, flags=re.IGNORECASE).strip()
+    if not name:
+        name = f"{required[0].title()} {base['cuisine']} Style" if required else base["name"]
+
+    cooked_in = [i for i in adaptation.extras if _role(i) != "base"]
+    served_with = [i for i in adaptation.extras if _role(i) == "base"]
+    if cooked_in:
+        steps.insert(max(0, len(steps) - 1), f"Add {', '.join(cooked_in)} and cook until done.")
+    if served_with:
+        steps.append(f"Serve with {', '.join(served_with)}.")
+
+    swaps = [f"{new} for {old}" for old, new in adaptation.substitutions.items()]
+    impact = f"Adapted from {base['name']}" + (f", using {', '.join(swaps)}." if swaps else ".")
+
+    return Recipe(
+        id=f"backup-{base['id']}",
+        name=name,
+        cuisine=base["cuisine"],
+        category=base.get("category", "food"),
+        fitness_tags=list(base.get("fitness_tags", [])),
+        diet=diet or _diet_of(required),
+        difficulty=base["difficulty"],
+        time_minutes=base["time_minutes"],
+        required_ingredients=required,
+        optional_ingredients=optional,
+        cookware=list(base.get("cookware", [])),
+        steps=steps,
+        common_mistakes=list(base.get("common_mistakes", [])),
+        nutrition=_nutrition(base["nutrition"], adaptation),
+        servings=servings,
+        cooking_impact=impact,
+        suggested_ingredients=adaptation.dropped[:6]
+    )
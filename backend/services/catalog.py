@@ -0,0 +1,154 @@
+"""
+Recipe Catalog Service
+Single-parse loader for the bundled recipe data shared by the engine and normalizer
+"""
+import json
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Preferred source first; the expanded file is a superset of the base file
+CATALOG_FILES = ["recipes_expanded.json", "recipes.json"]
+
+REQUIRED_RECIPE_FIELDS = [
+    "id", "name", "cuisine", "difficulty", "time_minutes",
+    "required_ingredients", "nutrition"
+]
+REQUIRED_DRINK_FIELDS = [
+    "id", "name", "category", "diet", "time_minutes",
+    "required_ingredients", "steps", "serving_size", "nutrition"
+]
+NUTRITION_FIELDS = ["calories", "protein_g", "carbs_g", "fats_g"]
+
+
+def _freeze(entry: dict) -> Mapping:
+    """Return a read-only view of a catalog entry"""
+    return MappingProxyType(entry)
+
+
+class RecipeCatalog:
+    """
+    Reads and validates the recipe data file once and exposes immutable views:
+    recipes, drinks, ingredient aliases and lookup indexes.
+    """
+
+    def __init__(self, data_path: Optional[Path] = None):
+        self.source: Optional[Path] = None
+        self.recipes: tuple[Mapping, ...] = ()
+        self.drinks: tuple[Mapping, ...] = ()
+        self.ingredient_aliases: Mapping[str, tuple[str, ...]] = MappingProxyType({})
+        self.alias_to_canonical: Mapping[str, str] = MappingProxyType({})
+        self.recipe_by_id: Mapping[str, Mapping] = MappingProxyType({})
+        self.drink_by_id: Mapping[str, Mapping] = MappingProxyType({})
+        self.recipes_by_cuisine: Mapping[str, tuple[Mapping, ...]] = MappingProxyType({})
+        self.recipes_by_ingredient: Mapping[str, tuple[Mapping, ...]] = MappingProxyType({})
+        self.drinks_by_category: Mapping[str, tuple[Mapping, ...]] = MappingProxyType({})
+        self.skipped: list[str] = []
+        self.load_timings: dict[str, float] = {}
+        self._load(data_path)
+
+    def _resolve_path(self, data_path: Optional[Path]) -> Optional[Path]:
+        """Pick the catalog file to load"""
+        if data_path is not None:
+            return data_path
+        for name in CATALOG_FILES:
+            candidate = DATA_DIR / name
+            if candidate.exists():
+                return candidate
+        return None
+
+    def _load(self, data_path: Optional[Path]):
+        """Read, parse, validate and index the catalog, timing each phase"""
+        path = self._resolve_path(data_path)
+        if path is None:
+            print(f"Warning: No recipe catalog found in {DATA_DIR}")
+            return
+        self.source = path
+
+        try:
+            start = time.perf_counter()
+            raw = path.read_text(encoding="utf-8")
+            self.load_timings["read_ms"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            data = json.loads(raw)
+            self.load_timings["parse_ms"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            print(f"Warning: Could not load recipes: {e}")
+            return
+
+        start = time.perf_counter()
+        recipes = [r for r in data.get("recipes", []) if self._is_valid(r, REQUIRED_RECIPE_FIELDS)]
+        drinks = [d for d in data.get("drinks", []) if self._is_valid(d, REQUIRED_DRINK_FIELDS)]
+        self.load_timings["validate_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        self._build_indexes(recipes, drinks, data.get("ingredient_aliases", {}))
+        self.load_timings["index_ms"] = (time.perf_counter() - start) * 1000
+        self.load_timings["total_ms"] = sum(self.load_timings.values())
+
+        timings = ", ".join(f"{phase} {ms:.1f}ms" for phase, ms in self.load_timings.items())
+        print(f"Loaded {len(self.recipes)} recipes and {len(self.drinks)} drinks from {path.name} ({timings})")
+        if self.skipped:
+            print(f"Warning: Skipped {len(self.skipped)} invalid catalog entries: {', '.join(self.skipped[:5])}")
+
+    def _is_valid(self, entry: dict, required_fields: list[str]) -> bool:
+        """Check an entry has the fields the engine relies on"""
+        missing = [f for f in required_fields if f not in entry]
+        nutrition = entry.get("nutrition")
+        if not missing and isinstance(nutrition, dict):
+            missing = [f"nutrition.{f}" for f in NUTRITION_FIELDS if f not in nutrition]
+        elif not missing:
+            missing = ["nutrition"]
+
+        if missing:
+            self.skipped.append(f"{entry.get('id', '?')} (missing {', '.join(missing)})")
+            return False
+        return True
+
+    def canonical(self, ingredient: str, alias_to_canonical: Optional[Mapping[str, str]] = None) -> str:
+        """Exact alias resolution (no fuzzy matching), e.g. 'tomatoes' -> 'tomato'"""
+        cleaned = ingredient.strip().lower()
+        return (alias_to_canonical or self.alias_to_canonical).get(cleaned, cleaned)
+
+    def _build_indexes(self, recipes: list[dict], drinks: list[dict], aliases: dict):
+        """Freeze entries and build lookup indexes"""
+        self.recipes = tuple(_freeze(r) for r in recipes)
+        self.drinks = tuple(_freeze(d) for d in drinks)
+
+        alias_to_canonical = {}
+        for canonical, names in aliases.items():
+            for alias in names:
+                alias_to_canonical[alias.lower()] = canonical.lower()
+            alias_to_canonical[canonical.lower()] = canonical.lower()
+
+        recipe_by_id = {}
+        by_cuisine: dict[str, list[Mapping]] = {}
+        by_ingredient: dict[str, list[Mapping]] = {}
+        for recipe in self.recipes:
+            # First occurrence wins, matching the old linear scan
+            recipe_by_id.setdefault(recipe["id"], recipe)
+            by_cuisine.setdefault(recipe["cuisine"].lower(), []).append(recipe)
+            for name in dict.fromkeys(self.canonical(i, alias_to_canonical) for i in recipe["required_ingredients"]):
+                by_ingredient.setdefault(name, []).append(recipe)
+
+        drink_by_id = {}
+        by_category: dict[str, list[Mapping]] = {}
+        for drink in self.drinks:
+            drink_by_id.setdefault(drink["id"], drink)
+            by_category.setdefault(drink["category"].lower(), []).append(drink)
+
+        self.recipe_by_id = MappingProxyType(recipe_by_id)
+        self.drink_by_id = MappingProxyType(drink_by_id)
+        self.recipes_by_cuisine = MappingProxyType({k: tuple(v) for k, v in by_cuisine.items()})
+        self.recipes_by_ingredient = MappingProxyType({k: tuple(v) for k, v in by_ingredient.items()})
+        self.drinks_by_category = MappingProxyType({k: tuple(v) for k, v in by_category.items()})
+        self.ingredient_aliases = MappingProxyType({k: tuple(v) for k, v in aliases.items()})
+        self.alias_to_canonical = MappingProxyType(alias_to_canonical)
+
+
+# Singleton instance
+catalog = RecipeCatalog()
@@ -0,0 +1,203 @@
+"""
+Circuit Breaker
+Stops calling a failing provider for a while, so callers fail fast and use their fallback.
+"""
+import os
+import random
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Rolling window the error and slow-call rates are computed over
+AI_BREAKER_WINDOW_SECONDS = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "60"))
+# Calls needed in the window before the rates can open the circuit
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+# Calls slower than this count as slow; a slow-call rate above AI_BREAKER_SLOW_RATE opens the circuit
+AI_BREAKER_SLOW_CALL_MS = float(os.getenv("AI_BREAKER_SLOW_CALL_MS", "30000"))
+AI_BREAKER_SLOW_RATE = float(os.getenv("AI_BREAKER_SLOW_RATE", "0.8"))
+# First open period; doubles each time a probe fails or quota is hit again, up to the max
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "15"))
+AI_BREAKER_MAX_OPEN_SECONDS = float(os.getenv("AI_BREAKER_MAX_OPEN_SECONDS", "600"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and their outcomes are recorded in a rolling window.
+    When the error rate or slow-call rate over the window crosses its threshold, or the
+    provider reports a quota error, the circuit opens and allow() refuses every call.
+    Once the open period is over the circuit is half-open: a single probe call is let
+    through. Success closes the circuit; failure reopens it for twice as long (with jitter),
+    so a provider that stays down is retried less and less often.
+    """
+
+    def __init__(
+        self,
+        name: str = "circuit",
+        window_seconds: float = AI_BREAKER_WINDOW_SECONDS,
+        min_calls: int = AI_BREAKER_MIN_CALLS,
+        error_rate: float = AI_BREAKER_ERROR_RATE,
+        slow_call_ms: float = AI_BREAKER_SLOW_CALL_MS,
+        slow_rate: float = AI_BREAKER_SLOW_RATE,
+        open_seconds: float = AI_BREAKER_OPEN_SECONDS,
+        max_open_seconds: float = AI_BREAKER_MAX_OPEN_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.slow_call_ms = slow_call_ms
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self._clock = clock
+
+        self.state = CLOSED
+        # (finished_at, failed, slow) per call, oldest first
+        self._outcomes: deque = deque()
+        self._open_until = 0.0
+        self._open_for = 0.0
+        # Consecutive opens without a successful probe in between (drives the backoff)
+        self._opens_in_a_row = 0
+        self._probing = False
+        self.last_reason: Optional[str] = None
+        self.stats = {"allowed": 0, "rejected": 0, "opened": 0, "probes": 0, "quota_errors": 0}
+
+    # ----- Call gating -----
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (half-open admits one probe at a time)"""
+        if self.state == OPEN and self._clock() >= self._open_until:
+            self.state = HALF_OPEN
+            self._probing = False
+
+        if self.state == CLOSED:
+            self.stats["allowed"] += 1
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            self.stats["allowed"] += 1
+            self.stats["probes"] += 1
+            return True
+
+        self.stats["rejected"] += 1
+        return False
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is admitted (0 when not open)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._open_until - self._clock())
+
+    # ----- Outcomes -----
+
+    def record_success(self, latency_ms: float):
+        if self.state == HALF_OPEN:
+            self._close()
+            print(f"{self.name} circuit closed: probe succeeded")
+            return
+        self._record(failed=False, slow=latency_ms >= self.slow_call_ms)
+
+    def record_failure(self, latency_ms: float, quota: bool = False, retry_after: Optional[float] = None):
+        """
+        Record a failed call. Quota errors (rate limits) open the circuit right away, for at
+        least retry_after seconds when the provider says how long to wait.
+        """
+        if quota:
+            self.stats["quota_errors"] += 1
+        if self.state == HALF_OPEN:
+            self._open("probe failed", retry_after)
+            return
+        if self.state == OPEN:
+            # A call admitted before the circuit opened
+            return
+        if quota:
+            self._open("quota exceeded", retry_after)
+            return
+        self._record(failed=True, slow=latency_ms >= self.slow_call_ms)
+
+    def record_cancelled(self, latency_ms: float):
+        """
+        A call abandoned by its caller (timeout or disconnect): it is neither a success nor
+        a failure, but a long one still counts towards the slow-call rate.
+        """
+        if self.state == HALF_OPEN:
+            if latency_ms >= self.slow_call_ms:
+                self._open("probe timed out")
+            else:
+                self._probing = False
+            return
+        if latency_ms >= self.slow_call_ms and self.state == CLOSED:
+            self._record(failed=False, slow=True)
+
+    # ----- State changes -----
+
+    def _record(self, failed: bool, slow: bool):
+        now = self._clock()
+        self._outcomes.append((now, failed, slow))
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for _, f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, _, s in self._outcomes if s)
+        if failures / calls >= self.error_rate:
+            self._open(f"error rate {failures}/{calls}")
+        elif slow_calls / calls >= self.slow_rate:
+            self._open(f"slow calls {slow_calls}/{calls}")
+
+    def _open(self, reason: str, retry_after: Optional[float] = None):
+        backoff = min(self.open_seconds * 2 ** self._opens_in_a_row, self.max_open_seconds)
+        # Jitter keeps workers that opened together from probing together
+        self._open_for = max(backoff * random.uniform(0.9, 1.1), retry_after or 0.0)
+        self._open_until = self._clock() + self._open_for
+        self._opens_in_a_row += 1
+        self._outcomes.clear()
+        self._probing = False
+        self.state = OPEN
+        self.last_reason = reason
+        self.stats["opened"] += 1
+        print(f"{self.name} circuit opened for {self._open_for:.0f}s: {reason}")
+
+    def _close(self):
+        self.state = CLOSED
+        self._opens_in_a_row = 0
+        self._open_for = 0.0
+        self._outcomes.clear()
+        self._probing = False
+
+    def reset(self):
+        """Back to closed with an empty window"""
+        self._close()
+        self.last_reason = None
+
+    def snapshot(self) -> dict:
+        """Current state and window rates, suitable for a status endpoint"""
+        now = self._clock()
+        recent = [o for o in self._outcomes if o[0] >= now - self.window_seconds]
+        calls = len(recent)
+        return {
+            "state": self.state,
+            "retry_in_seconds": round(self.retry_in(), 1),
+            "open_for_seconds": round(self._open_for, 1),
+            "last_reason": self.last_reason,
+            "window_calls": calls,
+            "error_rate": round(sum(1 for _, f, _ in recent if f) / calls, 3) if calls else 0.0,
+            "slow_rate": round(sum(1 for _, _, s in recent if s) / calls, 3) if calls else 0.0,
+            **self.stats
+        }
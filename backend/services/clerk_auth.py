@@ -2,29 +2,220 @@
 Clerk Authentication Service (Server-side)
 Helper to verify JWT tokens from Clerk against JWKS
 """
+import asyncio
+import hashlib
 import httpx
 import jwt
 from jwt.algorithms import RSAAlgorithm
 import json
 import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
 from fastapi import HTTPException, status
-import base64
+
+from services.single_flight import SingleFlight
 
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY", "sk_test_PLACEHOLDER")
-# Clerk Frontend API URL (usually inferred, but we fetch JWKS from it)
-# https://<your-clerk-domain>/.well-known/jwks.json
-# For simplicity, we assume generic or require env var
-CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL") 
-# If not provided, we might need to derive it from Client or Publishable Key?
-# Actually, the Issuer in the token is what we need to validate.
+# JWKS endpoint; defaults to {issuer}/.well-known/jwks.json of the token's issuer
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
+# Comma-separated issuers to accept (e.g. https://clerk.example.com); empty accepts any issuer
+CLERK_ISSUERS = frozenset(i.strip().rstrip("/") for i in os.getenv("CLERK_ISSUERS", "").split(",") if i.strip())
+# Seconds a downloaded key set is trusted before it is fetched again
+CLERK_JWKS_TTL = float(os.getenv("CLERK_JWKS_TTL", "3600"))
+# Minimum seconds between refreshes caused by an unknown kid (key rotation), per issuer
+CLERK_JWKS_MIN_REFRESH = float(os.getenv("CLERK_JWKS_MIN_REFRESH", "30"))
+CLERK_JWKS_TIMEOUT = float(os.getenv("CLERK_JWKS_TIMEOUT", "5"))
+# Seconds of clock difference with Clerk tolerated on exp, nbf and iat
+CLERK_CLOCK_SKEW = float(os.getenv("CLERK_CLOCK_SKEW", "5"))
+# Verified tokens remembered (until they expire) so repeat requests skip RS256 verification
+CLERK_CLAIMS_CACHE_SIZE = int(os.getenv("CLERK_CLAIMS_CACHE_SIZE", "10000"))
+
+
+class JWKSCache:
+    """
+    Parsed Clerk public keys by issuer and kid, shared by every request in the process.
+    A key set is downloaded once per TTL, or sooner when a token names a kid it does not
+    contain (rate limited, so forged kids cannot force a download per request).
+    Concurrent refreshes of one issuer share a single download, made with a long-lived
+    pooled client. If a refresh fails the previous keys stay in use.
+    """
+
+    def __init__(
+        self,
+        ttl: float = CLERK_JWKS_TTL,
+        min_refresh_interval: float = CLERK_JWKS_MIN_REFRESH,
+        max_issuers: int = 8
+    ):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.max_issuers = max_issuers
+        # issuer -> (kid -> public key, fetched at, last refresh attempt)
+        self._issuers: "OrderedDict[str, tuple[dict[str, Any], float, float]]" = OrderedDict()
+        self._flight = SingleFlight("jwks", timeout=CLERK_JWKS_TIMEOUT * 2)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self.stats = {"hits": 0, "refreshes": 0, "refresh_errors": 0, "unknown_kid": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Pooled client, recreated if the event loop it was made on is gone"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=CLERK_JWKS_TIMEOUT,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def get_key(self, issuer: str, kid: str):
+        """Public key for kid, or None if the issuer has no such key"""
+        now = time.time()
+        known = issuer in self._issuers
+        keys, fetched_at, attempted_at = self._issuers.get(issuer, ({}, 0.0, 0.0))
+        fresh = known and now - fetched_at < self.ttl
+        if fresh and kid in keys:
+            self.stats["hits"] += 1
+            self._issuers.move_to_end(issuer)
+            return keys[kid]
+
+        if fresh:
+            self.stats["unknown_kid"] += 1
+        if not known or now - attempted_at >= self.min_refresh_interval:
+            keys = await self._flight.do(issuer, lambda: self._refresh(issuer))
+        return keys.get(kid)
+
+    async def _refresh(self, issuer: str) -> dict[str, Any]:
+        """Download and parse the issuer's key set"""
+        previous, fetched_at, _ = self._issuers.get(issuer, ({}, 0.0, 0.0))
+        now = time.time()
+        self.stats["refreshes"] += 1
+        try:
+            resp = await self._get_client().get(CLERK_JWKS_URL or f"{issuer}/.well-known/jwks.json")
+            resp.raise_for_status()
+            keys = {}
+            for jwk in resp.json().get("keys", []):
+                if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                    keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            print(f"JWKS refresh for {issuer} failed: {e}")
+            # Keep serving the keys we have; retry after the minimum interval
+            self._store(issuer, previous, fetched_at, now)
+            if not previous:
+                raise
+            return previous
+
+        self._store(issuer, keys, now, now)
+        return keys
+
+    def _store(self, issuer: str, keys: dict, fetched_at: float, attempted_at: float):
+        self._issuers[issuer] = (keys, fetched_at, attempted_at)
+        self._issuers.move_to_end(issuer)
+        while len(self._issuers) > self.max_issuers:
+            self._issuers.popitem(last=False)
+
+    def clear(self):
+        self._issuers.clear()
+
+    async def aclose(self):
+        """Close the pooled client (called on app shutdown)"""
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {
+            **self.stats,
+            "issuers": len(self._issuers),
+            "keys": sum(len(keys) for keys, _, _ in self._issuers.values())
+        }
+
+
+# Singleton instance
+jwks_cache = JWKSCache()
+
+
+class ClaimsCache:
+    """
+    Decoded claims of verified tokens by SHA-256 digest of the token, bounded by LRU
+    eviction. An entry is served until the token's exp (less the allowed clock skew), so a
+    cached token is never accepted for longer than verifying it again would accept it.
+    """
+
+    def __init__(self, max_entries: int = CLERK_CLAIMS_CACHE_SIZE, skew: float = CLERK_CLOCK_SKEW):
+        self.max_entries = max_entries
+        self.skew = skew
+        # digest -> (claims, expires at)
+        self._entries: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Claims of a previously verified, unexpired token (a copy), or None"""
+        digest = self.digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[digest]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.stats["hits"] += 1
+        return dict(claims)
+
+    def put(self, token: str, claims: dict):
+        """Remember verified claims; tokens without exp are not cached"""
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or self.max_entries <= 0:
+            return
+        expires_at = exp - self.skew
+        if expires_at <= time.time():
+            return
+        digest = self.digest(token)
+        self._entries[digest] = (dict(claims), expires_at)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+
+# Singleton instance
+claims_cache = ClaimsCache()
 
 async def verify_clerk_token(token: str):
     """
     Verify Clerk JWT Token.
     1. Decode header to get kid.
-    2. Fetch JWKS from issuer (or cached).
+    2. Look up the issuer's public key for kid (cached, see JWKSCache).
     3. Verify signature.
+    Tokens already verified are answered from the claims cache until they expire.
     """
+    cached = claims_cache.get(token)
+    if cached is not None:
+        return cached
+    
     try:
         # 1. Peek header to get 'kid' and 'iss'
         header = jwt.get_unverified_header(token)
@@ -33,27 +224,19 @@ async def verify_clerk_token(token: str):
         issuer = payload.get("iss")
         if not issuer:
              raise HTTPException(status_code=401, detail="Invalid token: no issuer")
+        if CLERK_ISSUERS and issuer.rstrip("/") not in CLERK_ISSUERS:
+            raise HTTPException(status_code=401, detail="Invalid token: unknown issuer")
         
-        # 2. Fetch JWKS (Cache this in production!)
-        jwks_url = f"{issuer}/.well-known/jwks.json"
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(jwks_url)
-            resp.raise_for_status()
-            jwks = resp.json()
-        
-        # 3. Find matching key
-        public_key = None
-        for key in jwks["keys"]:
-            if key["kid"] == header["kid"]:
-                public_key = RSAAlgorithm.from_jwk(json.dumps(key))
-                break
-        
+        # 2. Find matching key
+        public_key = await jwks_cache.get_key(issuer, header.get("kid"))
         if not public_key:
             raise HTTPException(status_code=401, detail="Invalid token: key not found")
         
-        # 4. Verify
-        decoded = jwt.decode(token, public_key, algorithms=["RS256"], audience=None, issuer=issuer)
+        # 3. Verify
+        decoded = jwt.decode(
+            token, public_key, algorithms=["RS256"], audience=None, issuer=issuer, leeway=CLERK_CLOCK_SKEW
+        )
+        claims_cache.put(token, decoded)
         return decoded
 
     except Exception as e:
@@ -66,60 +249,157 @@ async def verify_clerk_token(token: str):
 
 from models.user import User, UserProfile
 from sqlmodel import select
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 import datetime
 
-async def get_user_from_clerk_token(session: AsyncSession, payload: dict) -> User:
+# Seconds a Clerk user id keeps resolving to the cached user row without a query
+CLERK_IDENTITY_TTL = float(os.getenv("CLERK_IDENTITY_TTL", "60"))
+
+
+class IdentityCache:
+    """
+    Column values of the user row for each Clerk user id (sub), kept for a short TTL so
+    authenticated requests do not look the user up every time. Bounded by LRU eviction.
+    Changes to a user (admin flag, deletion) invalidate its entry in this process; other
+    processes pick them up within the TTL.
+    """
+
+    def __init__(
+        self,
+        ttl: float = CLERK_IDENTITY_TTL,
+        max_entries: int = CLERK_CLAIMS_CACHE_SIZE,
+        session_factory=None
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._session_factory = session_factory  # writes new users; defaults to database.async_session
+        # clerk id -> (user columns, expires at)
+        self._entries: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "linked": 0, "invalidated": 0}
+
+    def _get_session_factory(self):
+        if self._session_factory is None:
+            from database import async_session
+            self._session_factory = async_session
+        return self._session_factory
+
+    def get(self, clerk_id: str) -> Optional[dict]:
+        entry = self._entries.get(clerk_id)
+        if entry is None or time.time() >= entry[1]:
+            self._entries.pop(clerk_id, None)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(clerk_id)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def put(self, clerk_id: str, user: User):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[clerk_id] = (user.model_dump(), time.time() + self.ttl)
+        self._entries.move_to_end(clerk_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, clerk_id: Optional[str]):
+        if clerk_id and self._entries.pop(clerk_id, None) is not None:
+            self.stats["invalidated"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {**self.stats, "entries": len(self._entries), "ttl": self.ttl}
+
+
+# Singleton instance
+identity_cache = IdentityCache()
+
+def _insert_ignoring_conflicts(session: AsyncSession, model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING for SQLite and PostgreSQL"""
+    dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model).values(**values).on_conflict_do_nothing()
+
+async def _upsert_clerk_user(clerk_id: str, email: str) -> Optional[User]:
+    """
+    Create the user and profile for a Clerk id on first sight, in one write transaction.
+    A user created earlier with the same email (before clerk_id was stored) is linked
+    instead. Concurrent first requests all end up with the same row.
+    """
+    async with identity_cache._get_session_factory()() as session:
+        return await _upsert_in_session(session, clerk_id, email)
+
+async def _upsert_in_session(session: AsyncSession, clerk_id: str, email: str) -> Optional[User]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    linked = await session.execute(
+        update(User).where(User.email == email, User.clerk_id.is_(None)).values(clerk_id=clerk_id)
+    )
+    if linked.rowcount:
+        identity_cache.stats["linked"] += 1
+    else:
+        created = await session.execute(_insert_ignoring_conflicts(
+            session, User,
+            clerk_id=clerk_id,
+            email=email,
+            hashed_password="CLERK_AUTH_NO_PASSWORD",
+            is_active=True,
+            is_verified=True,
+            is_admin=False,
+            created_at=now,
+            updated_at=now
+        ))
+        if created.rowcount:
+            identity_cache.stats["created"] += 1
+
+    result = await session.execute(select(User).where(User.clerk_id == clerk_id))
+    user = result.scalar_one_or_none()
+    if user is not None:
+        await session.execute(_insert_ignoring_conflicts(
+            session, UserProfile,
+            user_id=user.id,
+            name=email.split("@")[0],
+            activity_level="moderate",
+            timezone="UTC",
+            created_at=now,
+            updated_at=now
+        ))
+    await session.commit()
+    return user
+
+async def get_user_from_clerk_token(session: AsyncSession, payload: dict) -> Optional[User]:
     """
     Get or Create User based on Clerk Token.
+    Users are found by Clerk user id ('sub'), from the identity cache when possible.
+    Returns None if the token has no subject, or its email belongs to another Clerk user.
     """
-    # Clerk payload usually has 'email' or 'emails' ?
-    # Standard claims might not include email unless requested?
-    # Usually we get user_id ('sub').
-    # But to sync with local DB, we need email (if we use email as key).
-    
     clerk_id = payload.get("sub")
-    email = payload.get("email") # check if present
+    if not clerk_id:
+        return None
     
-    # Check your Clerk JWT Template! verify it includes email!
-    # For now, if email missing, we can't sync properly unless we store clerk_id.
+    cached = identity_cache.get(clerk_id)
+    if cached is not None:
+        # Attach to this session without a query
+        return await _attach(session, cached)
     
-    # Ideally User model has 'clerk_id'. 
-    # Current User model: id, email, hashed_password, ...
-    
-    if not email:
-        # Fallback: try to find user by some other means or fail
-        # For this demo, assume email is in token (config Clerk to include it)
-        # OR fetch from Clerk API using clerk_id (requires secret key)
-        pass 
-        
-    # Find by email
-    statement = select(User).where(User.email == email)
-    result = await session.execute(statement)
+    result = await session.execute(select(User).where(User.clerk_id == clerk_id))
     user = result.scalar_one_or_none()
+    if user is None:
+        # Check your Clerk JWT Template includes email; otherwise a placeholder keeps it unique
+        email = payload.get("email") or f"{clerk_id}@users.clerk"
+        created = await _upsert_clerk_user(clerk_id, email)
+        if created is None:
+            return None
+        user = await _attach(session, created.model_dump())
     
-    if user:
-        return user
-        
-    # Create User
-    # Password not needed. set random/null?
-    # User model requires hashed_password? Check model.
-    user = User(
-        email=email,
-        hashed_password="CLERK_AUTH_NO_PASSWORD",
-        is_active=True,
-        is_verified=True
-    )
-    session.add(user)
-    await session.commit()
-    await session.refresh(user)
-    
-    # Create Profile
-    profile = UserProfile(
-        user_id=user.id,
-        name=email.split("@")[0]
-    )
-    session.add(profile)
-    await session.commit()
-    
+    identity_cache.put(clerk_id, user)
     return user
+
+async def _attach(session: AsyncSession, columns: dict) -> User:
+    """User row from its column values, added to session as persistent without a query"""
+    user = User(**columns)
+    make_transient_to_detached(user)
+    return await session.merge(user, load=False)
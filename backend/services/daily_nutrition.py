@@ -0,0 +1,121 @@
+"""
+Daily nutrition rollups
+daily_nutrition holds one row of totals per user and day. Meal writes update it in the
+same transaction, so summaries and trends read O(days) small rows instead of meal_logs.
+Days are local days in the user's timezone (see services.day_window).
+"""
+from datetime import date, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.daily_nutrition import DailyNutrition
+from models.meal_log import MealLog
+from models.user import UserProfile
+from services.day_window import get_timezone, local_date, local_day
+
+
+class DailyNutritionRollup:
+    """Keeps daily_nutrition in step with meal_logs and reads it back"""
+
+    async def record(self, session: AsyncSession, meal: MealLog, tz: ZoneInfo, sign: int = 1):
+        """
+        Add a meal's totals to its local day in tz (sign=-1 removes them). Runs in the
+        caller's session so the rollup commits or rolls back together with the meal.
+        """
+        dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+        day = local_day(meal.logged_at, tz)
+        statement = dialect.insert(DailyNutrition).values(
+            user_id=meal.user_id,
+            day=day,
+            calories=sign * meal.calories_total,
+            # Rounded like rebuild(), so a day's first meal stores what a rebuild would
+            protein_g=func.round(sign * meal.protein_total, 2),
+            carbs_g=func.round(sign * meal.carbs_total, 2),
+            fats_g=func.round(sign * meal.fats_total, 2),
+            meals_count=sign
+        )
+        row, added = DailyNutrition.__table__.c, statement.excluded
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[row.user_id, row.day],
+            set_={
+                "calories": row.calories + added.calories,
+                # Rounded so repeated adds and removes do not drift
+                "protein_g": func.round(row.protein_g + added.protein_g, 2),
+                "carbs_g": func.round(row.carbs_g + added.carbs_g, 2),
+                "fats_g": func.round(row.fats_g + added.fats_g, 2),
+                "meals_count": row.meals_count + added.meals_count,
+            }
+        ))
+        if sign < 0:
+            await session.execute(
+                delete(DailyNutrition)
+                .where(DailyNutrition.user_id == meal.user_id, DailyNutrition.day == day)
+                .where(DailyNutrition.meals_count <= 0)
+            )
+
+    async def get_day(self, session: AsyncSession, user_id: int, day: date) -> DailyNutrition:
+        """Totals for one day (zeros if nothing was logged)"""
+        return (await self.get_days(session, user_id, day, day))[0]
+
+    async def get_days(self, session: AsyncSession, user_id: int, start: date, end: date) -> list[DailyNutrition]:
+        """Totals for every day from start to end inclusive, in order, with zeros for empty days"""
+        result = await session.execute(
+            select(DailyNutrition)
+            .where(DailyNutrition.user_id == user_id)
+            .where(DailyNutrition.day >= start)
+            .where(DailyNutrition.day <= end)
+        )
+        rows = {row.day: row for row in result.scalars()}
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        return [rows.get(day) or DailyNutrition(user_id=user_id, day=day) for day in days]
+
+    def rebuild(self, conn, user_id: Optional[int] = None) -> int:
+        """
+        Recompute rollups from meal_logs, for one user or everyone, with one
+        INSERT ... SELECT ... GROUP BY local date per timezone in use. Takes a sync
+        connection (conn.run_sync); returns the rows written.
+        """
+        zone = func.coalesce(UserProfile.timezone, "UTC")
+        clear = delete(DailyNutrition)
+        ranges = (
+            select(zone, func.min(MealLog.logged_at), func.max(MealLog.logged_at))
+            .select_from(MealLog)
+            .outerjoin(UserProfile, UserProfile.user_id == MealLog.user_id)
+            .group_by(zone)
+        )
+        if user_id is not None:
+            clear = clear.where(DailyNutrition.user_id == user_id)
+            ranges = ranges.where(MealLog.user_id == user_id)
+
+        conn.execute(clear)
+        written = 0
+        columns = ["user_id", "day", "calories", "protein_g", "carbs_g", "fats_g", "meals_count"]
+        for name, first, last in conn.execute(ranges).all():
+            day = local_date(MealLog.logged_at, get_timezone(name), first, last + timedelta(seconds=1), conn.dialect.name)
+            totals = (
+                select(
+                    MealLog.user_id,
+                    day,
+                    func.sum(MealLog.calories_total),
+                    # Each meal rounded before summing, as record() adds them
+                    func.round(func.sum(func.round(MealLog.protein_total, 2)), 2),
+                    func.round(func.sum(func.round(MealLog.carbs_total, 2)), 2),
+                    func.round(func.sum(func.round(MealLog.fats_total, 2)), 2),
+                    func.count(MealLog.id)
+                )
+                .outerjoin(UserProfile, UserProfile.user_id == MealLog.user_id)
+                .where(zone == name)
+                .group_by(MealLog.user_id, day)
+            )
+            if user_id is not None:
+                totals = totals.where(MealLog.user_id == user_id)
+            written += conn.execute(insert(DailyNutrition).from_select(columns, totals)).rowcount
+        return written
+
+
+# Singleton instance
+daily_nutrition = DailyNutritionRollup()
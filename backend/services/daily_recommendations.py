@@ -0,0 +1,415 @@
+"""
+Recommendations of the Day
+One fitness/cuisine/drink pick per subject per UTC day, generated once, persisted in the
+daily_recommendations table and served from memory. A background job pre-generates the
+day's picks at startup and after every midnight.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from services.catalog import catalog
+from services.recipe_engine import recipe_engine
+from services.single_flight import SingleFlight
+
+# Seconds after which another worker may take over an unfinished generation claim
+DAILY_CLAIM_TIMEOUT = float(os.getenv("DAILY_CLAIM_TIMEOUT", "120"))
+# Seconds before a subject whose generation failed is tried again
+DAILY_RETRY_SECONDS = float(os.getenv("DAILY_RETRY_SECONDS", "300"))
+
+# How often a worker waiting on another worker's claim re-reads the table
+CLAIM_POLL_SECONDS = 0.5
+
+
+class DailyPick(NamedTuple):
+    """A recommendation of the day and where it came from (ai, previous, catalog)"""
+    day: str
+    source: str
+    payload: dict
+
+
+def today() -> str:
+    """Current UTC date as YYYY-MM-DD"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def seconds_until_next_day(now: Optional[datetime] = None) -> float:
+    """Seconds until the next UTC midnight"""
+    now = now or datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+def catalog_pick(kind: str, subject: str, day: str) -> Optional[dict]:
+    """Catalog entry for a subject and day; every worker picks the same one"""
+    if kind == "fitness":
+        candidates = [catalog.recipe_by_id[card.id] for card in recipe_engine.get_fitness_recipes(goal=subject)]
+    elif kind == "cuisine":
+        candidates = list(catalog.recipes_by_cuisine.get(subject.lower(), ()))
+    else:
+        candidates = list(catalog.drinks_by_category.get(subject.lower(), ()))
+    if not candidates:
+        return None
+    digest = hashlib.sha256(f"{kind}:{subject}:{day}".encode("utf-8")).hexdigest()
+    return dict(candidates[int(digest, 16) % len(candidates)])
+
+
+class DailyRecommendations:
+    """
+    Serves one pick per (kind, subject) per day.
+    Memory is checked first, then the shared table. On a miss the worker claims the day's row,
+    generates, and stores the result; other workers wait for the claimed row instead of
+    generating their own. If generation fails, yesterday's pick or a catalog entry is served
+    and generation is retried after DAILY_RETRY_SECONDS.
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        persistent: bool = True,
+        claim_timeout: float = DAILY_CLAIM_TIMEOUT,
+        retry_seconds: float = DAILY_RETRY_SECONDS
+    ):
+        self.persistent = persistent
+        self.claim_timeout = claim_timeout
+        self.retry_seconds = retry_seconds
+        self._session_factory = session_factory
+        # A factory passed in (tests, scripts) serves reads as well
+        self._read_session_factory = session_factory
+        # (kind, subject) -> (pick, retry_at); retry_at is set for fallback picks only
+        self._memory: dict[tuple[str, str], tuple[DailyPick, Optional[float]]] = {}
+        self._flight = SingleFlight("daily-recommendations")
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"memory_hits": 0, "loaded": 0, "generated": 0, "waited": 0, "fallbacks": 0, "errors": 0}
+
+    def _get_session_factory(self):
+        if self._session_factory is None:
+            from database import async_session
+            self._session_factory = async_session
+        return self._session_factory
+
+    def _get_read_session_factory(self):
+        """Read-only lookups use the read pool, so they never queue behind writes"""
+        if self._read_session_factory is None:
+            from database import read_session
+            self._read_session_factory = read_session
+        return self._read_session_factory
+
+    # ----- public API -----
+
+    async def get(
+        self,
+        kind: str,
+        subject: str,
+        generate: Callable[[str], Awaitable[Optional[dict]]]
+    ) -> Optional[DailyPick]:
+        """
+        Today's pick for a subject. generate(day) is called at most once per subject per day
+        across workers and should return a JSON-serializable payload, or None on failure.
+        """
+        day = today()
+        pick = self._fresh(kind, subject, day)
+        if pick is not None:
+            return pick
+
+        return await self._flight.do(
+            f"{kind}:{subject}:{day}",
+            lambda: self._load_or_generate(kind, subject, day, generate)
+        )
+
+    async def get_many(
+        self,
+        subjects: list[tuple[str, str]],
+        generate_many: Callable[[str, list[tuple[str, str]]], Awaitable[list[Optional[dict]]]]
+    ) -> dict[tuple[str, str], Optional[DailyPick]]:
+        """
+        Today's picks for several (kind, subject) pairs.
+        The pairs this worker claims are generated together by generate_many(day, pairs),
+        which returns one payload (or None) per pair; pairs claimed elsewhere are awaited.
+        """
+        day = today()
+        picks: dict[tuple[str, str], Optional[DailyPick]] = {}
+        claimed, waiting = [], []
+        for kind, subject in subjects:
+            pick = self._fresh(kind, subject, day)
+            if pick is not None:
+                picks[(kind, subject)] = pick
+                continue
+            state, value = await self._claim(kind, subject, day)
+            if state == "ready":
+                picks[(kind, subject)] = self._remember(kind, subject, value)
+            elif state == "wait":
+                waiting.append((kind, subject, value))
+            else:
+                claimed.append((kind, subject, value))
+
+        async def generate_claimed():
+            if not claimed:
+                return
+            try:
+                payloads = await generate_many(day, [(kind, subject) for kind, subject, _ in claimed])
+            except Exception as e:
+                print(f"Recommendation of the day generation failed: {e}")
+                payloads = [None] * len(claimed)
+            for (kind, subject, row_id), payload in zip(claimed, payloads):
+                picks[(kind, subject)] = await self._finish(kind, subject, day, row_id, payload)
+
+        async def await_claim(kind, subject, row_id):
+            picks[(kind, subject)] = await self._await_claim(kind, subject, day, row_id)
+
+        await asyncio.gather(generate_claimed(), *[await_claim(*entry) for entry in waiting])
+        return picks
+
+    def start(self, warm: Callable[[], Awaitable]):
+        """Run warm() now and after every UTC midnight in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_daily(warm))
+
+    async def stop(self):
+        """Cancel the background job"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "day": today(),
+            "scheduled": self._task is not None and not self._task.done()
+        }
+
+    def clear_memory(self):
+        """Drop in-process picks (persisted picks are kept)"""
+        self._memory.clear()
+
+    # ----- generation -----
+
+    async def _run_daily(self, warm: Callable[[], Awaitable]):
+        while True:
+            try:
+                await warm()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Recommendation of the day pre-generation failed: {e}")
+            # A few seconds past midnight, so today() has rolled over on every worker
+            await asyncio.sleep(seconds_until_next_day() + 5)
+
+    def _fresh(self, kind: str, subject: str, day: str) -> Optional[DailyPick]:
+        """Today's pick from memory, unless it is a fallback due for a retry"""
+        entry = self._memory.get((kind, subject))
+        if entry is None:
+            return None
+        pick, retry_at = entry
+        if pick.day != day or (retry_at is not None and retry_at <= time.time()):
+            return None
+        self.stats["memory_hits"] += 1
+        return pick
+
+    async def _load_or_generate(self, kind: str, subject: str, day: str, generate) -> Optional[DailyPick]:
+        state, value = await self._claim(kind, subject, day)
+        if state == "ready":
+            return self._remember(kind, subject, value)
+        if state == "wait":
+            return await self._await_claim(kind, subject, day, value)
+
+        try:
+            payload = await generate(day)
+        except Exception as e:
+            print(f"Recommendation of the day generation failed: {e}")
+            payload = None
+        return await self._finish(kind, subject, day, value, payload)
+
+    async def _claim(self, kind: str, subject: str, day: str) -> tuple[str, Any]:
+        """
+        Decide who produces today's pick:
+        ("ready", pick) if it is stored, ("wait", row_id) if another worker holds the claim,
+        or ("generate", row_id) if this worker does (row_id is None without persistence).
+        """
+        if not self.persistent:
+            return "generate", None
+        row_id = f"{kind}:{subject}:{day}"
+        try:
+            stored, claimed = await self._read_or_claim(row_id, kind, subject, day)
+        except Exception as e:
+            # Table unavailable: generate for this process only
+            self.stats["errors"] += 1
+            print(f"Daily recommendation table unavailable: {e}")
+            return "generate", None
+        if stored is not None:
+            self.stats["loaded"] += 1
+            return "ready", stored
+        return ("generate", row_id) if claimed else ("wait", row_id)
+
+    async def _await_claim(self, kind: str, subject: str, day: str, row_id: str) -> Optional[DailyPick]:
+        """Wait for another worker's pick, falling back if it never arrives"""
+        self.stats["waited"] += 1
+        try:
+            stored = await self._wait_for(row_id)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Daily recommendation read failed: {e}")
+            stored = None
+        if stored is not None:
+            self.stats["loaded"] += 1
+            return self._remember(kind, subject, stored)
+        return await self._fall_back(kind, subject, day)
+
+    async def _finish(self, kind: str, subject: str, day: str, row_id: Optional[str], payload: Optional[dict]) -> Optional[DailyPick]:
+        """Store a freshly generated pick, or release the claim and fall back"""
+        if payload is None:
+            if row_id:
+                await self._release(row_id)
+            return await self._fall_back(kind, subject, day)
+
+        self.stats["generated"] += 1
+        pick = DailyPick(day, "ai", payload)
+        if row_id:
+            await self._store(row_id, pick)
+        return self._remember(kind, subject, pick)
+
+    async def _fall_back(self, kind: str, subject: str, day: str) -> Optional[DailyPick]:
+        """Yesterday's (or the latest) pick, else a catalog entry; retried later"""
+        self.stats["fallbacks"] += 1
+        entry = self._memory.get((kind, subject))
+        if entry is not None and entry[0].source == "ai":
+            previous = entry[0]
+        else:
+            previous = await self._latest_stored(kind, subject, day)
+
+        if previous is not None:
+            pick = DailyPick(day, "previous", previous.payload)
+        else:
+            payload = catalog_pick(kind, subject, day)
+            if payload is None:
+                return None
+            pick = DailyPick(day, "catalog", payload)
+        return self._remember(kind, subject, pick, retry_at=time.time() + self.retry_seconds)
+
+    def _remember(self, kind: str, subject: str, pick: DailyPick, retry_at: Optional[float] = None) -> DailyPick:
+        self._memory[(kind, subject)] = (pick, retry_at)
+        return pick
+
+    # ----- persistence -----
+
+    async def _read_or_claim(self, row_id: str, kind: str, subject: str, day: str) -> tuple[Optional[DailyPick], bool]:
+        """Return (stored pick, False), or (None, True) if this worker now holds the claim"""
+        from sqlalchemy import update
+        from sqlalchemy.exc import IntegrityError
+        from models.daily_recommendation import DailyRecommendation
+
+        async with self._get_read_session_factory()() as session:
+            row = await session.get(DailyRecommendation, row_id)
+            if row is not None and row.payload:
+                return DailyPick(row.day, row.source, row.get_payload()), False
+
+        # Claim on the writer, re-reading in case the pick was stored in between
+        async with self._get_session_factory()() as session:
+            row = await session.get(DailyRecommendation, row_id)
+            if row is not None and row.payload:
+                return DailyPick(row.day, row.source, row.get_payload()), False
+
+            if row is None:
+                session.add(DailyRecommendation(id=row_id, kind=kind, subject=subject, day=day))
+                try:
+                    await session.commit()
+                    return None, True
+                except IntegrityError:
+                    await session.rollback()
+                    return None, False
+
+            if time.time() - row.claimed_at <= self.claim_timeout:
+                return None, False
+
+            # Take over an abandoned claim; only one worker wins the compare-and-set
+            result = await session.execute(
+                update(DailyRecommendation)
+                .where(DailyRecommendation.id == row_id, DailyRecommendation.claimed_at == row.claimed_at)
+                .values(claimed_at=time.time())
+            )
+            await session.commit()
+            return None, result.rowcount == 1
+
+    async def _wait_for(self, row_id: str) -> Optional[DailyPick]:
+        """Poll a row claimed by another worker until it has a payload, is released, or times out"""
+        from models.daily_recommendation import DailyRecommendation
+
+        deadline = time.time() + self.claim_timeout
+        while time.time() < deadline:
+            await asyncio.sleep(CLAIM_POLL_SECONDS)
+            async with self._get_read_session_factory()() as session:
+                row = await session.get(DailyRecommendation, row_id)
+                if row is None:
+                    return None
+                if row.payload:
+                    return DailyPick(row.day, row.source, row.get_payload())
+        return None
+
+    async def _store(self, row_id: str, pick: DailyPick):
+        try:
+            from sqlalchemy import update
+            from models.daily_recommendation import DailyRecommendation
+            async with self._get_session_factory()() as session:
+                await session.execute(
+                    update(DailyRecommendation)
+                    .where(DailyRecommendation.id == row_id)
+                    .values(payload=json.dumps(pick.payload), source=pick.source, created_at=time.time())
+                )
+                await session.commit()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Daily recommendation write failed: {e}")
+
+    async def _release(self, row_id: str):
+        """Drop an unfinished claim so the next request or run can retry"""
+        try:
+            from sqlalchemy import delete
+            from models.daily_recommendation import DailyRecommendation
+            async with self._get_session_factory()() as session:
+                await session.execute(
+                    delete(DailyRecommendation)
+                    .where(DailyRecommendation.id == row_id, DailyRecommendation.payload.is_(None))
+                )
+                await session.commit()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Daily recommendation release failed: {e}")
+
+    async def _latest_stored(self, kind: str, subject: str, day: str) -> Optional[DailyPick]:
+        if not self.persistent:
+            return None
+        try:
+            from sqlmodel import select
+            from models.daily_recommendation import DailyRecommendation
+            async with self._get_read_session_factory()() as session:
+                result = await session.execute(
+                    select(DailyRecommendation)
+                    .where(
+                        DailyRecommendation.kind == kind,
+                        DailyRecommendation.subject == subject,
+                        DailyRecommendation.day < day,
+                        DailyRecommendation.payload.is_not(None),
+                        DailyRecommendation.source == "ai"
+                    )
+                    .order_by(DailyRecommendation.day.desc())
+                    .limit(1)
+                )
+                row = result.scalars().first()
+                return DailyPick(row.day, row.source, row.get_payload()) if row else None
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Daily recommendation read failed: {e}")
+            return None
+
+
+# Singleton instance
+daily_recommendations = DailyRecommendations()
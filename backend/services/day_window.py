@@ -0,0 +1,100 @@
+"""
+Day windows in a user's timezone
+Meals are stored with UTC timestamps, while a user's day runs from local midnight to local
+midnight (UserProfile.timezone). These helpers turn local days into UTC ranges for queries,
+and build the SQL expression that buckets timestamps by local date for GROUP BY.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import Date, case, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import UserProfile
+
+UTC = ZoneInfo("UTC")
+
+
+def get_timezone(name: Optional[str]) -> ZoneInfo:
+    """The zone for an IANA name, or UTC if it is empty or unknown"""
+    try:
+        return ZoneInfo(name) if name else UTC
+    except (ZoneInfoNotFoundError, ValueError):
+        return UTC
+
+def is_timezone(name: str) -> bool:
+    """Whether name is a known IANA timezone"""
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+async def user_timezone(session: AsyncSession, user_id: int) -> ZoneInfo:
+    """The timezone from a user's profile (UTC without one)"""
+    result = await session.execute(select(UserProfile.timezone).where(UserProfile.user_id == user_id))
+    return get_timezone(result.scalar_one_or_none())
+
+def local_today(tz: ZoneInfo) -> date:
+    """The current day in a timezone"""
+    return datetime.now(tz).date()
+
+def local_day(moment: datetime, tz: ZoneInfo) -> date:
+    """The local day of a timestamp (naive timestamps are UTC, as stored)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz).date()
+
+def day_window(day: date, tz: ZoneInfo, days: int = 1) -> tuple[datetime, datetime]:
+    """[start, end) in UTC of `days` local days starting at `day` (DST days are 23 or 25 hours)"""
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=days), time.min, tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+def _offset_minutes(tz: ZoneInfo, moment: datetime) -> int:
+    return int(moment.astimezone(tz).utcoffset().total_seconds() // 60)
+
+def offset_changes(tz: ZoneInfo, start: datetime, end: datetime) -> list[tuple[Optional[datetime], int]]:
+    """
+    UTC offsets of a timezone over [start, end) as [(until, minutes), ...]: each offset
+    applies before its `until` instant, the last one (until=None) to the end of the range.
+    """
+    changes = []
+    offset = _offset_minutes(tz, start)
+    day = start
+    while day < end:
+        next_day = min(day + timedelta(days=1), end)
+        next_offset = _offset_minutes(tz, next_day)
+        if next_offset != offset:
+            # Narrow the change down to the second, then to its minute
+            low, high = day, next_day
+            while high - low > timedelta(seconds=1):
+                middle = low + (high - low) / 2
+                if _offset_minutes(tz, middle) == offset:
+                    low = middle
+                else:
+                    high = middle
+            instant = high.replace(second=0, microsecond=0)
+            changes.append((instant if instant > low else instant + timedelta(minutes=1), offset))
+            offset = next_offset
+        day = next_day
+    changes.append((None, offset))
+    return changes
+
+def local_date(column, tz: ZoneInfo, start: datetime, end: datetime, dialect_name: str):
+    """
+    SQL expression for the local date of a UTC timestamp column, valid for rows in [start, end).
+    PostgreSQL converts with the zone itself; SQLite shifts the stored UTC text by the offset in
+    effect, with one CASE branch per DST change in the range.
+    """
+    if dialect_name == "postgresql":
+        return cast(func.timezone(tz.key, column), Date)
+    changes = offset_changes(tz, start, end)
+    shifted = [func.date(column, f"{minutes:+d} minutes") for _, minutes in changes]
+    if len(changes) == 1:
+        return shifted[0]
+    return case(
+        *[(column < until, expression) for (until, _), expression in zip(changes[:-1], shifted[:-1])],
+        else_=shifted[-1]
+    )
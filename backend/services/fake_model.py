@@ -0,0 +1,284 @@
+"""
+Offline Model Provider
+A stand-in for genai.GenerativeModel that replays recorded responses or synthesizes valid
+JSON from the request's response schema, with configurable latency, errors and streaming.
+Selected with AI_PROVIDER=fake; lets the AI routes be load-tested without a key or network.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+# Time to first chunk: "800" (fixed), "uniform:300:1500" or "lognormal:1500:0.4" (median ms, sigma)
+AI_FAKE_LATENCY_MS = os.getenv("AI_FAKE_LATENCY_MS", "lognormal:1500:0.4")
+# Streaming: characters per chunk and milliseconds between chunks (also added to non-streamed calls)
+AI_FAKE_CHUNK_CHARS = int(os.getenv("AI_FAKE_CHUNK_CHARS", "60"))
+AI_FAKE_CHUNK_MS = float(os.getenv("AI_FAKE_CHUNK_MS", "25"))
+# Fraction of calls failing with 503 / 429, and of streams cut off midway
+AI_FAKE_ERROR_RATE = float(os.getenv("AI_FAKE_ERROR_RATE", "0"))
+AI_FAKE_QUOTA_RATE = float(os.getenv("AI_FAKE_QUOTA_RATE", "0"))
+AI_FAKE_STREAM_BREAK_RATE = float(os.getenv("AI_FAKE_STREAM_BREAK_RATE", "0"))
+# JSONL of {"prompt", "text"}; written by RecordingModel, replayed by FakeModel
+AI_RECORDINGS_PATH = os.getenv("AI_RECORDINGS_PATH")
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: str):
+    """Latency spec -> sampler(rng) returning milliseconds"""
+    kind, _, args = spec.partition(":")
+    if not args:
+        fixed = float(kind)
+        return lambda rng: fixed
+    values = [float(v) for v in args.split(":")]
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def load_recordings(path: Optional[str]) -> dict[str, str]:
+    """prompt hash -> response text (later lines win)"""
+    recordings = {}
+    if not path or not os.path.exists(path):
+        return recordings
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recordings[entry.get("prompt_hash") or prompt_hash(entry["prompt"])] = entry["text"]
+    return recordings
+
+
+# ============= SYNTHESIS =============
+
+NAME_WORDS = (
+    ["Smoky", "Zesty", "Golden", "Herby", "Crispy", "Spiced", "Silky", "Rustic"],
+    ["Skillet", "Bowl", "Stir-Fry", "Curry", "Bake", "Wrap", "Stew", "Salad"]
+)
+DEFAULT_INGREDIENTS = ["onion", "tomato", "garlic", "rice"]
+
+
+def _prompt_value(prompt: str, label: str) -> Optional[str]:
+    match = re.search(rf"{label}:\s*([^.\n(]+)", prompt)
+    return match.group(1).strip() if match else None
+
+
+class _Synthesizer:
+    """Builds a plausible value for a response schema, using hints from the prompt"""
+
+    def __init__(self, prompt: str, rng: random.Random):
+        self.rng = rng
+        ingredients = _prompt_value(prompt, "Ingredients")
+        self.ingredients = [i.strip() for i in ingredients.split(",")] if ingredients else DEFAULT_INGREDIENTS
+        self.cuisine = _prompt_value(prompt, "Cuisine") or "Global"
+        diet = _prompt_value(prompt, "Diet")
+        self.diet = diet if diet in ("veg", "egg", "non-veg", "vegan") else "veg"
+        servings = re.search(r"Servings:\s*(\d+)", prompt)
+        self.servings = int(servings.group(1)) if servings else 2
+        # Values the prompt pins down, e.g. cuisine must be "Japanese"
+        self.pinned = dict(re.findall(r'(\w+) must be "([^"]+)"', prompt))
+
+    def value(self, schema: dict, field: str = "", count: Optional[int] = None):
+        kind = schema.get("type")
+        if kind == "object":
+            return {name: self.value(sub, name) for name, sub in schema.get("properties", {}).items()}
+        if kind == "array":
+            n = count if count is not None else self.rng.randint(2, 5)
+            if field in ("required_ingredients", "optional_ingredients"):
+                pool = self.ingredients if field == "required_ingredients" else DEFAULT_INGREDIENTS
+                return list(pool[:n]) or list(DEFAULT_INGREDIENTS[:n])
+            return [self.value(schema["items"], field.removesuffix("s")) for _ in range(n)]
+        if kind == "integer":
+            return self._integer(field)
+        if kind == "number":
+            return round(self.rng.uniform(1, 100), 1)
+        if kind == "boolean":
+            return self.rng.random() < 0.5
+        return self._string(field)
+
+    def _integer(self, field: str) -> int:
+        ranges = {
+            "calories": (180, 650), "protein_g": (5, 45), "carbs_g": (10, 80), "fats_g": (3, 30),
+            "time_minutes": (10, 45)
+        }
+        if field == "servings":
+            return self.servings
+        low, high = ranges.get(field, (1, 10))
+        return self.rng.randint(low, high)
+
+    def _string(self, field: str) -> str:
+        adjective, dish = self.rng.choice(NAME_WORDS[0]), self.rng.choice(NAME_WORDS[1])
+        values = {
+            "name": f"{adjective} {self.ingredients[0].title()} {dish}",
+            "cuisine": self.cuisine,
+            "diet": self.diet,
+            "category": "food",
+            "difficulty": self.rng.choice(["Easy", "Easy", "Medium"]),
+            "serving_size": "250ml",
+            "region": self.cuisine,
+            "step": f"{self.rng.choice(['Chop', 'Sear', 'Simmer', 'Toss', 'Season'])} the {self.rng.choice(self.ingredients)}.",
+            "suggested_ingredient": f"{self.rng.choice(['lemon', 'coriander', 'chilli'])} - brightens the dish",
+        }
+        if field in self.pinned:
+            return self.pinned[field]
+        return values.get(field, f"{field.replace('_', ' ')} {self.rng.randint(1, 99)}".strip())
+
+
+def synthesize_text(prompt: str, generation_config: Optional[dict]) -> str:
+    """A response for prompt: schema-valid JSON when a response schema is given, else short text"""
+    rng = random.Random(prompt_hash(prompt))
+    schema = (generation_config or {}).get("response_schema")
+    if schema is None:
+        if "JSON array" in prompt:
+            return json.dumps(DEFAULT_INGREDIENTS[:2])
+        return "A quick, comforting dish with bright, balanced flavours."
+
+    synthesizer = _Synthesizer(prompt, rng)
+    # Batched prompts ask for one element per numbered request
+    count = len(re.findall(r"^### Request \d+", prompt, re.M)) or None
+    return json.dumps(synthesizer.value(schema, count=count))
+
+
+# ============= MODELS =============
+
+class FakeModel:
+    """
+    Drop-in for genai.GenerativeModel.generate_content (blocking, like the SDK).
+    Prompts found in the recordings are replayed verbatim; others are synthesized.
+    """
+
+    def __init__(
+        self,
+        latency_ms: str = AI_FAKE_LATENCY_MS,
+        chunk_chars: int = AI_FAKE_CHUNK_CHARS,
+        chunk_ms: float = AI_FAKE_CHUNK_MS,
+        error_rate: float = AI_FAKE_ERROR_RATE,
+        quota_rate: float = AI_FAKE_QUOTA_RATE,
+        stream_break_rate: float = AI_FAKE_STREAM_BREAK_RATE,
+        recordings_path: Optional[str] = AI_RECORDINGS_PATH,
+        seed: Optional[int] = None
+    ):
+        self._latency = parse_latency(latency_ms)
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_ms = chunk_ms
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.stream_break_rate = stream_break_rate
+        self.recordings = load_recordings(recordings_path)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "replayed": 0, "synthesized": 0, "errors": 0, "quota_errors": 0, "stream_breaks": 0}
+
+    def _draw(self) -> tuple[float, float]:
+        # SDK calls run on several executor threads
+        with self._lock:
+            return self._latency(self._rng), self._rng.random()
+
+    def _respond(self, prompt: str, generation_config: Optional[dict]) -> tuple[str, float]:
+        latency_ms, roll = self._draw()
+        with self._lock:
+            self.stats["calls"] += 1
+            if roll < self.quota_rate:
+                self.stats["quota_errors"] += 1
+            elif roll < self.quota_rate + self.error_rate:
+                self.stats["errors"] += 1
+        if roll < self.quota_rate:
+            # Rate limits are rejected up front, well before a normal response
+            time.sleep(latency_ms / 10000)
+            raise google_exceptions.ResourceExhausted("Quota exceeded (fake). Please retry in 30s")
+        if roll < self.quota_rate + self.error_rate:
+            time.sleep(latency_ms / 1000)
+            raise google_exceptions.ServiceUnavailable("Model overloaded (fake)")
+
+        text = self.recordings.get(prompt_hash(prompt))
+        with self._lock:
+            self.stats["replayed" if text is not None else "synthesized"] += 1
+        if text is None:
+            text = synthesize_text(prompt, generation_config)
+        return text, latency_ms
+
+    def _usage(self, prompt: str, text: str):
+        return SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+
+    def generate_content(self, prompt, stream: bool = False, generation_config: Optional[dict] = None, **kwargs):
+        text, latency_ms = self._respond(prompt, generation_config)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        if stream:
+            return self._stream(prompt, text, chunks, latency_ms)
+
+        time.sleep((latency_ms + self.chunk_ms * len(chunks)) / 1000)
+        return SimpleNamespace(text=text, usage_metadata=self._usage(prompt, text))
+
+    def _stream(self, prompt: str, text: str, chunks: list[str], latency_ms: float) -> Iterator:
+        with self._lock:
+            break_at = len(chunks) // 2 if self._rng.random() < self.stream_break_rate else None
+        time.sleep(latency_ms / 1000)
+        for n, chunk in enumerate(chunks):
+            if n == break_at:
+                with self._lock:
+                    self.stats["stream_breaks"] += 1
+                raise google_exceptions.ServiceUnavailable("Stream interrupted (fake)")
+            if n:
+                time.sleep(self.chunk_ms / 1000)
+            if n == len(chunks) - 1:
+                yield SimpleNamespace(text=chunk, usage_metadata=self._usage(prompt, text))
+            else:
+                yield SimpleNamespace(text=chunk)
+
+    def count_tokens(self, prompt: str):
+        return SimpleNamespace(total_tokens=len(prompt) // 4)
+
+
+class RecordingModel:
+    """Wraps a real model and appends every prompt/response pair to a JSONL file for FakeModel"""
+
+    def __init__(self, model, path: str):
+        self._model = model
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _record(self, prompt: str, text: str):
+        line = json.dumps({"prompt_hash": prompt_hash(prompt), "prompt": prompt, "text": text})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        if not stream:
+            response = self._model.generate_content(prompt, **kwargs)
+            self._record(prompt, response.text)
+            return response
+        return self._stream(prompt, kwargs)
+
+    def _stream(self, prompt: str, kwargs: dict) -> Iterator:
+        parts = []
+        for chunk in self._model.generate_content(prompt, stream=True, **kwargs):
+            parts.append(chunk.text or "")
+            yield chunk
+        self._record(prompt, "".join(parts))
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+_fake_model: Optional[FakeModel] = None
+
+def get_fake_model() -> FakeModel:
+    """Process-wide FakeModel built from the AI_FAKE_* settings"""
+    global _fake_model
+    if _fake_model is None:
+        _fake_model = FakeModel()
+    return _fake_model
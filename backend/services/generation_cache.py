@@ -0,0 +1,248 @@
+"""
+Generation Cache Service
+TTL-bounded cache of AI generation results keyed by the normalized request.
+An in-process LRU sits in front of a persistent tier (SQLite table, or Redis when available).
+"""
+import hashlib
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+AI_CACHE_MAX_ROWS = int(os.getenv("AI_CACHE_MAX_ROWS", "50000"))
+# Keep up to this many different generations per key and serve one at random
+AI_CACHE_VARIANTS = int(os.getenv("AI_CACHE_VARIANTS", "1"))
+
+# Prune expired/excess persistent rows every N writes
+PRUNE_EVERY = 100
+
+
+def make_generation_key(kind: str, **params) -> str:
+    """
+    Canonical hash of a generation request.
+    Strings are lowercased and stripped, ingredient lists are deduplicated and sorted,
+    so equivalent requests map to the same key.
+    """
+    canonical = {"kind": kind}
+    for name, value in params.items():
+        if isinstance(value, (list, tuple, set)):
+            value = sorted({str(v).strip().lower() for v in value if str(v).strip()})
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        canonical[name] = value
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Two-tier cache of generation payloads (JSON-serializable dicts)"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = AI_CACHE_TTL_SECONDS,
+        max_entries: int = AI_CACHE_MAX_ENTRIES,
+        max_rows: int = AI_CACHE_MAX_ROWS,
+        max_variants: int = AI_CACHE_VARIANTS,
+        session_factory=None,
+        persistent: bool = True
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.max_variants = max(1, max_variants)
+        self.persistent = persistent
+        self._session_factory = session_factory
+        # A factory passed in (tests, scripts) serves reads as well
+        self._read_session_factory = session_factory
+        self._redis = None
+        # key -> (expires_at epoch seconds, variants)
+        self._memory: "OrderedDict[str, tuple[float, list]]" = OrderedDict()
+        self._writes = 0
+        self.stats = {"hits": 0, "memory_hits": 0, "persistent_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    def use_redis(self, redis_client):
+        """Use Redis instead of the SQL table as the persistent tier"""
+        self._redis = redis_client
+
+    def _get_session_factory(self):
+        if self._session_factory is None:
+            from database import async_session
+            self._session_factory = async_session
+        return self._session_factory
+
+    def _get_read_session_factory(self):
+        """Read-only lookups use the read pool, so they never queue behind writes"""
+        if self._read_session_factory is None:
+            from database import read_session
+            self._read_session_factory = read_session
+        return self._read_session_factory
+
+    # ----- public API -----
+
+    async def get(self, key: str) -> Optional[dict]:
+        """
+        Return a cached payload, or None on a miss.
+        When variants are enabled, a key only hits once it holds max_variants entries,
+        so early requests keep adding variety.
+        """
+        variants = self._memory_get(key)
+        source = "memory_hits"
+        if variants is None:
+            stored = await self._persistent_get(key)
+            source = "persistent_hits"
+            if stored is not None:
+                # Copied with the stored expiry, so memory never outlives the persistent entry
+                expires_at, variants = stored
+                self._memory_put(key, variants, expires_at)
+
+        if not variants or len(variants) < self.max_variants:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        self.stats[source] += 1
+        return random.choice(variants)
+
+    async def peek(self, key: str) -> Optional[dict]:
+        """
+        Return the newest cached payload for a key regardless of the variant threshold,
+        without touching hit/miss counters. Used to collect background generations.
+        """
+        variants = self._memory_get(key)
+        if variants is None:
+            stored = await self._persistent_get(key)
+            variants = stored[1] if stored else None
+        return variants[-1] if variants else None
+
+    async def put(self, key: str, payload: dict, kind: str = "recipe"):
+        """Store a payload, appending it as a variant if the key already has entries"""
+        variants = self._memory_get(key)
+        if variants is None:
+            stored = await self._persistent_get(key)
+            variants = stored[1] if stored else []
+        variants = (variants + [payload])[-self.max_variants:]
+
+        expires_at = self._expiry()
+        self._memory_put(key, variants, expires_at)
+        await self._persistent_put(key, kind, variants, expires_at)
+        self.stats["writes"] += 1
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "backend": "redis" if self._redis is not None else ("sql" if self.persistent else "memory"),
+            "ttl_seconds": self.ttl_seconds,
+            "max_variants": self.max_variants
+        }
+
+    def clear_memory(self):
+        """Drop the in-process tier (persistent entries are kept)"""
+        self._memory.clear()
+
+    # ----- in-process LRU -----
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl_seconds
+
+    def _memory_get(self, key: str) -> Optional[list]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, variants = entry
+        if expires_at <= time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return variants
+
+    def _memory_put(self, key: str, variants: list, expires_at: float):
+        self._memory[key] = (expires_at, variants)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ----- persistent tier -----
+
+    async def _persistent_get(self, key: str) -> Optional[tuple[float, list]]:
+        """(expires_at, variants) of a live persistent entry, or None"""
+        if not self.persistent:
+            return None
+        try:
+            if self._redis is not None:
+                name = f"ai-gen:{key}"
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    raw, ttl = await pipe.get(name).ttl(name).execute()
+                if not raw:
+                    return None
+                # ttl is -1 for a key without expiry
+                return (time.time() + ttl if ttl >= 0 else self._expiry()), json.loads(raw)
+
+            from models.generation_cache import GenerationCacheEntry
+            async with self._get_read_session_factory()() as session:
+                entry = await session.get(GenerationCacheEntry, key)
+                if entry is None or entry.expires_at <= time.time():
+                    return None
+                return entry.expires_at, entry.get_variants()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Generation cache read failed: {e}")
+            return None
+
+    async def _persistent_put(self, key: str, kind: str, variants: list, expires_at: float):
+        if not self.persistent:
+            return
+        try:
+            if self._redis is not None:
+                await self._redis.set(f"ai-gen:{key}", json.dumps(variants), ex=self.ttl_seconds)
+                return
+
+            from models.generation_cache import GenerationCacheEntry
+            async with self._get_session_factory()() as session:
+                entry = GenerationCacheEntry(
+                    key=key,
+                    kind=kind,
+                    expires_at=expires_at
+                )
+                entry.set_variants(variants)
+                await session.merge(entry)
+                await session.commit()
+
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    await self._prune(session)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Generation cache write failed: {e}")
+
+    async def _prune(self, session):
+        """Delete expired rows and the oldest rows beyond max_rows"""
+        from sqlmodel import select, delete
+        from models.generation_cache import GenerationCacheEntry
+
+        await session.execute(
+            delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= time.time())
+        )
+        cutoff = await session.execute(
+            select(GenerationCacheEntry.expires_at)
+            .order_by(GenerationCacheEntry.expires_at.desc())
+            .offset(self.max_rows)
+            .limit(1)
+        )
+        oldest_kept = cutoff.scalar_one_or_none()
+        if oldest_kept is not None:
+            await session.execute(
+                delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= oldest_kept)
+            )
+        await session.commit()
+
+
+# Singleton instance
+generation_cache = GenerationCache()
@@ -0,0 +1,384 @@
+"""
+AI Job Queue
+Durable queue of AI generations in the ai_jobs table, run by a pool of worker tasks.
+HTTP handlers submit a job and return at once; results are polled or streamed, so a burst
+of generations never holds request workers. Generation throughput is set by the number of
+queue workers (AI_JOB_WORKERS), which can also run in a separate process.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+# Worker tasks per process (0 = this process only submits, e.g. web workers next to a
+# dedicated `python -m scripts.run_ai_worker`)
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "2"))
+# A running job older than this is presumed abandoned (its worker died) and requeued
+AI_JOB_TIMEOUT = float(os.getenv("AI_JOB_TIMEOUT", "120"))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "2"))
+# Queued jobs one user may have at a time
+AI_JOB_MAX_QUEUED_PER_OWNER = int(os.getenv("AI_JOB_MAX_QUEUED_PER_OWNER", "10"))
+# Finished jobs are kept this long for polling
+AI_JOB_RETENTION_SECONDS = float(os.getenv("AI_JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+# Idle workers and stream watchers re-read the table this often (jobs submitted or finished
+# by other processes); in-process changes wake them immediately
+JOB_POLL_SECONDS = 0.5
+# Stale-job and retention sweep interval
+SWEEP_SECONDS = 30.0
+# Queued jobs considered per claim when choosing the next owner to serve
+CLAIM_WINDOW = 100
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed")
+
+
+class QueueFullError(Exception):
+    """The owner already has AI_JOB_MAX_QUEUED_PER_OWNER queued jobs"""
+
+
+class JobQueue:
+    """
+    Jobs are claimed highest priority first. Within a priority, the owner with the fewest
+    running jobs (ties: served least recently) goes next, and gets its oldest job, so one
+    user's burst cannot starve everyone else. Claims are compare-and-set updates on the row,
+    so any number of processes can share the table.
+    Submitting a job whose generation key is already queued or running returns that job
+    instead of a new one (finished generations are deduplicated by the generation cache).
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        workers: int = AI_JOB_WORKERS,
+        job_timeout: float = AI_JOB_TIMEOUT,
+        max_attempts: int = AI_JOB_MAX_ATTEMPTS,
+        max_queued_per_owner: int = AI_JOB_MAX_QUEUED_PER_OWNER,
+        retention_seconds: float = AI_JOB_RETENTION_SECONDS
+    ):
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.max_queued_per_owner = max_queued_per_owner
+        self.retention_seconds = retention_seconds
+        self._session_factory = session_factory
+        # A factory passed in (tests, scripts) serves reads as well
+        self._read_session_factory = session_factory
+        self._handlers: dict[str, Callable[[dict], Awaitable[Optional[dict]]]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._last_served: dict[str, float] = {}
+        self._last_sweep = 0.0
+        self._name = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0,
+                      "requeued": 0, "lost_claims": 0, "total_wait_ms": 0.0, "total_run_ms": 0.0}
+
+    def _get_session_factory(self):
+        if self._session_factory is None:
+            from database import async_session
+            self._session_factory = async_session
+        return self._session_factory
+
+    def _get_read_session_factory(self):
+        """Read-only lookups use the read pool, so they never queue behind writes"""
+        if self._read_session_factory is None:
+            from database import read_session
+            self._read_session_factory = read_session
+        return self._read_session_factory
+
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[Optional[dict]]]):
+        """handler(params) returns the job's JSON-serializable result, or None if it failed"""
+        self._handlers[kind] = handler
+
+    # ----- public API -----
+
+    async def submit(self, kind: str, key: str, params: dict, owner: str, priority: int = 0):
+        """
+        Queue a job; returns (job, deduplicated).
+        Raises QueueFullError when the owner has too many queued jobs.
+        """
+        from sqlalchemy.exc import IntegrityError
+        from sqlmodel import select, func
+        from models.ai_job import AIJob
+
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for {kind} jobs")
+
+        active = (
+            select(AIJob)
+            .where(AIJob.key == key, AIJob.kind == kind, AIJob.status.in_(ACTIVE))
+            .order_by(AIJob.created_at.desc())
+            .limit(1)
+        )
+        async with self._get_session_factory()() as session:
+            existing = (await session.execute(active)).scalars().first()
+            if existing is not None:
+                self.stats["deduplicated"] += 1
+                return existing, True
+
+            queued = await session.execute(
+                select(func.count()).select_from(AIJob).where(AIJob.owner == owner, AIJob.status == "queued")
+            )
+            if queued.scalar_one() >= self.max_queued_per_owner:
+                self.stats["rejected"] += 1
+                raise QueueFullError(f"{owner} already has {self.max_queued_per_owner} queued jobs")
+
+            job = AIJob(
+                id=uuid.uuid4().hex, kind=kind, key=key, owner=owner,
+                priority=priority, params=json.dumps(params)
+            )
+            session.add(job)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another submitter queued the same key since the check (ix_ai_jobs_active_key)
+                await session.rollback()
+                existing = (await session.execute(active)).scalars().first()
+                if existing is None:
+                    raise
+                self.stats["deduplicated"] += 1
+                return existing, True
+            await session.refresh(job)
+
+        self.stats["submitted"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job, False
+
+    async def get(self, job_id: str):
+        """A job by id, or None"""
+        from models.ai_job import AIJob
+        async with self._get_read_session_factory()() as session:
+            return await session.get(AIJob, job_id)
+
+    async def position(self, job) -> int:
+        """Number of queued jobs that will be considered before this one (0 = next)"""
+        from sqlalchemy import and_, or_
+        from sqlmodel import select, func
+        from models.ai_job import AIJob
+
+        if job.status != "queued":
+            return 0
+        async with self._get_read_session_factory()() as session:
+            result = await session.execute(
+                select(func.count()).select_from(AIJob).where(
+                    AIJob.status == "queued",
+                    or_(
+                        AIJob.priority > job.priority,
+                        and_(AIJob.priority == job.priority, AIJob.created_at < job.created_at)
+                    )
+                )
+            )
+            return result.scalar_one()
+
+    async def watch(self, job_id: str, timeout: Optional[float] = None) -> AsyncIterator:
+        """Yield the job whenever its status changes, until it finishes (or timeout passes)"""
+        deadline = time.time() + (timeout if timeout is not None else self.job_timeout * self.max_attempts)
+        last_status = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield job
+            if job.status in FINISHED or time.time() >= deadline:
+                return
+            await self._wait_for_change()
+
+    def start(self):
+        """Start the worker tasks (call from the running event loop)"""
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run_worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the worker tasks; their running jobs are requeued once they time out"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        finished = self.stats["completed"] + self.stats["failed"]
+        return {
+            **{k: v for k, v in self.stats.items() if not k.startswith("total_")},
+            "workers": sum(1 for task in self._tasks if not task.done()),
+            "avg_queue_wait_ms": round(self.stats["total_wait_ms"] / finished, 1) if finished else 0.0,
+            "avg_run_ms": round(self.stats["total_run_ms"] / finished, 1) if finished else 0.0
+        }
+
+    # ----- workers -----
+
+    async def _wait_for_change(self):
+        changed = self._changed
+        if changed is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify_changed(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    async def _run_worker(self, n: int):
+        worker = f"{self._name}-{n}"
+        while True:
+            try:
+                if time.time() - self._last_sweep >= SWEEP_SECONDS:
+                    self._last_sweep = time.time()
+                    await self._sweep()
+                job = await self._claim_next(worker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"AI job queue unavailable: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job, worker)
+
+    async def _execute(self, job, worker: str):
+        handler = self._handlers.get(job.kind)
+        started = time.time()
+        result, error = None, None
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for {job.kind} jobs")
+            result = await asyncio.wait_for(handler(job.get_params()), timeout=self.job_timeout)
+            if result is None:
+                error = "Generation failed"
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            error = f"Timed out after {self.job_timeout:.0f}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"AI job {job.id} failed: {e}")
+
+        if not await self._finish(job.id, worker, result, error):
+            return
+        self.stats["total_wait_ms"] += (started - job.created_at) * 1000
+        self.stats["total_run_ms"] += (time.time() - started) * 1000
+        self.stats["completed" if error is None else "failed"] += 1
+
+    async def _claim_next(self, worker: str):
+        """Claim the next job for worker, or return None if nothing is queued"""
+        from sqlalchemy import update
+        from sqlmodel import select, func
+        from models.ai_job import AIJob
+
+        async with self._get_session_factory()() as session:
+            for _ in range(3):
+                result = await session.execute(
+                    select(AIJob)
+                    .where(AIJob.status == "queued")
+                    .order_by(AIJob.priority.desc(), AIJob.created_at)
+                    .limit(CLAIM_WINDOW)
+                )
+                queued = list(result.scalars().all())
+                if not queued:
+                    return None
+
+                running = dict((await session.execute(
+                    select(AIJob.owner, func.count()).where(AIJob.status == "running").group_by(AIJob.owner)
+                )).all())
+                top = [job for job in queued if job.priority == queued[0].priority]
+                owner = min(
+                    dict.fromkeys(job.owner for job in top),
+                    key=lambda o: (running.get(o, 0), self._last_served.get(o, 0.0))
+                )
+                job = next(job for job in top if job.owner == owner)
+
+                now = time.time()
+                claimed = await session.execute(
+                    update(AIJob)
+                    .where(AIJob.id == job.id, AIJob.status == "queued")
+                    .values(status="running", worker=worker, started_at=now, attempts=AIJob.attempts + 1)
+                )
+                await session.commit()
+                if claimed.rowcount == 1:
+                    self._last_served[owner] = now
+                    await session.refresh(job)
+                    self._notify_changed()
+                    return job
+                # Another worker got there first
+                self.stats["lost_claims"] += 1
+                session.expire_all()
+        return None
+
+    async def _finish(self, job_id: str, worker: str, result: Optional[dict], error: Optional[str]) -> bool:
+        """
+        Store a job's outcome if worker still holds its claim; returns False when the sweep
+        has since requeued or failed the job (it may already run elsewhere)
+        """
+        from sqlalchemy import update
+        from models.ai_job import AIJob
+        stored = False
+        try:
+            async with self._get_session_factory()() as session:
+                finished = await session.execute(
+                    update(AIJob)
+                    .where(AIJob.id == job_id, AIJob.worker == worker, AIJob.status == "running")
+                    .values(
+                        status="done" if error is None else "failed",
+                        result=json.dumps(result) if result is not None else None,
+                        error=error,
+                        finished_at=time.time()
+                    )
+                )
+                await session.commit()
+            stored = finished.rowcount == 1
+            if not stored:
+                self.stats["lost_claims"] += 1
+                print(f"AI job {job_id} was taken from {worker}; result dropped")
+        except Exception as e:
+            print(f"AI job {job_id} result could not be stored: {e}")
+        self._notify_changed()
+        return stored
+
+    async def _sweep(self):
+        """Requeue (or fail) jobs whose worker went away, and drop expired finished jobs"""
+        from sqlalchemy import delete, update
+        from models.ai_job import AIJob
+
+        cutoff = time.time() - self.job_timeout
+        async with self._get_session_factory()() as session:
+            requeued = await session.execute(
+                update(AIJob)
+                .where(AIJob.status == "running", AIJob.started_at < cutoff, AIJob.attempts < self.max_attempts)
+                .values(status="queued", worker=None)
+            )
+            await session.execute(
+                update(AIJob)
+                .where(AIJob.status == "running", AIJob.started_at < cutoff)
+                .values(status="failed", error="Worker stopped responding", finished_at=time.time())
+            )
+            await session.execute(
+                delete(AIJob)
+                .where(AIJob.status.in_(FINISHED), AIJob.finished_at < time.time() - self.retention_seconds)
+            )
+            await session.commit()
+        if requeued.rowcount:
+            self.stats["requeued"] += requeued.rowcount
+            print(f"Requeued {requeued.rowcount} abandoned AI job(s)")
+
+
+# Singleton instance
+job_queue = JobQueue()
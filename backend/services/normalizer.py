@@ -3,32 +3,18 @@ Ingredient Normalizer Service
 Handles fuzzy matching and alias resolution for ingredients
 """
 from rapidfuzz import fuzz, process
-import json
-import os
-from pathlib import Path
+from typing import Mapping
+
+from services.catalog import catalog
 
 class IngredientNormalizer:
     """Normalizes user input ingredients to canonical names"""
     
     def __init__(self):
-        self.aliases: dict[str, list[str]] = {}
-        self.canonical_to_aliases: dict[str, list[str]] = {}
-        self._load_aliases()
-    
-    def _load_aliases(self):
-        """Load ingredient aliases from recipes.json"""
-        data_path = Path(__file__).parent.parent / "data" / "recipes.json"
-        try:
-            with open(data_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.canonical_to_aliases = data.get("ingredient_aliases", {})
-                # Build reverse mapping
-                for canonical, aliases in self.canonical_to_aliases.items():
-                    for alias in aliases:
-                        self.aliases[alias.lower()] = canonical.lower()
-                    self.aliases[canonical.lower()] = canonical.lower()
-        except Exception as e:
-            print(f"Warning: Could not load aliases: {e}")
+        # Alias maps come from the shared catalog so they can't drift from the engine's data
+        self.aliases: Mapping[str, str] = catalog.alias_to_canonical
+        self.canonical_to_aliases: Mapping[str, tuple[str, ...]] = catalog.ingredient_aliases
+        self._all_names: list[str] = list(self.aliases.keys())
     
     def normalize(self, ingredient: str) -> str:
         """
@@ -43,11 +29,10 @@ class IngredientNormalizer:
             return self.aliases[cleaned]
         
         # Fuzzy match against all known names
-        all_names = list(self.aliases.keys())
-        if all_names:
+        if self._all_names:
             result = process.extractOne(
                 cleaned, 
-                all_names, 
+                self._all_names, 
                 scorer=fuzz.ratio,
                 score_cutoff=80
             )
@@ -0,0 +1,322 @@
+"""
+Nutrition Calculator
+Per-100 g macros for common ingredients (data/ingredient_nutrition.json), used to compute a
+recipe's nutrition from its quantities ("200g chicken breast", "1 cup rice", "2 eggs").
+A batch of recipes is computed with one (recipes x ingredients) @ (ingredients x macros)
+matrix multiply. Used to check and repair AI-reported nutrition, to rescale recipes to a
+different number of servings without another model call, and by the backup generator.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from models.recipe import Nutrition, Recipe
+from services.catalog import DATA_DIR, catalog
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback, same results
+    np = None
+
+NUTRITION_FILE = DATA_DIR / "ingredient_nutrition.json"
+
+# Reported nutrition further than this (relative) from the computed one is replaced
+NUTRITION_REPAIR_TOLERANCE = float(os.getenv("NUTRITION_REPAIR_TOLERANCE", "0.35"))
+# Share of a recipe's ingredients that must be understood before its nutrition is computed
+NUTRITION_MIN_COVERAGE = float(os.getenv("NUTRITION_MIN_COVERAGE", "0.6"))
+
+MACROS = ("calories", "protein_g", "carbs_g", "fats_g")
+# Differences below these never count as wrong (rounding on small values)
+MACRO_FLOORS = (60.0, 6.0, 6.0, 6.0)
+DEFAULT_CUP_G = 240.0
+
+# Count nouns and sizes that carry no quantity of their own ("2 large eggs")
+DESCRIPTORS = frozenset({
+    "chopped", "diced", "sliced", "minced", "grated", "crushed", "cubed", "julienned", "peeled",
+    "fresh", "freshly", "dried", "frozen", "large", "medium", "small", "whole", "boneless",
+    "skinless", "cooked", "raw", "boiled", "finely", "roughly", "thinly", "ripe", "halved", "of"
+})
+UNICODE_FRACTIONS = {"½": " 1/2", "¼": " 1/4", "¾": " 3/4", "⅓": " 1/3", "⅔": " 2/3", "⅛": " 1/8"}
+
+_NUMBER = r"\d+(?:\.\d+)?(?:\s+\d+/\d+)?|\d+/\d+"
+_QUANTITY = rf"(?P<qty>(?:{_NUMBER})(?:\s*(?:-|to)\s*(?:{_NUMBER}))?)"
+_UNIT = r"(?P<unit>[a-z]+)?\.?"
+_LEADING = re.compile(rf"^\s*{_QUANTITY}\s*{_UNIT}\s+(?:of\s+)?(?P<name>.+)$")
+_TRAILING = re.compile(rf"^(?P<name>.+?)\s*(?:[(\-–:,]\s*){_QUANTITY}\s*{_UNIT}\s*\)?\s*$")
+# Seasonings and garnishes, too small to matter
+_UNCOUNTED = re.compile(r"\b(to taste|for garnish|as needed|optional)\b", re.IGNORECASE)
+
+
+class ParsedIngredient(NamedTuple):
+    """One ingredient line resolved to a table row and an amount"""
+    name: str
+    row: Optional[int]  # table row, None if the ingredient is unknown
+    grams: Optional[float]  # None if the line has no usable quantity
+    quantity: Optional[float]
+    span: Optional[tuple[int, int]]  # where the quantity is in the normalized line
+
+
+class NutritionEstimate(NamedTuple):
+    """Computed nutrition for one recipe"""
+    nutrition: Nutrition  # per serving, extrapolated over coverage
+    coverage: float  # share of ingredient lines with a known ingredient and amount
+    lines: int
+
+
+def normalize_line(line: str) -> str:
+    for symbol, ascii_value in UNICODE_FRACTIONS.items():
+        line = line.replace(symbol, ascii_value)
+    return line.strip()
+
+
+def _number(text: str) -> float:
+    """'1 1/2' -> 1.5, '2-3' -> 2.5"""
+    parts = re.split(r"\s*(?:-|to)\s*", text.strip())
+    values = []
+    for part in parts:
+        total = 0.0
+        for piece in part.split():
+            if "/" in piece:
+                numerator, denominator = piece.split("/")
+                total += float(numerator) / float(denominator) if float(denominator) else 0.0
+            else:
+                total += float(piece)
+        values.append(total)
+    return sum(values) / len(values)
+
+
+def format_quantity(value: float, unit: Optional[str]) -> str:
+    """Kitchen-friendly amount: grams to 5 g, small counts to quarters"""
+    if unit in ("g", "gm", "gms", "gram", "grams", "ml") and value >= 20:
+        return str(int(round(value / 5) * 5))
+    if value >= 10:
+        return str(int(round(value)))
+    quarters = max(1, round(value * 4))
+    whole, rest = divmod(quarters, 4)
+    fraction = {0: "", 1: "1/4", 2: "1/2", 3: "3/4"}[rest]
+    if not whole:
+        return fraction
+    return f"{whole} {fraction}" if fraction else str(whole)
+
+
+class NutritionTable:
+    """Ingredient macros and the calculator built on them"""
+
+    def __init__(self, path: Path = NUTRITION_FILE):
+        self.names: list[str] = []
+        self.per_gram: list[tuple[float, ...]] = []
+        self.row_of: dict[str, int] = {}
+        self.piece_grams: dict[str, float] = {}
+        self.cup_grams: dict[str, float] = {}
+        self.unit_grams: dict[str, float] = {}
+        self.matrix = None
+        self.stats = {
+            "recipes": 0, "batches": 0, "checked": 0, "repaired": 0,
+            "low_coverage": 0, "rescaled": 0
+        }
+        self._load(path)
+
+    def _load(self, path: Path):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load ingredient nutrition table: {e}")
+            return
+        for name, values in data.get("per_100g", {}).items():
+            self.row_of[name] = len(self.names)
+            self.names.append(name)
+            self.per_gram.append(tuple(float(v) / 100 for v in values))
+        self.piece_grams = {k: float(v) for k, v in data.get("piece_grams", {}).items()}
+        self.cup_grams = {k: float(v) for k, v in data.get("cup_grams", {}).items()}
+        self.unit_grams = {k: float(v) for k, v in data.get("unit_grams", {}).items()}
+        if np is not None and self.per_gram:
+            self.matrix = np.array(self.per_gram, dtype=np.float64)
+        self.lookup.cache_clear()
+        self.parse.cache_clear()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ============= LOOKUP AND PARSING =============
+
+    @lru_cache(maxsize=8192)
+    def lookup(self, ingredient: str) -> Optional[int]:
+        """Table row for an ingredient name: exact, catalog alias, without descriptors, singular, then its words"""
+        name = re.sub(r"\(.*?\)", "", ingredient.lower()).split(",")[0].strip()
+        words = [w for w in re.findall(r"[a-z][a-z'-]*", name) if w not in DESCRIPTORS]
+        plain = " ".join(words)
+        names = [name, catalog.canonical(name), plain, catalog.canonical(plain)]
+        names += [n[:-2] if n.endswith("oes") else n.removesuffix("s") for n in (name, plain)]
+        if len(words) > 1:
+            names += [n for w in reversed(words) for n in (w, w.removesuffix("s"))]
+        return next((self.row_of[n] for n in names if n in self.row_of), None)
+
+    @lru_cache(maxsize=16384)
+    def parse(self, line: str) -> ParsedIngredient:
+        """Ingredient line -> (name, table row, grams); grams is None without a usable amount"""
+        text = normalize_line(line)
+        lowered = text.lower()
+        match = _LEADING.match(lowered) or _TRAILING.match(lowered)
+        if match is None:
+            row = self.lookup(lowered)
+            return ParsedIngredient(lowered, row, None, None, None)
+
+        quantity = _number(match.group("qty"))
+        name = match.group("name").strip(" ,")
+        unit = match.group("unit")
+        if unit and unit not in self.unit_grams and unit not in ("cup", "cups"):
+            # Not a unit: part of the name ("2 eggs", "3 garlic cloves")
+            name = f"{unit} {name}" if match.re is _LEADING else name
+            unit = None
+        row = self.lookup(name)
+        canonical = self.names[row] if row is not None else name
+
+        if unit in ("cup", "cups"):
+            grams = quantity * self.cup_grams.get(canonical, DEFAULT_CUP_G)
+        elif unit:
+            grams = quantity * self.unit_grams[unit]
+        else:
+            piece = self.piece_grams.get(canonical)
+            grams = quantity * piece if piece is not None else None
+        return ParsedIngredient(name, row, grams, quantity, match.span("qty"))
+
+    # ============= COMPUTATION =============
+
+    def _rows(self, ingredients: list[str]) -> tuple[dict[int, float], float]:
+        """Grams per table row for one recipe, and the share of lines understood"""
+        amounts: dict[int, float] = {}
+        known = counted = 0
+        for line in ingredients:
+            parsed = self.parse(line)
+            if parsed.grams is None and (
+                _UNCOUNTED.search(line) or (parsed.row is not None and not any(self.per_gram[parsed.row]))
+            ):
+                continue  # "salt to taste", "coriander for garnish"
+            counted += 1
+            if parsed.row is None or parsed.grams is None:
+                continue
+            known += 1
+            amounts[parsed.row] = amounts.get(parsed.row, 0.0) + parsed.grams
+        return amounts, (known / counted if counted else 0.0)
+
+    def totals_batch(self, recipes_amounts: list[dict[int, float]]) -> list[tuple[float, ...]]:
+        """Macro totals for many recipes' {row: grams}: one matrix multiply"""
+        if not recipes_amounts:
+            return []
+        self.stats["batches"] += 1
+        self.stats["recipes"] += len(recipes_amounts)
+        if self.matrix is not None:
+            quantities = np.zeros((len(recipes_amounts), len(self.names)))
+            for i, amounts in enumerate(recipes_amounts):
+                if amounts:
+                    quantities[i, list(amounts)] = list(amounts.values())
+            return [tuple(row) for row in (quantities @ self.matrix).tolist()]
+        return [
+            tuple(
+                sum(grams * self.per_gram[row][m] for row, grams in amounts.items())
+                for m in range(len(MACROS))
+            )
+            for amounts in recipes_amounts
+        ]
+
+    def estimate_batch(self, recipes: list[Recipe]) -> list[NutritionEstimate]:
+        """Per-serving nutrition computed from each recipe's required ingredients"""
+        parsed = [self._rows(recipe.required_ingredients) for recipe in recipes]
+        totals = self.totals_batch([amounts for amounts, _ in parsed])
+        estimates = []
+        for recipe, (_, coverage), total in zip(recipes, parsed, totals):
+            scale = 1 / (max(1, recipe.servings) * coverage) if coverage else 0.0
+            values = [max(0, round(v * scale)) for v in total]
+            estimates.append(NutritionEstimate(
+                Nutrition(**dict(zip(MACROS, values))), round(coverage, 3), len(recipe.required_ingredients)
+            ))
+        return estimates
+
+    def estimate(self, recipe: Recipe) -> NutritionEstimate:
+        return self.estimate_batch([recipe])[0]
+
+    def macros(self, ingredient: str, grams: float) -> Optional[tuple[float, ...]]:
+        """Macros in grams of one ingredient, None if it is not in the table"""
+        row = self.lookup(ingredient)
+        if row is None:
+            return None
+        return tuple(value * grams for value in self.per_gram[row])
+
+    # ============= VALIDATION =============
+
+    @staticmethod
+    def is_plausible(reported: Nutrition, computed: Nutrition, tolerance: float = NUTRITION_REPAIR_TOLERANCE) -> bool:
+        """Whether reported nutrition is within tolerance of the computed values"""
+        for field, floor in zip(MACROS, MACRO_FLOORS):
+            expected = getattr(computed, field)
+            if abs(getattr(reported, field) - expected) > max(floor, expected * tolerance):
+                return False
+        return True
+
+    def repair_batch(self, recipes: list[Recipe]) -> list[Recipe]:
+        """
+        Replace nutrition that is implausible for the recipe's ingredient quantities with the
+        computed values. Recipes whose ingredients are not understood well enough are kept as is.
+        """
+        if not recipes or not self.names:
+            return recipes
+        repaired = []
+        for recipe, estimate in zip(recipes, self.estimate_batch(recipes)):
+            self.stats["checked"] += 1
+            if estimate.coverage < NUTRITION_MIN_COVERAGE:
+                self.stats["low_coverage"] += 1
+            elif not self.is_plausible(recipe.nutrition, estimate.nutrition):
+                self.stats["repaired"] += 1
+                recipe = recipe.model_copy(update={"nutrition": estimate.nutrition})
+            repaired.append(recipe)
+        return repaired
+
+    def repair(self, recipe: Recipe) -> Recipe:
+        return self.repair_batch([recipe])[0]
+
+    # ============= RESCALING =============
+
+    def scale_line(self, line: str, factor: float) -> str:
+        """Multiply the amount in an ingredient line; lines without one are unchanged"""
+        parsed = self.parse(line)
+        if parsed.span is None or factor == 1:
+            return line
+        text = normalize_line(line)
+        start, end = parsed.span
+        unit = re.match(r"\s*([a-z]+)", text[end:].lower())
+        amount = format_quantity(parsed.quantity * factor, unit.group(1) if unit else None)
+        return f"{text[:start]}{amount}{text[end:]}"
+
+    def rescale(self, recipe: Recipe, servings: int, portion: float = 1.0) -> Recipe:
+        """
+        Recipe for a different number of servings (and portion size, as a factor of the
+        current one), without another model call. Per-serving nutrition scales with portion.
+        """
+        factor = servings * portion / max(1, recipe.servings)
+        self.stats["rescaled"] += 1
+        nutrition = recipe.nutrition
+        if portion != 1:
+            nutrition = Nutrition(**{f: max(0, round(getattr(nutrition, f) * portion)) for f in MACROS})
+        return recipe.model_copy(update={
+            "servings": servings,
+            "required_ingredients": [self.scale_line(i, factor) for i in recipe.required_ingredients],
+            "optional_ingredients": [self.scale_line(i, factor) for i in recipe.optional_ingredients],
+            "nutrition": nutrition
+        })
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {
+            **self.stats,
+            "ingredients": len(self.names),
+            "vectorized": self.matrix is not None,
+            "tolerance": NUTRITION_REPAIR_TOLERANCE,
+            "min_coverage": NUTRITION_MIN_COVERAGE
+        }
+
+
+# Singleton instance
+nutrition_table = NutritionTable()
@@ -2,35 +2,19 @@
 Recipe Engine Service
 Core logic for matching recipes based on available ingredients
 """
-import json
-from pathlib import Path
-from typing import Optional
+from typing import Mapping, Optional
 from models.recipe import Recipe, RecipeCard, Drink, Nutrition
+from services.ai_recipe_store import ai_recipe_store
+from services.catalog import catalog
 from services.normalizer import normalizer
 
 class RecipeEngine:
     """Handles recipe matching and filtering"""
     
     def __init__(self):
-        self.recipes: list[dict] = []
-        self.drinks: list[dict] = []
-        self._ai_recipes: dict = {}  # Cache for AI-generated recipes
-        self._load_data()
-    
-    def _load_data(self):
-        """Load recipes and drinks from JSON"""
-        data_path = Path(__file__).parent.parent / "data" / "recipes_expanded.json"
-        if not data_path.exists():
-             data_path = Path(__file__).parent.parent / "data" / "recipes.json"
-        
-        try:
-            with open(data_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.recipes = data.get("recipes", [])
-                self.drinks = data.get("drinks", [])
-                print(f"Loaded {len(self.recipes)} recipes and {len(self.drinks)} drinks from {data_path.name}")
-        except Exception as e:
-            print(f"Warning: Could not load recipes: {e}")
+        # Read-only views over the shared catalog (parsed once at startup)
+        self.recipes: tuple[Mapping, ...] = catalog.recipes
+        self.drinks: tuple[Mapping, ...] = catalog.drinks
     
     def match_by_ingredients(
         self, 
@@ -83,19 +67,59 @@ class RecipeEngine:
         # Sort by score descending, return top 3
         matches.sort(key=lambda x: x[0], reverse=True)
         return [card for _, card in matches[:3]]
-    
+
+    def find_near_misses(
+        self,
+        available: list[str],
+        max_missing: int = 2,
+        diet: Optional[str] = None,
+        limit: int = 2
+    ) -> list[tuple[Mapping, list[str]]]:
+        """
+        Find recipes that need only a few more required ingredients.
+        Returns (recipe, missing_ingredients) pairs, fewest missing first.
+        """
+        available_set = set(normalizer.normalize_list(available))
+
+        near_misses = []
+        for recipe in self.recipes:
+            if diet and recipe.get("diet") != diet:
+                continue
+
+            required = normalizer.normalize_list(recipe["required_ingredients"])
+            missing = [ing for ing in required if ing not in available_set]
+            if not missing or len(missing) > max_missing:
+                continue
+
+            # Prefer fewer missing, then more overlap with what the user has
+            near_misses.append((len(missing), -(len(required) - len(missing)), recipe, missing))
+
+        near_misses.sort(key=lambda x: (x[0], x[1]))
+        return [(recipe, missing) for _, _, recipe, missing in near_misses[:limit]]
+
     def get_recipe_detail(self, recipe_id: str) -> Optional[Recipe]:
-        """Get full recipe details by ID"""
+        """Get full recipe details by ID (catalog and in-process AI recipes)"""
         # Check AI-generated recipes first
-        if recipe_id in self._ai_recipes:
-            return self._ai_recipes[recipe_id]
+        ai_recipe = ai_recipe_store.get_cached(recipe_id)
+        if ai_recipe:
+            return ai_recipe
         
         # Check database recipes
-        for recipe in self.recipes:
-            if recipe["id"] == recipe_id:
-                return Recipe(**recipe)
+        recipe = catalog.recipe_by_id.get(recipe_id)
+        if recipe:
+            return Recipe(**recipe)
         return None
     
+    async def fetch_recipe_detail(self, recipe_id: str) -> Optional[Recipe]:
+        """
+        Get full recipe details by ID, including AI recipes generated
+        by other workers or before a restart.
+        """
+        recipe = self.get_recipe_detail(recipe_id)
+        if recipe:
+            return recipe
+        return await ai_recipe_store.get(recipe_id)
+    
     def get_fitness_recipes(
         self, 
         goal: str,
@@ -142,10 +166,7 @@ class RecipeEngine:
         """Get recipes by cuisine type"""
         matches = []
         
-        for recipe in self.recipes:
-            if recipe["cuisine"].lower() != cuisine.lower():
-                continue
-            
+        for recipe in catalog.recipes_by_cuisine.get(cuisine.lower(), ()):
             # Apply diet filter
             if diet and recipe.get("diet") not in [diet, "veg"]:
                 continue
@@ -168,11 +189,9 @@ class RecipeEngine:
     def get_drinks(self, category: Optional[str] = None) -> list[Drink]:
         """Get drinks, optionally filtered by category"""
         matches = []
+        drinks = catalog.drinks_by_category.get(category.lower(), ()) if category else self.drinks
         
-        for drink in self.drinks:
-            if category and drink["category"].lower() != category.lower():
-                continue
-            
+        for drink in drinks:
             matches.append(Drink(
                 id=drink["id"],
                 name=drink["name"],
@@ -191,22 +210,22 @@ class RecipeEngine:
     
     def get_drink_detail(self, drink_id: str) -> Optional[Drink]:
         """Get drink details by ID"""
-        for drink in self.drinks:
-            if drink["id"] == drink_id:
-                return Drink(
-                    id=drink["id"],
-                    name=drink["name"],
-                    category=drink["category"],
-                    diet=drink["diet"],
-                    time_minutes=drink["time_minutes"],
-                    required_ingredients=drink["required_ingredients"],
-                    optional_ingredients=drink.get("optional_ingredients", []),
-                    steps=drink["steps"],
-                    serving_size=drink["serving_size"],
-                    health_note=drink.get("health_note"),
-                    nutrition=Nutrition(**drink["nutrition"])
-                )
-        return None
+        drink = catalog.drink_by_id.get(drink_id)
+        if not drink:
+            return None
+        return Drink(
+            id=drink["id"],
+            name=drink["name"],
+            category=drink["category"],
+            diet=drink["diet"],
+            time_minutes=drink["time_minutes"],
+            required_ingredients=drink["required_ingredients"],
+            optional_ingredients=drink.get("optional_ingredients", []),
+            steps=drink["steps"],
+            serving_size=drink["serving_size"],
+            health_note=drink.get("health_note"),
+            nutrition=Nutrition(**drink["nutrition"])
+        )
     
     def get_recipe_of_the_day(self) -> tuple[RecipeCard, str]:
         """
@@ -0,0 +1,88 @@
+"""
+Response Schemas
+Compact JSON schemas (Gemini's OpenAPI subset) derived from the Pydantic models,
+used to constrain structured JSON output.
+"""
+import types
+from typing import Any, Optional, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from models.recipe import Drink, Recipe
+
+SCALARS = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _field_schema(annotation: Any) -> dict:
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return {**_field_schema(args[0]), "nullable": True}
+    if origin is list:
+        return {"type": "array", "items": _field_schema(get_args(annotation)[0])}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return schema_from_model(annotation)
+    if annotation in SCALARS:
+        return {"type": SCALARS[annotation]}
+    raise TypeError(f"No schema mapping for {annotation!r}")
+
+
+def schema_from_model(
+    model: type[BaseModel],
+    omit: tuple[str, ...] = (),
+    overrides: Optional[dict[str, dict]] = None
+) -> dict:
+    """
+    Object schema for a Pydantic model.
+    omit drops fields the server fills in itself (e.g. id); overrides replaces or adds
+    field schemas (e.g. fields the model types as plain dicts).
+    """
+    overrides = overrides or {}
+    properties, required = {}, []
+    for name, field in model.model_fields.items():
+        if name in omit:
+            continue
+        properties[name] = overrides.get(name) or _field_schema(field.annotation)
+        if field.is_required():
+            required.append(name)
+    for name, schema in overrides.items():
+        properties.setdefault(name, schema)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def array_of(schema: dict) -> dict:
+    """Schema for a JSON array of schema (batched responses)"""
+    return {"type": "array", "items": schema}
+
+
+STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+RECIPE_SUGGESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "region": {"type": "string"},
+        "missing_ingredients": STRING_LIST
+    },
+    "required": ["name", "region", "missing_ingredients"]
+}
+
+# Fridge recipes: the full Recipe plus the suggestion lists; ids are assigned server-side
+FRIDGE_RECIPE_SCHEMA = schema_from_model(
+    Recipe, omit=("id",),
+    overrides={"recipe_suggestions": {"type": "array", "items": RECIPE_SUGGESTION_SCHEMA}}
+)
+
+# Fitness and cuisine recipes have no suggestion lists
+RECIPE_SCHEMA = schema_from_model(Recipe, omit=("id", "suggested_ingredients", "recipe_suggestions"))
+
+# Drinks also carry the fields the drinks routes return
+DRINK_SCHEMA = schema_from_model(
+    Drink, omit=("id",),
+    overrides={"best_time": {"type": "string"}, "variations": STRING_LIST}
+)
+
+
+def json_config(schema: dict) -> dict:
+    """generation_config overrides for schema-constrained JSON output"""
+    return {"response_mime_type": "application/json", "response_schema": schema}
@@ -0,0 +1,158 @@
+"""
+Similarity Index
+MinHash signatures with LSH banding to find previously seen ingredient sets that are
+nearly the same as a new one (Jaccard similarity above a threshold), without a scan.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple, Optional
+
+# Signature length = bands x rows. 16 bands of 4 rows find pairs at Jaccard 0.75 ~99.8%
+# of the time; every candidate is then checked against its exact Jaccard similarity.
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SIMILAR_MAX_ENTRIES = int(os.getenv("SIMILAR_MAX_ENTRIES", "200000"))
+
+_PRIME = (1 << 61) - 1
+# Fixed coefficients, so signatures are comparable across processes and restarts
+_COEFFICIENTS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME
+    )
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+
+@lru_cache(maxsize=65536)
+def _item_hashes(item: str) -> tuple[int, ...]:
+    """One hash per permutation for a single item (ingredient vocabularies are small)"""
+    x = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+    return tuple((a * x + b) % _PRIME for a, b in _COEFFICIENTS)
+
+
+def minhash(items: frozenset) -> tuple[int, ...]:
+    """MinHash signature of a non-empty set of strings"""
+    return tuple(map(min, zip(*(_item_hashes(item) for item in items))))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class SimilarMatch(NamedTuple):
+    key: str
+    similarity: float
+    items: frozenset  # the indexed set
+    meta: Any
+
+
+class MinHashLSH:
+    """
+    In-memory LSH index of item sets, bounded by LRU eviction.
+    Entries live in partitions (e.g. diet and servings); only sets in the same partition
+    are compared. Lookup cost depends on the number of candidates sharing a band, not
+    on the number of entries.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.75,
+        bands: int = LSH_BANDS,
+        max_entries: int = SIMILAR_MAX_ENTRIES
+    ):
+        if MINHASH_PERMUTATIONS % bands:
+            raise ValueError(f"bands must divide {MINHASH_PERMUTATIONS}")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self.max_entries = max_entries
+        # One bucket table per band: band hash -> keys
+        self._buckets: list[dict[int, set]] = [{} for _ in range(bands)]
+        # key -> (items, meta, band hashes)
+        self._entries: "OrderedDict[str, tuple[frozenset, Any, tuple[int, ...]]]" = OrderedDict()
+        self.stats = {"lookups": 0, "hits": 0, "candidates": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _band_hashes(self, items: frozenset, partition: str) -> tuple[int, ...]:
+        signature = minhash(items)
+        return tuple(
+            hash((partition, band, signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        )
+
+    def add(self, key: str, items, partition: str = "", meta: Any = None):
+        """Index (or refresh) key's item set"""
+        items = frozenset(items)
+        if not items:
+            return
+        self.remove(key)
+        band_hashes = self._band_hashes(items, partition)
+        for band, band_hash in enumerate(band_hashes):
+            self._buckets[band].setdefault(band_hash, set()).add(key)
+        self._entries[key] = (items, meta, band_hashes)
+
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band, band_hash in enumerate(entry[2]):
+            bucket = self._buckets[band].get(band_hash)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_hash]
+
+    def query(
+        self,
+        items,
+        partition: str = "",
+        accept: Optional[Callable[[Any], bool]] = None,
+        limit: int = 3
+    ) -> list[SimilarMatch]:
+        """
+        Indexed sets in partition with Jaccard similarity >= threshold, most similar first.
+        accept(meta) can reject candidates on other attributes.
+        """
+        items = frozenset(items)
+        self.stats["lookups"] += 1
+        if not items:
+            return []
+
+        candidates = set()
+        for band, band_hash in enumerate(self._band_hashes(items, partition)):
+            candidates.update(self._buckets[band].get(band_hash, ()))
+        self.stats["candidates"] += len(candidates)
+
+        matches = []
+        for key in candidates:
+            indexed, meta, _ = self._entries[key]
+            similarity = jaccard(items, indexed)
+            if similarity >= self.threshold and (accept is None or accept(meta)):
+                matches.append(SimilarMatch(key, similarity, indexed, meta))
+        if matches:
+            self.stats["hits"] += 1
+        matches.sort(key=lambda m: m.similarity, reverse=True)
+        for match in matches[:limit]:
+            self._entries.move_to_end(match.key)
+        return matches[:limit]
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "avg_candidates": round(self.stats["candidates"] / self.stats["lookups"], 2) if self.stats["lookups"] else 0.0
+        }
@@ -0,0 +1,84 @@
+"""
+Single-flight Request Coalescing
+Concurrent callers with the same key share one in-flight call instead of starting their own.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+    The first caller (leader) starts the call as a task; later callers with the same key
+    await that task. Results, exceptions and timeouts are delivered to every waiter.
+    A waiter that is cancelled does not cancel the shared call for the others.
+    """
+
+    def __init__(self, name: str = "single-flight", timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    async def do(self, key: str, call: Callable[[], Awaitable]):
+        """Run call() for key, or join the call already in flight for it"""
+        task = self._in_flight.get(key)
+        if task is not None and (task.done() or task.get_loop() is not asyncio.get_running_loop()):
+            # Stale entry (finished, or left behind by a closed event loop)
+            task = None
+
+        if task is None:
+            self.stats["leaders"] += 1
+            task = asyncio.create_task(self._run(call))
+            self._in_flight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.stats["coalesced"] += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if key in self._waiters and self._in_flight.get(key) is task:
+                self._waiters[key] -= 1
+
+    async def _run(self, call: Callable[[], Awaitable]):
+        try:
+            if self.timeout:
+                return await asyncio.wait_for(call(), timeout=self.timeout)
+            return await call()
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            self._waiters.pop(key, None)
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call for key is currently running"""
+        task = self._in_flight.get(key)
+        return task is not None and not task.done()
+
+    def waiting(self, key: str) -> int:
+        """Number of callers currently awaiting the call for key"""
+        return self._waiters.get(key, 0)
+
+    def snapshot(self) -> dict:
+        """Current counters, suitable for a status endpoint"""
+        total = self.stats["leaders"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "in_flight": len(self._in_flight),
+            "waiters": sum(self._waiters.values()),
+            "coalescing_ratio": round(self.stats["coalesced"] / total, 3) if total else 0.0
+        }
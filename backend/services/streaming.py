@@ -0,0 +1,117 @@
+"""
+Streaming helpers
+Incremental JSON parsing of model output and server-sent-event formatting
+"""
+import json
+from typing import Any, Iterator
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object that arrives in chunks and yields each top-level field
+    as soon as its value is complete, e.g. "name" long before "steps" has finished.
+
+    Text before the opening brace (such as a ```json fence) is skipped.
+    Only the root object is tracked; nested values are parsed with json.loads once closed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: dict[str, Any] = {}
+        self.complete = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key = None
+        self._token_start = None  # start of the current key or value
+        self._expect = "key"  # key, colon, value
+
+    def feed(self, chunk: str) -> Iterator[tuple[str, Any]]:
+        """Add text and yield (field, value) pairs completed by it"""
+        self.buffer += chunk
+        while self._pos < len(self.buffer) and not self.complete:
+            char = self.buffer[self._pos]
+            field = self._step(char)
+            self._pos += 1
+            if field is not None:
+                yield field
+
+    def _step(self, char: str):
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._depth = 1
+            return None
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1 and self._expect == "key":
+                    self._key = json.loads(self.buffer[self._token_start:self._pos + 1])
+                    self._token_start = None
+                    self._expect = "colon"
+            return None
+
+        if char == '"':
+            self._in_string = True
+            if self._depth == 1 and self._token_start is None:
+                self._token_start = self._pos
+            return None
+
+        if self._depth == 1 and self._expect == "colon":
+            if char == ":":
+                self._expect = "value"
+            return None
+
+        if char in "{[":
+            if self._depth == 1 and self._token_start is None:
+                self._token_start = self._pos
+            self._depth += 1
+            return None
+
+        if char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self.complete = True
+                return self._finish_value(self._pos)
+            return None
+
+        if self._depth == 1:
+            if char == ",":
+                return self._finish_value(self._pos)
+            if char not in WHITESPACE and self._token_start is None:
+                # Start of a number, true/false/null
+                self._token_start = self._pos
+        return None
+
+    def _finish_value(self, end: int):
+        """Close the current top-level value (if any) and return it as a field"""
+        if self._expect != "value" or self._token_start is None or self._key is None:
+            self._expect = "key"
+            self._token_start = None
+            return None
+
+        raw = self.buffer[self._token_start:end].strip()
+        key = self._key
+        self._key = None
+        self._token_start = None
+        self._expect = "key"
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return None
+        self.fields[key] = value
+        return key, value
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -2,10 +2,19 @@
 Pytest configuration for DailyCook Backend Tests
 """
 import pytest
+import pytest_asyncio
 import asyncio
+import json
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -14,3 +23,87 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 @pytest.fixture
 def anyio_backend():
     return 'asyncio'
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """
+    Builds session factories bound to throwaway SQLite databases:
+    `await session_factory(Model, ...)` creates those models' tables and returns the factory
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from sqlmodel import SQLModel
+    
+    engines = []
+    
+    async def build(*models):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'test-{len(engines)}.db'}")
+        engines.append(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all, tables=[model.__table__ for model in models])
+        return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    yield build
+    for engine in engines:
+        await engine.dispose()
+
+
+class JWKSServer:
+    """Local stand-in for a Clerk issuer: serves /.well-known/jwks.json and signs tokens"""
+    
+    def __init__(self):
+        self.keys = {}  # kid -> private key
+        self.requests = 0
+        self.delay = 0.0
+        self.fail = False
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.delay)
+                if server.fail or self.path != "/.well-known/jwks.json":
+                    self.send_response(503 if server.fail else 404)
+                    self.end_headers()
+                    return
+                body = json.dumps({"keys": server.public_jwks()}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.issuer = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def add_key(self, kid: str):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    
+    def public_jwks(self) -> list:
+        return [
+            {**json.loads(RSAAlgorithm.to_jwk(key.public_key())), "kid": kid, "use": "sig", "alg": "RS256"}
+            for kid, key in self.keys.items()
+        ]
+    
+    def token(self, kid: str, issuer: str = None, **claims) -> str:
+        payload = {"iss": issuer or self.issuer, "sub": "user_test", "iat": int(time.time()), "exp": int(time.time()) + 300}
+        return jwt.encode({**payload, **claims}, self.keys[kid], algorithm="RS256", headers={"kid": kid})
+    
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def jwks_server():
+    """A running JWKSServer with one signing key, 'key-1'"""
+    server = JWKSServer()
+    server.add_key("key-1")
+    yield server
+    server.close()
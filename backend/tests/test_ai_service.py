@@ -0,0 +1,1352 @@
+"""
+Test Suite for the AI service layer: execution, caching and fallbacks
+Run: python -m pytest tests/test_ai_service.py -v
+"""
+import pytest
+import pytest_asyncio
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+from models.recipe import Recipe, Nutrition
+from services.generation_cache import GenerationCache, make_generation_key
+
+
+def make_recipe(recipe_id: str = "ai-test", name: str = "Test AI Recipe") -> Recipe:
+    return Recipe(
+        id=recipe_id, name=name, cuisine="Indian", category="food",
+        fitness_tags=[], diet="veg", difficulty="Easy", time_minutes=15,
+        required_ingredients=["onion"], optional_ingredients=[], cookware=[],
+        steps=["Step 1"], common_mistakes=[],
+        nutrition=Nutrition(calories=200, protein_g=10, carbs_g=20, fats_g=5),
+        servings=2
+    )
+
+
+# ============= EXECUTION TESTS =============
+
+class SlowModel:
+    """Stand-in for a blocking Gemini model"""
+    
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+    
+    def generate_content(self, prompt, **kwargs):
+        import time
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        self.active -= 1
+        return MagicMock(text=f'{{"prompt": "{prompt}"}}')
+
+
+class TestAIExecution:
+    """Test that model calls run off the event loop with bounded concurrency"""
+    
+    @pytest.mark.asyncio
+    async def test_generation_does_not_block_event_loop(self):
+        from services.ai_service import run_generation
+        
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.005)
+                ticks += 1
+        
+        _, response = await asyncio.gather(ticker(), run_generation(SlowModel(0.1), "p"))
+        assert ticks == 5
+        assert json.loads(response.text) == {"prompt": "p"}
+    
+    @pytest.mark.asyncio
+    async def test_generation_concurrency_is_bounded(self):
+        from services.ai_service import run_generation, generation_stats, AI_MAX_CONCURRENCY
+        
+        model = SlowModel(0.02)
+        calls_before = generation_stats.calls
+        await asyncio.gather(*[run_generation(model, str(i)) for i in range(AI_MAX_CONCURRENCY * 2)])
+        assert model.peak <= AI_MAX_CONCURRENCY
+        assert generation_stats.calls - calls_before == AI_MAX_CONCURRENCY * 2
+        assert generation_stats.snapshot()["max_queue_wait_ms"] > 0
+
+
+# ============= GENERATION CACHE TESTS =============
+
+@pytest_asyncio.fixture
+async def sql_session_factory(session_factory):
+    """Session factory with the generation cache table in a throwaway database"""
+    from models.generation_cache import GenerationCacheEntry
+    return await session_factory(GenerationCacheEntry)
+
+
+class TestGenerationCache:
+    """Test the two-tier AI generation cache"""
+    
+    def test_key_is_canonical(self):
+        a = make_generation_key("recipe", ingredients=["Onion", "rice", "onion"], diet="Veg", servings=2)
+        b = make_generation_key("recipe", ingredients=["rice", " onion "], diet="veg", servings=2)
+        c = make_generation_key("recipe", ingredients=["rice", "onion"], diet="veg", servings=3)
+        assert a == b
+        assert a != c
+    
+    @pytest.mark.asyncio
+    async def test_memory_hit_and_miss(self):
+        cache = GenerationCache(persistent=False)
+        assert await cache.get("k") is None
+        await cache.put("k", {"name": "x"})
+        assert await cache.get("k") == {"name": "x"}
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        cache = GenerationCache(ttl_seconds=0, persistent=False)
+        await cache.put("k", {"name": "x"})
+        assert await cache.get("k") is None
+    
+    @pytest.mark.asyncio
+    async def test_lru_size_limit(self):
+        cache = GenerationCache(max_entries=2, persistent=False)
+        for key in ["a", "b", "c"]:
+            await cache.put(key, {"name": key})
+        assert await cache.get("a") is None
+        assert await cache.get("c") == {"name": "c"}
+    
+    @pytest.mark.asyncio
+    async def test_variants_fill_before_hitting(self):
+        cache = GenerationCache(max_variants=2, persistent=False)
+        await cache.put("k", {"name": "one"})
+        assert await cache.get("k") is None
+        await cache.put("k", {"name": "two"})
+        assert (await cache.get("k"))["name"] in {"one", "two"}
+    
+    @pytest.mark.asyncio
+    async def test_persistent_tier_survives_memory_loss(self, sql_session_factory):
+        cache = GenerationCache(session_factory=sql_session_factory)
+        await cache.put("k", {"name": "persisted"}, kind="recipe")
+        cache.clear_memory()
+        assert await cache.get("k") == {"name": "persisted"}
+        assert cache.stats["persistent_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_persistent_hit_keeps_stored_expiry(self, sql_session_factory):
+        import time
+        from models.generation_cache import GenerationCacheEntry
+        
+        cache = GenerationCache(ttl_seconds=3600, session_factory=sql_session_factory)
+        await cache.put("k", {"name": "persisted"}, kind="recipe")
+        async with sql_session_factory() as session:
+            (await session.get(GenerationCacheEntry, "k")).expires_at = time.time() + 5
+            await session.commit()
+        
+        # Read back just before its expiry: the memory copy expires with it, not a full TTL later
+        cache.clear_memory()
+        assert await cache.get("k") == {"name": "persisted"}
+        assert cache._memory["k"][0] <= time.time() + 5
+    
+    @pytest.mark.asyncio
+    async def test_generate_recipe_uses_cache(self, monkeypatch):
+        from services import ai_service
+        
+        cache = GenerationCache(persistent=False)
+        monkeypatch.setattr(ai_service, "generation_cache", cache)
+        calls = 0
+        
+        async def fake_generate(*args):
+            nonlocal calls
+            calls += 1
+            return make_recipe()
+        
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", fake_generate)
+        first = await ai_service.generate_recipe_with_ai(["rice", "onion"], diet="veg")
+        second = await ai_service.generate_recipe_with_ai(["Onion", "rice"], diet="veg")
+        assert calls == 1
+        assert first == second
+
+
+# ============= COALESCING TESTS =============
+
+class TestSingleFlight:
+    """Test coalescing of identical concurrent generations"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_call(self):
+        from services.single_flight import SingleFlight
+        
+        flight = SingleFlight()
+        calls = 0
+        
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return "result"
+        
+        results = await asyncio.gather(*[flight.do("k", call) for _ in range(5)])
+        assert results == ["result"] * 5
+        assert calls == 1
+        snapshot = flight.snapshot()
+        assert snapshot["leaders"] == 1 and snapshot["coalesced"] == 4
+        assert snapshot["coalescing_ratio"] == 0.8
+        assert snapshot["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_errors_fan_out_to_all_waiters(self):
+        from services.single_flight import SingleFlight
+        
+        flight = SingleFlight()
+        
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+        
+        results = await asyncio.gather(*[flight.do("k", call) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.stats["errors"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_timeout_fans_out_to_all_waiters(self):
+        from services.single_flight import SingleFlight
+        
+        flight = SingleFlight(timeout=0.01)
+        
+        async def call():
+            await asyncio.sleep(1)
+        
+        results = await asyncio.gather(*[flight.do("k", call) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+        assert flight.stats["timeouts"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        from services.single_flight import SingleFlight
+        
+        flight = SingleFlight()
+        
+        async def call():
+            await asyncio.sleep(0.03)
+            return "done"
+        
+        first = asyncio.create_task(flight.do("k", call))
+        second = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        assert await second == "done"
+    
+    @pytest.mark.asyncio
+    async def test_identical_generations_are_coalesced(self, monkeypatch):
+        from services import ai_service
+        from services.single_flight import SingleFlight
+        
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "generation_flight", SingleFlight())
+        calls = 0
+        
+        async def fake_generate(*args):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return make_recipe()
+        
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", fake_generate)
+        results = await asyncio.gather(*[
+            ai_service.generate_recipe_with_ai(["chicken", "rice", "onion"]) for _ in range(10)
+        ])
+        assert calls == 1
+        assert all(r.id == "ai-test" for r in results)
+
+
+# ============= AI RECIPE STORE TESTS =============
+
+@pytest_asyncio.fixture
+async def recipe_store_session_factory(session_factory):
+    """Session factory with the ai_recipes table in a throwaway database"""
+    from models.ai_recipe import StoredAIRecipe
+    return await session_factory(StoredAIRecipe)
+
+
+class TestAIRecipeStore:
+    """Test the content-addressed store for generated recipes"""
+    
+    def test_ids_are_content_addressed(self):
+        from services.ai_recipe_store import AIRecipeStore
+        
+        store = AIRecipeStore(persistent=False)
+        a = store.remember(make_recipe("ai-chicken-rice-onion", "Chicken Pilaf"))
+        b = store.remember(make_recipe("ai-chicken-rice-onion", "Chicken Fried Rice"))
+        c = store.remember(make_recipe("ai-other-slug", "Chicken Pilaf"))
+        assert a.id != b.id
+        assert a.id == c.id
+        assert a.id.startswith("ai-chicken-pilaf-")
+    
+    def test_memory_is_bounded(self):
+        from services.ai_recipe_store import AIRecipeStore
+        
+        store = AIRecipeStore(max_entries=2, persistent=False)
+        ids = [store.remember(make_recipe(name=f"Dish {i}")).id for i in range(3)]
+        assert store.get_cached(ids[0]) is None
+        assert store.get_cached(ids[2]) is not None
+    
+    @pytest.mark.asyncio
+    async def test_shared_table_serves_other_workers(self, recipe_store_session_factory):
+        from services.ai_recipe_store import AIRecipeStore
+        
+        writer = AIRecipeStore(session_factory=recipe_store_session_factory)
+        reader = AIRecipeStore(session_factory=recipe_store_session_factory)
+        stored = await writer.save(make_recipe())
+        await writer.save(make_recipe())
+        assert writer.stats["deduplicated"] == 1
+        
+        fetched = await reader.get(stored.id)
+        assert fetched == stored
+        assert reader.stats["persistent_hits"] == 1
+        assert await reader.get("ai-missing") is None
+    
+    @pytest.mark.asyncio
+    async def test_repeat_saves_skip_the_writer(self, recipe_store_session_factory):
+        from sqlalchemy import event
+        from services.ai_recipe_store import AIRecipeStore
+        
+        store = AIRecipeStore(session_factory=recipe_store_session_factory, touch_seconds=3600)
+        stored = await store.save(make_recipe())
+        
+        opened = []
+        event.listen(recipe_store_session_factory.kw["bind"].sync_engine, "begin", lambda conn: opened.append(1))
+        for _ in range(3):
+            assert (await store.save(make_recipe())).id == stored.id
+        assert opened == [] and store.stats["deduplicated"] == 3
+        
+        # Past the interval the row's last_seen_at is refreshed again
+        store.touch_seconds = 0
+        await store.save(make_recipe())
+        assert opened and store.stats["deduplicated"] == 4
+
+
+# ============= STREAMING TESTS =============
+
+class ChunkedModel:
+    """Stand-in model that streams a fixed JSON document in small chunks"""
+    
+    def __init__(self, document: str, chunk_size: int = 16):
+        self.document = document
+        self.chunk_size = chunk_size
+    
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if not stream:
+            return MagicMock(text=self.document)
+        return [
+            MagicMock(text=self.document[i:i + self.chunk_size])
+            for i in range(0, len(self.document), self.chunk_size)
+        ]
+
+
+class TestStreaming:
+    """Test incremental parsing and streamed generation"""
+    
+    def test_parser_emits_fields_in_order(self):
+        from services.streaming import IncrementalJSONParser
+        
+        document = "```json\n" + json.dumps({
+            "name": 'Spicy "Rice" {bowl}',
+            "time_minutes": 15,
+            "required_ingredients": ["rice", "onion]"],
+            "nutrition": {"calories": 300, "extra": [1, {"a": 2}]},
+            "steps": ["Boil", "Fry"]
+        }) + "\n```"
+        parser = IncrementalJSONParser()
+        fields = []
+        for i in range(0, len(document), 5):
+            fields.extend(parser.feed(document[i:i + 5]))
+        
+        assert [name for name, _ in fields] == ["name", "time_minutes", "required_ingredients", "nutrition", "steps"]
+        assert fields[0][1] == 'Spicy "Rice" {bowl}'
+        assert parser.complete
+    
+    def test_parser_emits_name_before_document_completes(self):
+        from services.streaming import IncrementalJSONParser
+        
+        parser = IncrementalJSONParser()
+        assert list(parser.feed('{"name": "Quick Dal", "steps": ["Boil')) == [("name", "Quick Dal")]
+        assert not parser.complete
+    
+    @pytest.mark.asyncio
+    async def test_stream_recipe_with_ai(self, monkeypatch):
+        from services import ai_service
+        
+        document = make_recipe().model_dump_json()
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "get_gemini_model", lambda: ChunkedModel(document))
+        
+        events = [e async for e in ai_service.stream_recipe_with_ai(["onion"])]
+        names = [data["name"] for event, data in events if event == "field"]
+        assert names.index("name") < names.index("required_ingredients") < names.index("steps")
+        assert events[-1][0] == "recipe"
+        assert events[-1][1].name == "Test AI Recipe"
+        
+        # Second request replays from the cache
+        cached = [e async for e in ai_service.stream_recipe_with_ai(["onion"])]
+        assert cached[-1][1] == events[-1][1]
+    
+    @pytest.mark.asyncio
+    async def test_fridge_stream_endpoint_falls_back_without_ai(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post("/api/fridge/match/stream", json={"ingredients": "eggs, onion"})
+            assert res.status_code == 200
+            assert res.headers["content-type"].startswith("text/event-stream")
+            events = [line.split(": ", 1)[1] for line in res.text.splitlines() if line.startswith("event: ")]
+            assert events[0] == "field"
+            assert events[-3:] == ["recipe", "matches", "done"]
+    
+    @pytest.mark.asyncio
+    async def test_generate_stream_done_reports_failure(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from services import ai_service
+        
+        async def failing(**kwargs):
+            yield "field", {"name": "name", "value": "Half a Recipe"}
+            yield "error", "model exploded"
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "stream_recipe_with_ai", failing)
+        
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post("/api/ai/generate/stream", json={"ingredients": "rice, onion"})
+        lines = res.text.splitlines()
+        events = [line.split(": ", 1)[1] for line in lines if line.startswith("event: ")]
+        assert events[-2:] == ["error", "done"]
+        assert json.loads([line for line in lines if line.startswith("data: ")][-1].split(": ", 1)[1]) == {"ok": False}
+
+
+# ============= LATENCY BUDGET TESTS =============
+
+class TestLatencyBudget:
+    """Test hedging between the AI recipe and the local fallback"""
+    
+    @pytest.mark.asyncio
+    async def test_generation_within_budget(self):
+        from services.ai_service import run_within_budget
+        
+        async def fast():
+            return "ai"
+        
+        assert await run_within_budget(fast(), 1.0) == (True, "ai")
+    
+    @pytest.mark.asyncio
+    async def test_generation_over_budget_keeps_running(self):
+        from services.ai_service import run_within_budget
+        
+        done = asyncio.Event()
+        async def slow():
+            await asyncio.sleep(0.05)
+            done.set()
+            return "ai"
+        
+        assert await run_within_budget(slow(), 0.01) == (False, None)
+        await asyncio.wait_for(done.wait(), timeout=1)
+    
+    @pytest.mark.asyncio
+    async def test_fridge_match_returns_upgrade_token(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from routes import fridge
+        from services import ai_service
+        from services.single_flight import SingleFlight
+        
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(fridge, "FRIDGE_AI_BUDGET_MS", 20)
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "generation_flight", SingleFlight())
+        
+        async def slow_generate(*args):
+            await asyncio.sleep(0.1)
+            return make_recipe()
+        
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", slow_generate)
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post("/api/fridge/match", json={"ingredients": "eggs, onion", "cuisine": "Indian"})
+            assert res.status_code == 200
+            data = res.json()
+            assert data["ai_generated"] is False
+            assert data["recipes"][0]["id"].startswith("backup-")
+            token = data["pending_ai_upgrade"]
+            assert token
+            
+            poll = await client.get(f"/api/fridge/upgrade/{token}")
+            assert poll.json()["status"] == "pending"
+            
+            await asyncio.sleep(0.15)
+            poll = await client.get(f"/api/fridge/upgrade/{token}")
+            assert poll.json()["status"] == "ready"
+            assert poll.json()["recipe"]["name"] == "Test AI Recipe"
+            
+            # Later identical requests are answered from the cache within budget
+            res = await client.post("/api/fridge/match", json={"ingredients": "eggs, onion", "cuisine": "Indian"})
+            assert res.json()["ai_generated"] is True
+            assert res.json()["pending_ai_upgrade"] is None
+    
+    @pytest.mark.asyncio
+    async def test_fridge_local_stages_run_during_generation(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from routes import fridge
+        from services import ai_service
+        from services.single_flight import SingleFlight
+        
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "generation_flight", SingleFlight())
+        
+        generated = asyncio.Event()
+        results = iter([make_recipe(), None])
+        async def generate(*args):
+            await asyncio.sleep(0.05)
+            generated.set()
+            return next(results)
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", generate)
+        
+        catalog_calls = []
+        match_by_ingredients = fridge.recipe_engine.match_by_ingredients
+        def record_match(*args, **kwargs):
+            catalog_calls.append(generated.is_set())
+            return match_by_ingredients(*args, **kwargs)
+        monkeypatch.setattr(fridge.recipe_engine, "match_by_ingredients", record_match)
+        
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post("/api/fridge/match", json={"ingredients": "eggs, onion", "cuisine": "Indian"})
+            assert res.json()["ai_generated"] is True
+            stages = [part.split(";")[0] for part in res.headers["server-timing"].split(", ")]
+            assert {"similar", "ai", "catalog", "near_miss", "store", "total"} <= set(stages)
+            
+            # The AI failing falls back without matching the catalog again
+            generated.clear()
+            res = await client.post("/api/fridge/match", json={"ingredients": "eggs, tomato", "cuisine": "Indian"})
+            assert res.json()["ai_generated"] is False
+            assert "backup" in res.headers["server-timing"]
+        
+        # Each request matched the catalog once, while the AI was still generating
+        assert catalog_calls == [False, False]
+    
+    @pytest.mark.asyncio
+    async def test_unknown_upgrade_token(self):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.get("/api/fridge/upgrade/not-a-token")).status_code == 404
+            res = await client.get(f"/api/fridge/upgrade/{'0' * 64}")
+            assert res.json() == {"status": "unavailable", "recipe": None,
+                                  "suggested_ingredients": [], "recipe_suggestions": []}
+
+
+# ============= RECOMMENDATION OF THE DAY TESTS =============
+
+@pytest_asyncio.fixture
+async def daily_session_factory(session_factory):
+    """Session factory with the daily_recommendations table in a throwaway database"""
+    from models.daily_recommendation import DailyRecommendation
+    return await session_factory(DailyRecommendation)
+
+
+class TestDailyRecommendations:
+    """Test that each subject is generated once per day and served from memory"""
+    
+    @pytest.mark.asyncio
+    async def test_generated_once_per_day(self):
+        from services.daily_recommendations import DailyRecommendations, today
+        
+        store = DailyRecommendations(persistent=False)
+        days = []
+        
+        async def generate(day):
+            days.append(day)
+            await asyncio.sleep(0.01)
+            return make_recipe().model_dump()
+        
+        picks = await asyncio.gather(*[store.get("fitness", "muscle_gain", generate) for _ in range(5)])
+        await store.get("fitness", "muscle_gain", generate)
+        assert days == [today()]
+        assert all(p.source == "ai" for p in picks)
+        assert store.stats["memory_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_one_generation_across_workers(self, daily_session_factory, monkeypatch):
+        from services import daily_recommendations as daily
+        
+        monkeypatch.setattr(daily, "CLAIM_POLL_SECONDS", 0.01)
+        workers = [daily.DailyRecommendations(session_factory=daily_session_factory) for _ in range(3)]
+        calls = 0
+        
+        async def generate(day):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"id": "ai-lassi", "name": "Mango Lassi"}
+        
+        picks = await asyncio.gather(*[w.get("drink", "traditional", generate) for w in workers])
+        assert calls == 1
+        assert {p.payload["name"] for p in picks} == {"Mango Lassi"}
+        
+        # A restarted worker loads today's pick instead of generating
+        fresh = daily.DailyRecommendations(session_factory=daily_session_factory)
+        assert (await fresh.get("drink", "traditional", generate)).source == "ai"
+        assert calls == 1 and fresh.stats["loaded"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_failure_falls_back_and_retries(self, daily_session_factory):
+        from services.daily_recommendations import DailyRecommendations, catalog_pick, today
+        
+        store = DailyRecommendations(session_factory=daily_session_factory, retry_seconds=0)
+        
+        async def failing(day):
+            return None
+        
+        pick = await store.get("cuisine", "Indian", failing)
+        assert pick.source == "catalog"
+        assert pick.payload == catalog_pick("cuisine", "Indian", today())
+        
+        async def generate(day):
+            return make_recipe().model_dump()
+        
+        # The failed claim was released, so the next request generates
+        assert (await store.get("cuisine", "Indian", generate)).source == "ai"
+    
+    @pytest.mark.asyncio
+    async def test_recommendation_route_serves_pick_of_the_day(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from services import ai_service
+        from services.daily_recommendations import DailyRecommendations
+        
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "daily_recommendations", DailyRecommendations(persistent=False))
+        calls = 0
+        
+        async def fake_generate(goal, diet=None, time_limit=30, day=None):
+            nonlocal calls
+            calls += 1
+            return make_recipe("fitness-test", "Protein Oats")
+        
+        monkeypatch.setattr(ai_service, "generate_fitness_recipe", fake_generate)
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(3):
+                res = await client.get("/api/fitness/recommendation/fat_loss")
+                assert res.status_code == 200
+                assert res.json()["recipe"]["name"] == "Protein Oats"
+        assert calls == 1
+
+
+# ============= BATCHED GENERATION TESTS =============
+
+class ScriptedModel:
+    """Stand-in model that answers each call with the next scripted response"""
+    
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+    
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return MagicMock(text=self.responses.pop(0))
+
+
+class TestBatchedGeneration:
+    """Test N-per-prompt generation with per-element validation and retries"""
+    
+    def test_extract_json_array(self):
+        from services.ai_service import extract_json_array_from_response
+        
+        assert extract_json_array_from_response('```json\n[{"a": 1}, {"b": 2}]\n```') == [{"a": 1}, {"b": 2}]
+        assert extract_json_array_from_response('{"recipes": [{"a": 1}]}') == [{"a": 1}]
+        assert extract_json_array_from_response('Here you go: [{"a": 1}] enjoy') == [{"a": 1}]
+    
+    @pytest.mark.asyncio
+    async def test_only_invalid_elements_are_retried(self, monkeypatch):
+        from services import ai_service
+        
+        good = make_recipe().model_dump()
+        second = make_recipe(name="Second").model_dump()
+        model = ScriptedModel([
+            json.dumps([good, {"name": "missing fields"}, second]),
+            json.dumps(make_recipe(name="Retried").model_dump())
+        ])
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "get_gemini_model", lambda: model)
+        
+        items = [ai_service.fitness_batch_item(goal) for goal in ["fat_loss", "muscle_gain", "maintenance"]]
+        results = await ai_service.generate_batch(items)
+        assert [r.name for r in results] == ["Test AI Recipe", "Retried", "Second"]
+        assert len(model.prompts) == 2
+        assert "### Request 3" in model.prompts[0]
+        assert "muscle gain" in model.prompts[1] and "### Request" not in model.prompts[1]
+        
+        # Results land under the single-request cache keys
+        cached = await ai_service.generate_fitness_recipe("maintenance")
+        assert cached.name == "Second"
+    
+    @pytest.mark.asyncio
+    async def test_warm_recommendations_batches_each_kind(self, monkeypatch):
+        from services import ai_service
+        from services.daily_recommendations import DailyRecommendations
+        
+        drink = {
+            "id": "drink-healthy-1", "name": "Green Smoothie", "category": "healthy", "diet": "veg",
+            "time_minutes": 5, "required_ingredients": ["spinach"], "optional_ingredients": [],
+            "steps": ["Blend"], "serving_size": "250ml", "health_note": "Iron",
+            "nutrition": {"calories": 90, "protein_g": 3, "carbs_g": 15, "fats_g": 1}
+        }
+        model = ScriptedModel([
+            json.dumps([make_recipe().model_dump(), make_recipe(name="Oats").model_dump()]),
+            make_recipe(name="Ramen").model_dump_json(),
+            json.dumps(drink)
+        ])
+        daily = DailyRecommendations(persistent=False)
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "daily_recommendations", daily)
+        monkeypatch.setattr(ai_service, "get_gemini_model", lambda: model)
+        
+        await ai_service.warm_recommendations_of_day(["fat_loss", "muscle_gain"], ["Japanese"], ["healthy"])
+        assert len(model.prompts) == 3  # one call per kind
+        assert daily.stats["generated"] == 4
+        
+        pick = await ai_service.get_drink_recommendation_of_day("healthy")
+        assert pick["drink"]["name"] == "Green Smoothie"
+        assert len(model.prompts) == 3
+
+
+# ============= STRUCTURED OUTPUT TESTS =============
+
+class TestStructuredOutput:
+    """Test schema-constrained JSON generation"""
+    
+    def test_schema_matches_recipe_model(self):
+        from services.response_schema import FRIDGE_RECIPE_SCHEMA, RECIPE_SCHEMA
+        
+        required = {name for name, field in Recipe.model_fields.items() if field.is_required()} - {"id"}
+        assert set(RECIPE_SCHEMA["required"]) == required
+        assert "id" not in RECIPE_SCHEMA["properties"]
+        assert RECIPE_SCHEMA["properties"]["nutrition"]["properties"]["protein_g"] == {"type": "integer"}
+        assert FRIDGE_RECIPE_SCHEMA["properties"]["recipe_suggestions"]["items"]["type"] == "object"
+    
+    def test_extract_json_skips_preamble(self):
+        from services.ai_service import extract_json_from_response
+        
+        text = 'Sure! {not json} here it is:\n```json\n{"name": "Dal", "steps": ["Boil {water}"]}\n```'
+        assert extract_json_from_response(text) == {"name": "Dal", "steps": ["Boil {water}"]}
+    
+    @pytest.mark.asyncio
+    async def test_generation_requests_json_mode(self, monkeypatch):
+        from services import ai_service
+        
+        data = make_recipe().model_dump(exclude={"id"})
+        model = ScriptedModel([json.dumps(data)])
+        calls = []
+        original = model.generate_content
+        model.generate_content = lambda prompt, **kwargs: calls.append(kwargs) or original(prompt, **kwargs)
+        monkeypatch.setattr(ai_service, "get_gemini_model", lambda: model)
+        
+        recipe = await ai_service._generate_fitness_uncached("fat_loss", None, 30)
+        assert recipe.id.startswith("fitness-fat_loss-")
+        assert calls[0]["generation_config"]["response_mime_type"] == "application/json"
+    
+    @pytest.mark.asyncio
+    async def test_token_usage_is_recorded(self):
+        from services.ai_service import run_generation, generation_stats
+        
+        class MeteredModel:
+            def generate_content(self, prompt, **kwargs):
+                return MagicMock(text="{}", usage_metadata=MagicMock(prompt_token_count=120, candidates_token_count=300))
+        
+        before = generation_stats.output_tokens
+        await run_generation(MeteredModel(), "p")
+        assert generation_stats.output_tokens - before == 300
+        assert generation_stats.snapshot()["avg_prompt_tokens"] > 0
+
+
+# ============= CIRCUIT BREAKER TESTS =============
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class QuotaModel:
+    """Stand-in model that is always rate-limited"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def generate_content(self, prompt, **kwargs):
+        from google.api_core.exceptions import ResourceExhausted
+        self.calls += 1
+        raise ResourceExhausted("Quota exceeded. Please retry in 42.5s")
+
+
+class TestCircuitBreaker:
+    """Test failing fast while the AI provider is down or rate-limiting"""
+    
+    def test_error_rate_opens_then_probe_closes(self):
+        from services.circuit_breaker import CircuitBreaker
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", min_calls=4, error_rate=0.5, open_seconds=10, clock=clock)
+        breaker.record_success(100)
+        breaker.record_success(100)
+        breaker.record_failure(100)
+        assert breaker.state == "closed"
+        breaker.record_failure(100)
+        assert breaker.state == "open"
+        assert not breaker.allow()
+        
+        clock.now += 12
+        assert breaker.allow()  # the probe
+        assert not breaker.allow()  # only one at a time
+        breaker.record_success(100)
+        assert breaker.state == "closed"
+        assert breaker.allow()
+    
+    def test_failed_probes_back_off_exponentially(self):
+        from services.circuit_breaker import CircuitBreaker
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", min_calls=1, open_seconds=10, max_open_seconds=25, clock=clock)
+        breaker.record_failure(100)
+        periods = []
+        for _ in range(3):
+            periods.append(breaker.snapshot()["open_for_seconds"])
+            clock.now += 30
+            assert breaker.allow()
+            breaker.record_failure(100)
+        assert 9 <= periods[0] <= 11
+        assert 18 <= periods[1] <= 22
+        assert periods[2] == pytest.approx(25, rel=0.1)  # capped
+    
+    def test_slow_calls_open_the_circuit(self):
+        from services.circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker("test", min_calls=3, slow_call_ms=1000, slow_rate=0.6, clock=FakeClock())
+        for _ in range(3):
+            breaker.record_success(5000)
+        assert breaker.state == "open"
+        assert breaker.last_reason.startswith("slow calls")
+    
+    def test_outcomes_outside_window_are_forgotten(self):
+        from services.circuit_breaker import CircuitBreaker
+        
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", window_seconds=60, min_calls=3, error_rate=0.5, clock=clock)
+        breaker.record_failure(100)
+        breaker.record_failure(100)
+        clock.now += 120
+        breaker.record_failure(100)
+        assert breaker.state == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_quota_error_opens_and_calls_fail_fast(self, monkeypatch):
+        from services import ai_service
+        from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+        
+        breaker = CircuitBreaker("Gemini", open_seconds=5)
+        monkeypatch.setattr(ai_service, "ai_breaker", breaker)
+        model = QuotaModel()
+        
+        with pytest.raises(Exception):
+            await ai_service.run_generation(model, "p")
+        assert breaker.state == "open"
+        assert breaker.retry_in() > 40  # honours the provider's retry delay
+        
+        with pytest.raises(CircuitOpenError):
+            await ai_service.run_generation(model, "p")
+        assert model.calls == 1
+        assert breaker.snapshot()["rejected"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_serves_local_fallback(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from services import ai_service
+        from services.circuit_breaker import CircuitBreaker
+        
+        breaker = CircuitBreaker("Gemini", min_calls=1)
+        breaker.record_failure(100)
+        model = QuotaModel()
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "ai_breaker", breaker)
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "get_gemini_model", lambda: model)
+        
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post("/api/fridge/match", json={"ingredients": "eggs, onion", "cuisine": "Indian"})
+            assert res.status_code == 200
+            assert res.json()["ai_generated"] is False
+            assert res.json()["recipes"][0]["id"].startswith("backup-")
+            assert model.calls == 0
+            
+            status = (await client.get("/api/ai/status")).json()
+            assert status["circuit"]["state"] == "open"
+
+
+# ============= OFFLINE MODEL TESTS =============
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """Route get_gemini_model to a zero-latency FakeModel"""
+    from services import ai_service, fake_model
+    from services.circuit_breaker import CircuitBreaker
+    
+    model = fake_model.FakeModel(latency_ms="0", chunk_ms=0, chunk_chars=40, recordings_path=None, seed=1)
+    monkeypatch.setattr(ai_service, "AI_PROVIDER", "fake")
+    monkeypatch.setattr(fake_model, "_fake_model", model)
+    monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+    monkeypatch.setattr(ai_service, "ai_breaker", CircuitBreaker("Gemini"))
+    return model
+
+
+class TestFakeModel:
+    """Test the offline stand-in used for load tests and benchmarks"""
+    
+    @pytest.mark.asyncio
+    async def test_synthesizes_valid_generations(self, fake_provider):
+        from services import ai_service
+        
+        recipe = await ai_service.generate_recipe_with_ai(["paneer", "spinach"], diet="veg", cuisine="Indian")
+        assert recipe.required_ingredients == ["paneer", "spinach"]
+        assert recipe.cuisine == "Indian"
+        
+        cuisine = await ai_service.generate_cuisine_recipe("Japanese")
+        assert cuisine.cuisine == "Japanese"
+        drink = await ai_service.generate_drink_recipe("energy")
+        assert drink["category"] == "energy"
+        
+        items = [ai_service.fitness_batch_item(goal) for goal in ["fat_loss", "muscle_gain", "maintenance"]]
+        assert all(r is not None for r in await ai_service.generate_batch(items))
+        assert fake_provider.stats["synthesized"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_streams_in_chunks(self, fake_provider):
+        from services import ai_service
+        
+        events = [event async for event in ai_service.stream_recipe_with_ai(["eggs", "onion"])]
+        kinds = [kind for kind, _ in events]
+        assert kinds.count("field") > 5
+        assert kinds[-1] == "recipe"
+    
+    @pytest.mark.asyncio
+    async def test_records_and_replays(self, tmp_path, fake_provider):
+        from services import ai_service
+        from services.fake_model import FakeModel, RecordingModel
+        
+        path = str(tmp_path / "recordings.jsonl")
+        live = RecordingModel(ScriptedModel([make_recipe(name="Recorded Dal").model_dump_json()]), path)
+        prompt, _ = ai_service._fitness_prompt("fat_loss", None, 30)
+        await ai_service.run_generation(live, prompt)
+        
+        replay = FakeModel(latency_ms="0", chunk_ms=0, recordings_path=path)
+        response = await ai_service.run_generation(replay, prompt)
+        assert json.loads(response.text)["name"] == "Recorded Dal"
+        assert replay.stats["replayed"] == 1
+    
+    def test_injected_errors_and_latency(self):
+        import time
+        from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+        from services.fake_model import FakeModel, parse_latency
+        
+        with pytest.raises(ServiceUnavailable):
+            FakeModel(latency_ms="0", error_rate=1.0).generate_content("p")
+        with pytest.raises(ResourceExhausted):
+            FakeModel(latency_ms="0", quota_rate=1.0).generate_content("p")
+        with pytest.raises(ServiceUnavailable):
+            list(FakeModel(latency_ms="0", chunk_ms=0, chunk_chars=5, stream_break_rate=1.0).generate_content("p", stream=True))
+        
+        started = time.perf_counter()
+        FakeModel(latency_ms="50", chunk_ms=0).generate_content("p")
+        assert time.perf_counter() - started >= 0.05
+        
+        import random
+        samples = [parse_latency("lognormal:100:0.5")(random.Random(n)) for n in range(200)]
+        assert 70 < sorted(samples)[100] < 140  # median
+
+
+# ============= NEAR-DUPLICATE CACHE TESTS =============
+
+class TestSimilarFridges:
+    """Test reusing fridge generations for nearly identical ingredient sets"""
+    
+    def test_lsh_finds_near_duplicates_in_partition(self):
+        from services.similarity_index import MinHashLSH
+        
+        index = MinHashLSH(threshold=0.75)
+        index.add("a", ["eggs", "onion", "tomato", "rice", "spinach"], "veg|2")
+        index.add("b", ["chicken", "garlic", "ginger", "soy sauce"], "veg|2")
+        
+        [match] = index.query(["eggs", "onion", "tomato", "rice", "spinach", "peas"], "veg|2")
+        assert match.key == "a" and match.similarity == pytest.approx(5 / 6)
+        assert index.query(["eggs", "onion", "tomato", "rice", "spinach"], "non-veg|2") == []
+        assert index.query(["eggs", "onion", "peas"], "veg|2") == []
+    
+    def test_lsh_eviction_clears_buckets(self):
+        from services.similarity_index import MinHashLSH
+        
+        index = MinHashLSH(max_entries=2)
+        for n in range(3):
+            index.add(f"k{n}", [f"item{n}", "shared", "common", "base"])
+        assert len(index) == 2 and "k0" not in index
+        assert index.query(["item0", "shared", "common", "base"]) == []
+        assert index.stats["evictions"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_fridge_match_reuses_similar_generation(self, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from services import ai_service
+        from services.similarity_index import MinHashLSH
+        
+        calls = []
+        async def generate(ingredients, *args):
+            calls.append(ingredients)
+            return make_recipe(name="Spinach Egg Fried Rice")
+        
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "fridge_index", MinHashLSH(threshold=0.75))
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", generate)
+        
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            async def match(ingredients, diet="veg"):
+                res = await client.post("/api/fridge/match", json={
+                    "ingredients": ingredients, "cuisine": "Indian", "diet": diet
+                })
+                return res.json()
+            
+            first = await match("eggs, onion, tomato, rice, spinach")
+            assert first["ai_generated"] is True and first["similar_match"] is None
+            
+            # Differs by a pantry staple, an extra item and a missing item respectively
+            assert (await match("eggs, onion, tomato, rice, spinach, salt"))["similar_match"]["similarity"] == 1.0
+            extra = await match("eggs, onion, tomato, rice, spinach, peas")
+            assert extra["similar_match"]["unused_ingredients"] == ["peas"]
+            fewer = await match("eggs, onion, tomato, rice")
+            assert fewer["similar_match"]["missing_ingredients"] == ["spinach"]
+            assert fewer["recipes"][0]["name"] == "Spinach Egg Fried Rice"
+            assert len(calls) == 1
+            
+            # Too different, or a different diet: generated afresh
+            assert (await match("eggs, onion, peas"))["similar_match"] is None
+            assert (await match("eggs, onion, tomato, rice", diet="non-veg"))["similar_match"] is None
+            assert len(calls) == 3
+
+
+@pytest_asyncio.fixture
+async def job_session_factory(session_factory):
+    """Session factory with the ai_jobs table in a throwaway database"""
+    from models.ai_job import AIJob
+    return await session_factory(AIJob)
+
+
+class TestJobQueue:
+    """Test the durable AI job queue: dedup, fair claiming, recovery and the HTTP API"""
+    
+    @staticmethod
+    def make_queue(session_factory, **kwargs):
+        from services.job_queue import JobQueue
+        
+        queue = JobQueue(session_factory=session_factory, **kwargs)
+        
+        async def echo(params):
+            return {"echo": params["n"]}
+        queue.register("echo", echo)
+        return queue
+    
+    @pytest.mark.asyncio
+    async def test_submit_deduplicates_active_jobs(self, job_session_factory):
+        from services.job_queue import QueueFullError
+        
+        queue = self.make_queue(job_session_factory, max_queued_per_owner=2)
+        first, dup = await queue.submit("echo", "k1", {"n": 1}, "user:1")
+        assert dup is False
+        again, dup = await queue.submit("echo", "k1", {"n": 1}, "user:2")
+        assert dup is True and again.id == first.id
+        
+        await queue.submit("echo", "k2", {"n": 2}, "user:1")
+        with pytest.raises(QueueFullError):
+            await queue.submit("echo", "k3", {"n": 3}, "user:1")
+        with pytest.raises(ValueError):
+            await queue.submit("unknown", "k4", {}, "user:1")
+        assert queue.stats["deduplicated"] == 1 and queue.stats["rejected"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_submits_share_one_job(self, job_session_factory):
+        from sqlalchemy.exc import IntegrityError
+        from models.ai_job import AIJob
+        
+        # Separate queues stand in for separate web processes
+        queues = [self.make_queue(job_session_factory) for _ in range(5)]
+        submitted = await asyncio.gather(*[q.submit("echo", "k1", {"n": 1}, f"user:{n}") for n, q in enumerate(queues)])
+        assert len({job.id for job, _ in submitted}) == 1
+        assert [dup for _, dup in submitted].count(False) == 1
+        
+        # The schema itself refuses a second active job for the key
+        async with job_session_factory() as session:
+            session.add(AIJob(id="x" * 32, kind="echo", key="k1", owner="user:9", params="{}"))
+            with pytest.raises(IntegrityError):
+                await session.commit()
+    
+    @pytest.mark.asyncio
+    async def test_claims_by_priority_then_fair_across_owners(self, job_session_factory):
+        queue = self.make_queue(job_session_factory)
+        for n, (owner, priority) in enumerate([("a", 0), ("a", 0), ("a", 0), ("b", 0), ("c", 1)]):
+            await queue.submit("echo", f"k{n}", {"n": n}, owner, priority)
+        
+        # Claimed jobs finish before the next claim, so only last-served order separates owners
+        claimed = []
+        while (job := await queue._claim_next("w")) is not None:
+            claimed.append(job)
+            await queue._execute(job, "w")
+        assert [job.owner for job in claimed] == ["c", "a", "b", "a", "a"]
+        
+        done = await queue.get(claimed[-1].id)
+        assert done.status == "done" and done.get_result() == {"echo": 2} and done.attempts == 1
+    
+    @pytest.mark.asyncio
+    async def test_sweep_requeues_then_fails_abandoned_jobs(self, job_session_factory, monkeypatch):
+        from services import job_queue as jq
+        
+        queue = self.make_queue(job_session_factory, job_timeout=10, max_attempts=2)
+        job, _ = await queue.submit("echo", "k1", {"n": 1}, "a")
+        
+        clock = [1000.0]
+        monkeypatch.setattr(jq.time, "time", lambda: clock[0])
+        await queue._claim_next("dead-worker")
+        clock[0] += 11
+        await queue._sweep()
+        assert (await queue.get(job.id)).status == "queued" and queue.stats["requeued"] == 1
+        
+        await queue._claim_next("dead-worker")
+        clock[0] += 11
+        await queue._sweep()
+        failed = await queue.get(job.id)
+        assert failed.status == "failed" and failed.attempts == 2
+        
+        # Finished jobs are dropped after the retention period
+        clock[0] += queue.retention_seconds + 1
+        await queue._sweep()
+        assert await queue.get(job.id) is None
+    
+    @pytest.mark.asyncio
+    async def test_requeued_job_keeps_new_workers_result(self, job_session_factory):
+        queue = self.make_queue(job_session_factory, job_timeout=10)
+        job, _ = await queue.submit("echo", "k1", {"n": 1}, "a")
+        slow = await queue._claim_next("slow-worker")
+        
+        # The sweep requeues the job and another worker claims it before the first one finishes
+        async with job_session_factory() as session:
+            (await session.get(type(slow), job.id)).started_at -= 11
+            await session.commit()
+        await queue._sweep()
+        fresh = await queue._claim_next("fresh-worker")
+        
+        await queue._execute(slow, "slow-worker")
+        running = await queue.get(job.id)
+        assert running.status == "running" and running.worker == "fresh-worker"
+        assert queue.stats["lost_claims"] == 1 and queue.stats["completed"] == 0
+        
+        await queue._execute(fresh, "fresh-worker")
+        assert (await queue.get(job.id)).status == "done" and queue.stats["completed"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_handler_failures_are_recorded(self, job_session_factory):
+        queue = self.make_queue(job_session_factory, job_timeout=0.05)
+        
+        async def broken(params):
+            raise RuntimeError("model exploded")
+        async def hangs(params):
+            await asyncio.sleep(1)
+        queue.register("broken", broken)
+        queue.register("hangs", hangs)
+        
+        errors = []
+        for kind in ("broken", "hangs"):
+            job, _ = await queue.submit(kind, kind, {}, "a")
+            await queue._execute(await queue._claim_next("w"), "w")
+            failed = await queue.get(job.id)
+            assert failed.status == "failed"
+            errors.append(failed.error)
+        assert errors == ["model exploded", "Timed out after 0s"]
+        assert queue.stats["failed"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_fridge_job_submit_poll_and_stream(self, job_session_factory, monkeypatch):
+        from httpx import AsyncClient, ASGITransport
+        from main import app
+        from routes import jobs
+        from services import ai_service
+        from services.job_queue import JobQueue
+        from services.similarity_index import MinHashLSH
+        
+        release = asyncio.Event()
+        calls = 0
+        async def generate(*args):
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return make_recipe(name="Queued Tomato Rice")
+        
+        queue = JobQueue(session_factory=job_session_factory, workers=1)
+        queue.register("fridge", jobs.run_fridge_job)
+        monkeypatch.setattr(jobs, "job_queue", queue)
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "fridge_index", MinHashLSH(threshold=0.75))
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", generate)
+        
+        queue.start()
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                body = {"ingredients": "tomato, rice, onion", "cuisine": "Indian", "diet": "veg"}
+                res = await client.post("/api/jobs/fridge", json=body)
+                assert res.status_code == 202
+                submitted = res.json()
+                assert res.headers["location"] == submitted["poll_url"]
+                
+                # The same fridge submitted again joins the job
+                again = (await client.post("/api/jobs/fridge", json=body)).json()
+                assert again["id"] == submitted["id"] and again["deduplicated"] is True
+                
+                async def read_stream():
+                    res = await client.get(submitted["stream_url"])
+                    return [line.split(": ", 1)[1] for line in res.text.splitlines() if line.startswith("event: ")]
+                stream = asyncio.create_task(read_stream())
+                
+                while (await client.get(submitted["poll_url"])).json()["status"] != "running":
+                    await asyncio.sleep(0.01)
+                release.set()
+                events = await asyncio.wait_for(stream, timeout=5)
+                assert events[-2:] == ["result", "done"] and "status" in events
+                
+                job = (await client.get(submitted["poll_url"])).json()
+                assert job["status"] == "done" and job["attempts"] == 1
+                assert job["result"]["ai_generated"] is True
+                assert job["result"]["recipes"][0]["name"] == "Queued Tomato Rice"
+                assert calls == 1
+                
+                # Without a cuisine the job's cuisine follows the ingredients, so repeats still join
+                anywhere = {"ingredients": "rice, onion, peas", "diet": "veg"}
+                first = (await client.post("/api/jobs/fridge", json=anywhere)).json()
+                second = (await client.post("/api/jobs/fridge", json=anywhere)).json()
+                assert second["id"] == first["id"] and second["deduplicated"] is True
+                
+                assert (await client.get("/api/jobs/missing")).status_code == 404
+                assert (await client.post("/api/jobs/fridge", json={"ingredients": " "})).status_code == 400
+        finally:
+            await queue.stop()
+
+
+# ============= NUTRITION TESTS =============
+
+def make_cooked_recipe(nutrition: Nutrition, ingredients=None) -> Recipe:
+    """Recipe with quantities the nutrition table understands"""
+    recipe = make_recipe(name="Chicken Rice Bowl")
+    return recipe.model_copy(update={
+        "required_ingredients": ingredients or ["200g chicken breast", "1 cup basmati rice", "1 tbsp olive oil", "Salt to taste"],
+        "nutrition": nutrition
+    })
+
+
+class TestNutrition:
+    """Test computing nutrition from ingredient quantities"""
+    
+    def test_parse_quantities(self):
+        from services.nutrition import nutrition_table
+        
+        def parsed(line):
+            p = nutrition_table.parse(line)
+            return nutrition_table.names[p.row] if p.row is not None else None, p.grams
+        
+        assert parsed("200g chicken breast") == ("chicken breast", 200)
+        assert parsed("Chicken breast (200 g)") == ("chicken breast", 200)
+        assert parsed("2 large eggs") == ("eggs", 100)
+        assert parsed("1 1/2 cups basmati rice") == ("basmati rice", pytest.approx(277.5))
+        assert parsed("½ tsp turmeric") == ("turmeric", 2.5)
+        assert parsed("3 cloves garlic") == ("garlic", 15)
+        assert parsed("2-3 tomatoes, chopped") == ("tomato", 300)
+        assert parsed("dragonfruit") == (None, None)
+    
+    def test_batch_matches_single_estimates(self, monkeypatch):
+        from services.nutrition import nutrition_table
+        
+        recipes = [
+            make_cooked_recipe(Nutrition(calories=0, protein_g=0, carbs_g=0, fats_g=0)),
+            make_cooked_recipe(Nutrition(calories=0, protein_g=0, carbs_g=0, fats_g=0), ["3 eggs", "1 onion", "2 tbsp butter"])
+        ]
+        batch = nutrition_table.estimate_batch(recipes)
+        assert batch == [nutrition_table.estimate(r) for r in recipes]
+        # (330 + 224 + 133) kcal for two servings
+        assert batch[0].nutrition.calories == 343 and batch[0].coverage == 1.0
+        
+        # Same numbers without numpy
+        monkeypatch.setattr(nutrition_table, "matrix", None)
+        assert nutrition_table.estimate_batch(recipes) == batch
+    
+    def test_repair_replaces_implausible_nutrition(self):
+        from services.nutrition import nutrition_table
+        
+        wrong = make_cooked_recipe(Nutrition(calories=1200, protein_g=5, carbs_g=10, fats_g=60))
+        close = make_cooked_recipe(Nutrition(calories=360, protein_g=35, carbs_g=26, fats_g=10))
+        unknown = make_recipe()  # no quantities to check against
+        
+        repaired = nutrition_table.repair_batch([wrong, close, unknown])
+        assert repaired[0].nutrition == nutrition_table.estimate(wrong).nutrition
+        assert repaired[0].nutrition.calories == 343
+        assert repaired[1] is close and repaired[2] is unknown
+    
+    def test_rescale_quantities(self):
+        from services.nutrition import nutrition_table
+        
+        recipe = make_cooked_recipe(Nutrition(calories=343, protein_g=34, carbs_g=23, fats_g=11))
+        scaled = nutrition_table.rescale(recipe, 3)
+        assert scaled.servings == 3
+        assert scaled.required_ingredients == [
+            "300g chicken breast", "1 1/2 cup basmati rice", "1 1/2 tbsp olive oil", "Salt to taste"
+        ]
+        assert scaled.nutrition == recipe.nutrition
+        assert nutrition_table.estimate(scaled).nutrition == nutrition_table.estimate(recipe).nutrition
+    
+    @pytest.mark.asyncio
+    async def test_other_servings_are_rescaled_without_model_call(self, monkeypatch):
+        from services import ai_service
+        from services.similarity_index import MinHashLSH
+        
+        calls = []
+        async def generate(ingredients, diet, cuisine, goal, servings, serving_size):
+            calls.append(servings)
+            return make_cooked_recipe(Nutrition(calories=343, protein_g=34, carbs_g=23, fats_g=11))
+        
+        monkeypatch.setattr(ai_service, "generation_cache", GenerationCache(persistent=False))
+        monkeypatch.setattr(ai_service, "fridge_index", MinHashLSH(threshold=0.75))
+        monkeypatch.setattr(ai_service, "_generate_recipe_uncached", generate)
+        
+        ingredients = ["chicken breast", "basmati rice"]
+        await ai_service.generate_recipe_with_ai(ingredients, "non-veg", "Indian", servings=2)
+        four = await ai_service.generate_recipe_with_ai(ingredients, "non-veg", "Indian", servings=4)
+        assert calls == [2]
+        assert four.servings == 4 and four.required_ingredients[0] == "400g chicken breast"
+        
+        # A different portion size is a different recipe
+        await ai_service.generate_recipe_with_ai(ingredients, "non-veg", "Indian", servings=4, serving_size=300)
+        assert calls == [2, 4]
@@ -10,6 +10,7 @@ import json
 from main import app
 from services.normalizer import normalizer
 from services.recipe_engine import recipe_engine
+from services.catalog import catalog, RecipeCatalog
 from models.recipe import Recipe, RecipeCard, Nutrition, Drink
 
 
@@ -132,20 +133,391 @@ class TestRecipeEngine:
         assert isinstance(card, RecipeCard)
     
     def test_ai_recipes_cache(self):
-        mock_id = "ai-test-cache-recipe"
+        from services.ai_recipe_store import ai_recipe_store
         mock_recipe = Recipe(
-            id=mock_id, name="Test AI Recipe", cuisine="Indian", category="food",
+            id="ai-test-cache-recipe", name="Test AI Recipe", cuisine="Indian", category="food",
             fitness_tags=[], diet="veg", difficulty="Easy", time_minutes=15,
             required_ingredients=["test1"], optional_ingredients=[], cookware=[],
             steps=["Step 1"], common_mistakes=[],
             nutrition=Nutrition(calories=200, protein_g=10, carbs_g=20, fats_g=5),
             servings=2
         )
-        recipe_engine._ai_recipes[mock_id] = mock_recipe
-        result = recipe_engine.get_recipe_detail(mock_id)
+        stored = ai_recipe_store.remember(mock_recipe)
+        result = recipe_engine.get_recipe_detail(stored.id)
         assert result is not None
-        if mock_id in recipe_engine._ai_recipes:
-            del recipe_engine._ai_recipes[mock_id]
+        assert result.name == "Test AI Recipe"
+        ai_recipe_store.forget(stored.id)
+
+
+# ============= CATALOG TESTS =============
+
+class TestRecipeCatalog:
+    """Test the shared single-parse catalog"""
+    
+    def test_engine_and_normalizer_share_catalog(self):
+        assert recipe_engine.recipes is catalog.recipes
+        assert normalizer.aliases is catalog.alias_to_canonical
+    
+    def test_catalog_views_are_read_only(self):
+        with pytest.raises(TypeError):
+            catalog.recipes[0]["name"] = "changed"
+        with pytest.raises(TypeError):
+            catalog.recipe_by_id["new-id"] = {}
+    
+    def test_catalog_indexes(self):
+        first = catalog.recipes[0]
+        assert catalog.recipe_by_id[first["id"]] is first
+        assert first in catalog.recipes_by_cuisine[first["cuisine"].lower()]
+        assert catalog.alias_to_canonical["pyaz"] == "onion"
+        # Ingredient index uses canonical names, so plural spellings land with the singular
+        with_tomatoes = next(r for r in catalog.recipes if "tomatoes" in r["required_ingredients"])
+        assert with_tomatoes in catalog.recipes_by_ingredient["tomato"]
+    
+    def test_catalog_load_timings(self):
+        for phase in ["read_ms", "parse_ms", "validate_ms", "index_ms", "total_ms"]:
+            assert phase in catalog.load_timings
+    
+    def test_catalog_skips_invalid_entries(self, tmp_path):
+        data_file = tmp_path / "recipes.json"
+        valid = dict(catalog.recipes[0])
+        data_file.write_text(json.dumps({
+            "recipes": [valid, {"id": "broken", "name": "No nutrition"}],
+            "drinks": [],
+            "ingredient_aliases": {}
+        }))
+        loaded = RecipeCatalog(data_file)
+        assert len(loaded.recipes) == 1
+        assert loaded.skipped and loaded.skipped[0].startswith("broken")
+
+
+
+# ============= DATABASE TESTS =============
+
+class TestDatabaseProfiles:
+    """Test the engine profiles in database.py"""
+    
+    @pytest.mark.asyncio
+    async def test_sqlite_profile_pragmas(self, tmp_path):
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+        from database import create_engines
+        
+        writer, reader = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}", "sqlite")
+        try:
+            async with writer.begin() as conn:
+                assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+                assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+                assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() > 0
+                await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            async with reader.connect() as conn:
+                assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 0
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("INSERT INTO t VALUES (1)"))
+        finally:
+            await writer.dispose()
+            await reader.dispose()
+    
+    @pytest.mark.asyncio
+    async def test_writes_are_serialized(self, tmp_path):
+        import asyncio
+        from sqlalchemy import text
+        from database import create_engines
+        
+        writer, reader = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'writes.db'}", "sqlite")
+        try:
+            async with writer.begin() as conn:
+                await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            
+            async def write(n):
+                async with writer.begin() as conn:
+                    await conn.execute(text("INSERT INTO t VALUES (:n)"), {"n": n})
+                    await asyncio.sleep(0.01)  # hold the transaction open
+            
+            async def read():
+                async with reader.connect() as conn:
+                    return (await conn.execute(text("SELECT count(*) FROM t"))).scalar()
+            
+            results = await asyncio.gather(*[write(n) for n in range(20)], *[read() for _ in range(20)])
+            assert all(isinstance(count, int) for count in results[20:])
+            assert await read() == 20
+            assert writer.pool.size() == 1
+        finally:
+            await writer.dispose()
+            await reader.dispose()
+    
+    def test_services_read_from_the_read_pool(self):
+        import database
+        from services.ai_recipe_store import AIRecipeStore
+        from services.daily_recommendations import DailyRecommendations
+        from services.generation_cache import GenerationCache
+        from services.job_queue import JobQueue
+        
+        for service in (AIRecipeStore(), DailyRecommendations(), GenerationCache(), JobQueue()):
+            assert service._get_read_session_factory() is database.read_session
+            assert service._get_session_factory() is database.async_session
+        
+        # A factory passed in serves both
+        own = object()
+        assert JobQueue(session_factory=own)._get_read_session_factory() is own
+    
+    def test_profile_selection(self):
+        from database import create_engines, default_profile
+        
+        assert default_profile("sqlite+aiosqlite:///./dailycook.db") == "sqlite"
+        assert default_profile("sqlite+aiosqlite:///:memory:") == "default"
+        assert default_profile("postgresql+asyncpg://db/app") == "default"
+        writer, reader = create_engines("sqlite+aiosqlite:///:memory:")
+        assert writer is reader
+        with pytest.raises(ValueError):
+            create_engines("sqlite+aiosqlite:///x.db", "fastest")
+
+
+class TestMigrations:
+    """Test the versioned migrations in migrations.py"""
+    
+    @pytest.mark.asyncio
+    async def test_old_database_is_migrated_once(self, tmp_path):
+        from sqlalchemy import inspect
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel import SQLModel
+        from migrations import MIGRATIONS, run_migrations
+        
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            # favorites as created before the unique index, with a duplicate saved by a race
+            await conn.exec_driver_sql(
+                "CREATE TABLE favorites (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, recipe_id VARCHAR NOT NULL, "
+                "recipe_name VARCHAR NOT NULL, recipe_type VARCHAR NOT NULL, created_at DATETIME NOT NULL)"
+            )
+            await conn.exec_driver_sql("CREATE INDEX ix_favorites_user_id ON favorites (user_id)")
+            await conn.exec_driver_sql(
+                "INSERT INTO favorites (user_id, recipe_id, recipe_name, recipe_type, created_at) VALUES "
+                "(1, 'dal', 'Dal', 'recipe', '2025-01-01'), (1, 'dal', 'Dal', 'recipe', '2025-01-02'), "
+                "(2, 'dal', 'Dal', 'recipe', '2025-01-03')"
+            )
+            await conn.run_sync(SQLModel.metadata.create_all)
+            applied = await conn.run_sync(run_migrations)
+            assert applied == [name for _, name, _ in MIGRATIONS]
+            assert await conn.run_sync(run_migrations) == []
+            
+            indexes = await conn.run_sync(lambda c: {i["name"]: i["unique"] for i in inspect(c).get_indexes("favorites")})
+            ids = (await conn.exec_driver_sql("SELECT id FROM favorites ORDER BY id")).scalars().all()
+        await engine.dispose()
+        assert indexes["ix_favorites_user_recipe"] and "ix_favorites_user_id" not in indexes
+        assert ids == [1, 3]
+    
+    @pytest.mark.asyncio
+    async def test_active_job_duplicates_are_failed(self, tmp_path):
+        from sqlalchemy import inspect
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel import SQLModel
+        from migrations import run_migrations
+        
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            # ai_jobs as created before the partial unique index, with a key queued twice
+            await conn.exec_driver_sql(
+                "CREATE TABLE ai_jobs (id VARCHAR(32) PRIMARY KEY, kind VARCHAR NOT NULL, key VARCHAR(64) NOT NULL, "
+                "owner VARCHAR NOT NULL, priority INTEGER NOT NULL, params VARCHAR NOT NULL, result VARCHAR, error VARCHAR, "
+                "status VARCHAR NOT NULL, attempts INTEGER NOT NULL, worker VARCHAR, created_at FLOAT NOT NULL, "
+                "started_at FLOAT, finished_at FLOAT)"
+            )
+            await conn.exec_driver_sql(
+                "INSERT INTO ai_jobs (id, kind, key, owner, priority, params, status, attempts, created_at) VALUES "
+                "('a', 'fridge', 'k1', 'user:1', 0, '{}', 'running', 1, 1), ('b', 'fridge', 'k1', 'user:2', 0, '{}', 'queued', 0, 2), "
+                "('c', 'fridge', 'k1', 'user:3', 0, '{}', 'done', 1, 0)"
+            )
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(run_migrations)
+            statuses = (await conn.exec_driver_sql("SELECT id, status FROM ai_jobs ORDER BY id")).all()
+            indexes = await conn.run_sync(lambda c: {i["name"]: i["unique"] for i in inspect(c).get_indexes("ai_jobs")})
+        await engine.dispose()
+        assert [tuple(row) for row in statuses] == [("a", "running"), ("b", "failed"), ("c", "done")]
+        assert indexes["ix_ai_jobs_active_key"]
+    
+    @pytest.mark.asyncio
+    async def test_meal_items_are_moved_out_of_json(self, tmp_path, monkeypatch):
+        from sqlalchemy import inspect
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel import SQLModel
+        import migrations
+        
+        monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 2)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TABLE meal_logs (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, logged_at DATETIME NOT NULL, "
+                "meal_type VARCHAR NOT NULL, items VARCHAR NOT NULL, calories_total INTEGER NOT NULL, "
+                "protein_total FLOAT NOT NULL, carbs_total FLOAT NOT NULL, fats_total FLOAT NOT NULL, notes VARCHAR, "
+                "photo_url VARCHAR, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+            )
+            for n in range(5):
+                items = json.dumps([
+                    {"food_name": "Dal", "grams": 200, "calories": 230, "protein_g": 12, "carbs_g": 30, "fats_g": 4},
+                    {"food_name": f"Roti {n}", "quantity": "2 pieces", "calories": 240, "protein_g": 8, "carbs_g": 40, "fats_g": 6},
+                ][:n % 3])
+                await conn.exec_driver_sql(
+                    "INSERT INTO meal_logs (user_id, logged_at, meal_type, items, calories_total, protein_total, carbs_total, "
+                    f"fats_total, created_at, updated_at) VALUES (1, '2025-01-0{n + 1} 08:00:00', 'lunch', '{items}', "
+                    "0, 0, 0, 0, '2025-01-01', '2025-01-01')"
+                )
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(migrations.run_migrations)
+            
+            columns = await conn.run_sync(lambda c: [col["name"] for col in inspect(c).get_columns("meal_logs")])
+            rows = (await conn.exec_driver_sql(
+                "SELECT meal_id, position, food_name, label, grams, quantity, logged_at FROM meal_items ORDER BY meal_id, position"
+            )).all()
+        await engine.dispose()
+        assert "items" not in columns
+        # Meals 1 and 4 had no items, 2 and 5 one, 3 two
+        assert [(r.meal_id, r.position) for r in rows] == [(2, 0), (3, 0), (3, 1), (5, 0)]
+        assert (rows[0].food_name, rows[0].grams, rows[0].logged_at) == ("dal", 200, "2025-01-02 08:00:00")
+        assert (rows[2].label, rows[2].food_name, rows[2].quantity) == ("Roti 2", "roti 2", "2 pieces")
+
+
+class TestQueryPlans:
+    """Every query issued by the user-facing routes is answered from an index"""
+    
+    @pytest.mark.asyncio
+    async def test_route_queries_do_not_scan_tables(self, tmp_path):
+        import re
+        from datetime import date, datetime, timezone
+        from fastapi import HTTPException
+        from sqlalchemy import Select, event
+        from sqlalchemy.exc import StatementError
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlmodel import SQLModel, select
+        from migrations import run_migrations
+        from models.favorite import FavoriteCreate
+        from models.goal import GoalCreate
+        from models.recipe_counts import RecipeCounts  # noqa: F401  (registers the table)
+        from models.user import User
+        from routes import admin, auth, dashboard, favorites, goals, history, meals
+        
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(run_migrations)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with session_factory() as session:
+            now = datetime.now(timezone.utc)
+            session.add(User(email="plans@example.com", hashed_password="", is_admin=True, created_at=now, updated_at=now))
+            await session.commit()
+        
+        statements = {}
+        
+        def capture(conn, clauseelement, multiparams, params, execution_options):
+            # Compiled here rather than at the cursor, so statements whose parameters fail to bind still count
+            if isinstance(clauseelement, Select):
+                compiled = clauseelement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+                statements[str(compiled)] = len(compiled.positiontup or ())
+        
+        async with session_factory() as session:
+            user = (await session.execute(select(User))).scalar_one()
+            session.expunge(user)  # stays loaded across the rollbacks below
+            event.listen(engine.sync_engine, "before_execute", capture)
+            calls = [
+                meals.get_today_meals(current_user=user, session=session),
+                meals.get_meals(date_filter=date.today(), limit=20, current_user=user, session=session),
+                meals.get_meals(date_filter=None, limit=20, current_user=user, session=session),
+                meals.delete_meal(meal_id=1, current_user=user, session=session),
+                meals.get_top_foods(days=30, limit=10, current_user=user, session=session),
+                meals.get_food_intake(food_name="paneer", days=30, current_user=user, session=session),
+                dashboard.get_today_dashboard(current_user=user, session=session),
+                dashboard.get_nutrition_trends(days=7, current_user=user, session=session),
+                goals.get_goals(active_only=True, current_user=user, session=session),
+                goals.get_goals(active_only=False, current_user=user, session=session),
+                goals.create_goal(GoalCreate(kind="calorie", target_value=2000), current_user=user, session=session),
+                goals.get_goal_progress(current_user=user, session=session),
+                goals.delete_goal(goal_id=99, current_user=user, session=session),
+                favorites.get_favorites(current_user=user, session=session),
+                favorites.check_favorite(recipe_id="dal", current_user=user, session=session),
+                favorites.add_favorite(FavoriteCreate(recipe_id="dal", recipe_name="Dal"), current_user=user, session=session),
+                favorites.remove_favorite(favorite_id=99, current_user=user, session=session),
+                favorites.remove_favorite_by_recipe(recipe_id="rice", current_user=user, session=session),
+                history.get_history(limit=20, offset=0, session=session),
+                history.get_insights(days=7, session=session),
+                history.get_recipe_counts(recipe_id="dal", session=session),
+                auth.get_current_profile(current_user=user, session=session),
+                admin.get_admin_stats(admin=user, session=session),
+                admin.list_users(limit=50, offset=0, admin=user, session=session),
+            ]
+            for call in calls:
+                try:
+                    await call
+                except (HTTPException, StatementError):
+                    await session.rollback()  # not found, or a rejected parameter, after the statement was captured
+        event.remove(engine.sync_engine, "before_execute", capture)
+        
+        full_scans = []
+        async with engine.connect() as conn:
+            for statement, placeholders in statements.items():
+                plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", (None,) * placeholders)
+                for row in plan:
+                    if re.fullmatch(r"SCAN (TABLE )?\w+( AS \w+)?", row[-1]):
+                        full_scans.append((row[-1], " ".join(statement.split())))
+        await engine.dispose()
+        assert len(statements) > 20
+        assert full_scans == []
+
+# ============= BACKUP GENERATOR TESTS =============
+
+class TestBackupGenerator:
+    """Test adapting the closest catalog recipe when the AI is unavailable"""
+    
+    def test_exact_catalog_match_is_kept(self):
+        from services.backup_generator import generate_backup_recipe
+        
+        base = catalog.recipe_by_id["fl-grilled-chicken-salad"]
+        recipe = generate_backup_recipe(list(base["required_ingredients"]), servings=3)
+        assert recipe.id == "backup-fl-grilled-chicken-salad"
+        assert recipe.name == base["name"] and recipe.steps == list(base["steps"])
+        assert recipe.nutrition == Nutrition(**base["nutrition"])
+        assert recipe.servings == 3
+    
+    def test_substitutes_and_recomputes_nutrition(self):
+        from services.backup_generator import generate_backup_recipe
+        
+        recipe = generate_backup_recipe(["paneer", "lettuce", "cucumber", "olive oil", "lemon"])
+        assert recipe.name == "Grilled Paneer Salad" and recipe.diet == "veg"
+        assert "paneer" in recipe.required_ingredients and "chicken breast" not in recipe.required_ingredients
+        assert any("paneer" in step for step in recipe.steps)
+        assert "chicken breast" in recipe.cooking_impact
+        # Paneer is fattier and lower in protein than chicken breast
+        base = catalog.recipe_by_id["fl-grilled-chicken-salad"]["nutrition"]
+        assert recipe.nutrition.fats_g > base["fats_g"] and recipe.nutrition.protein_g < base["protein_g"]
+    
+    def test_respects_diet_and_is_deterministic(self):
+        from services.backup_generator import generate_backup_recipe
+        
+        ingredients = normalizer.parse_input("tofu, broccoli, rice, garlic")
+        first = generate_backup_recipe(ingredients, diet="veg")
+        assert first.model_dump() == generate_backup_recipe(ingredients, diet="veg").model_dump()
+        assert first.diet == "veg"
+        base_id = first.id.removeprefix("backup-")
+        assert catalog.recipe_by_id[base_id]["diet"] == "veg"
+        
+        # Non-veg ingredients are not substituted or folded into a veg recipe
+        veg = generate_backup_recipe(["chicken", "rice"], diet="veg")
+        assert veg.diet == "veg" and not any("chicken" in i for i in veg.required_ingredients)
+    
+    def test_swaps_rewrite_aliases_in_name_and_steps(self):
+        from services.backup_generator import generate_backup_recipe
+        
+        # Rajma Chawal with chicken: "rajma" is an alias of kidney beans
+        recipe = generate_backup_recipe(["chicken", "rice", "onion", "tomato"])
+        assert recipe.id == "backup-in-rajma"
+        text = " ".join([recipe.name] + recipe.steps).lower()
+        assert "rajma" not in text and "beans" not in text and "chicken breast" in recipe.name.lower()
+    
+    def test_unknown_ingredients_are_folded_in(self):
+        from services.backup_generator import generate_backup_recipe
+        
+        recipe = generate_backup_recipe(["dragonfruit", "quinoa"])
+        assert {"dragonfruit", "quinoa"} <= set(recipe.required_ingredients)
+        assert any("dragonfruit" in step for step in recipe.steps)
 
 
 # ============= MODEL VALIDATION TESTS =============
@@ -3,9 +3,12 @@ Test Suite for Auth, Dashboard, Meals, Favorites, Goals, and Admin APIs
 Run: python -m pytest tests/test_dashboard.py -v
 """
 import pytest
+import pytest_asyncio
+import asyncio
 from httpx import AsyncClient, ASGITransport
 from unittest.mock import patch
 import json
+from types import SimpleNamespace
 
 from main import app
 from services.auth_service import get_password_hash
@@ -112,6 +115,265 @@ class TestAuth:
             assert response.status_code == 401
 
 
+
+class TestClerkAuth:
+    """Test Clerk token verification against a cached JWKS"""
+    
+    @pytest.fixture(autouse=True)
+    def no_claims_cache(self, monkeypatch):
+        from services import clerk_auth
+        monkeypatch.setattr(clerk_auth, "claims_cache", clerk_auth.ClaimsCache(max_entries=0))
+    
+    @pytest.mark.asyncio
+    async def test_keys_are_downloaded_once(self, jwks_server, monkeypatch):
+        from services import clerk_auth
+        
+        monkeypatch.setattr(clerk_auth, "jwks_cache", clerk_auth.JWKSCache())
+        token = jwks_server.token("key-1")
+        for _ in range(5):
+            assert (await clerk_auth.verify_clerk_token(token))["sub"] == "user_test"
+        assert jwks_server.requests == 1
+        assert clerk_auth.jwks_cache.snapshot()["hits"] == 4
+        
+        # Concurrent first requests share one download
+        monkeypatch.setattr(clerk_auth, "jwks_cache", clerk_auth.JWKSCache())
+        jwks_server.delay = 0.05
+        await asyncio.gather(*[clerk_auth.verify_clerk_token(token) for _ in range(10)])
+        assert jwks_server.requests == 2
+    
+    @pytest.mark.asyncio
+    async def test_unknown_kid_refreshes_at_most_once_per_interval(self, jwks_server, monkeypatch):
+        from fastapi import HTTPException
+        from services import clerk_auth
+        
+        now = [1000.0]
+        monkeypatch.setattr(clerk_auth, "time", SimpleNamespace(time=lambda: now[0]))
+        monkeypatch.setattr(clerk_auth, "jwks_cache", clerk_auth.JWKSCache(ttl=3600, min_refresh_interval=30))
+        await clerk_auth.verify_clerk_token(jwks_server.token("key-1"))
+        
+        # Rotated key: one refresh picks it up
+        now[0] += 31
+        jwks_server.add_key("key-2")
+        assert await clerk_auth.verify_clerk_token(jwks_server.token("key-2"))
+        assert jwks_server.requests == 2
+        
+        # Kids the issuer does not have are rejected without a download per request
+        jwks_server.add_key("key-3")
+        forged = jwks_server.token("key-3")
+        del jwks_server.keys["key-3"]
+        for _ in range(3):
+            now[0] += 5
+            with pytest.raises(HTTPException):
+                await clerk_auth.verify_clerk_token(forged)
+        assert jwks_server.requests == 2
+        assert clerk_auth.jwks_cache.stats["unknown_kid"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_previous_keys(self, jwks_server, monkeypatch):
+        from services import clerk_auth
+        
+        now = [1000.0]
+        monkeypatch.setattr(clerk_auth, "time", SimpleNamespace(time=lambda: now[0]))
+        cache = clerk_auth.JWKSCache(ttl=100, min_refresh_interval=30)
+        monkeypatch.setattr(clerk_auth, "jwks_cache", cache)
+        token = jwks_server.token("key-1")
+        await clerk_auth.verify_clerk_token(token)
+        
+        # Keys expired and the issuer is down: the old keys keep working
+        jwks_server.fail = True
+        now[0] += 200
+        assert await clerk_auth.verify_clerk_token(token)
+        now[0] += 10
+        assert await clerk_auth.verify_clerk_token(token)  # no retry within the interval
+        assert jwks_server.requests == 2
+        now[0] += 30
+        assert await clerk_auth.verify_clerk_token(token)
+        assert jwks_server.requests == 3
+        assert cache.stats["refresh_errors"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_issuer_allow_list(self, jwks_server, monkeypatch):
+        from fastapi import HTTPException
+        from services import clerk_auth
+        
+        monkeypatch.setattr(clerk_auth, "jwks_cache", clerk_auth.JWKSCache())
+        monkeypatch.setattr(clerk_auth, "CLERK_ISSUERS", frozenset({"https://clerk.example.com"}))
+        with pytest.raises(HTTPException):
+            await clerk_auth.verify_clerk_token(jwks_server.token("key-1"))
+        assert jwks_server.requests == 0
+        
+        monkeypatch.setattr(clerk_auth, "CLERK_ISSUERS", frozenset({jwks_server.issuer}))
+        assert await clerk_auth.verify_clerk_token(jwks_server.token("key-1"))
+    
+    @pytest.mark.asyncio
+    async def test_verified_claims_are_cached_until_expiry(self, jwks_server, monkeypatch):
+        import time
+        from services import clerk_auth
+        
+        now = [time.time()]
+        monkeypatch.setattr(clerk_auth, "time", SimpleNamespace(time=lambda: now[0]))
+        monkeypatch.setattr(clerk_auth, "jwks_cache", clerk_auth.JWKSCache())
+        cache = clerk_auth.ClaimsCache(max_entries=2, skew=5)
+        monkeypatch.setattr(clerk_auth, "claims_cache", cache)
+        
+        token = jwks_server.token("key-1", exp=int(now[0]) + 60)
+        claims = await clerk_auth.verify_clerk_token(token)
+        claims["sub"] = "tampered"
+        for _ in range(3):
+            assert (await clerk_auth.verify_clerk_token(token))["sub"] == "user_test"
+        assert cache.stats["hits"] == 3
+        assert clerk_auth.jwks_cache.stats["hits"] == 0  # no signature checks
+        
+        # Dropped just before exp (less the skew), then verified again
+        now[0] += 56
+        await clerk_auth.verify_clerk_token(token)
+        assert cache.stats["expired"] == 1 and clerk_auth.jwks_cache.stats["hits"] == 1
+        
+        # Not cached past its expiry; others are bounded by LRU eviction
+        assert cache.snapshot()["entries"] == 0
+        for n in range(3):
+            await clerk_auth.verify_clerk_token(jwks_server.token("key-1", sub=f"user_{n}"))
+        assert cache.snapshot()["entries"] == 2 and cache.stats["evictions"] == 1
+
+
+@pytest_asyncio.fixture
+async def user_session_factory(session_factory):
+    """Session factory with the users and user_profiles tables in a throwaway database"""
+    from models.user import User, UserProfile
+    return await session_factory(User, UserProfile)
+
+
+@pytest_asyncio.fixture
+async def meal_session_factory(session_factory):
+    """Session factory with the meal logging tables in a throwaway database"""
+    from models.user import User, UserProfile
+    from models.meal_log import MealLog, MealLogItem
+    from models.daily_nutrition import DailyNutrition
+    from models.goal import Goal
+    return await session_factory(User, UserProfile, MealLog, MealLogItem, DailyNutrition, Goal)
+
+
+class TestClerkUsers:
+    """Test resolving Clerk identities to user rows"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_identity_cache(self, monkeypatch, user_session_factory):
+        from services import clerk_auth
+        monkeypatch.setattr(
+            clerk_auth, "identity_cache", clerk_auth.IdentityCache(ttl=60, session_factory=user_session_factory)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_first_requests_create_one_user(self, user_session_factory):
+        from sqlmodel import select, func
+        from models.user import User, UserProfile
+        from services import clerk_auth
+        
+        payload = {"sub": "user_abc", "email": "abc@example.com"}
+        async def resolve():
+            async with user_session_factory() as session:
+                return await clerk_auth.get_user_from_clerk_token(session, payload)
+        
+        users = await asyncio.gather(*[resolve() for _ in range(5)])
+        assert len({u.id for u in users}) == 1 and users[0].clerk_id == "user_abc"
+        async with user_session_factory() as session:
+            assert (await session.execute(select(func.count(User.id)))).scalar_one() == 1
+            assert (await session.execute(select(func.count(UserProfile.id)))).scalar_one() == 1
+        assert clerk_auth.identity_cache.stats["created"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_cached_identity_skips_lookup(self, user_session_factory):
+        from sqlalchemy import event
+        from models.user import User
+        from services import clerk_auth
+        
+        payload = {"sub": "user_cached", "email": "cached@example.com"}
+        async with user_session_factory() as session:
+            await clerk_auth.get_user_from_clerk_token(session, payload)
+        
+        statements = []
+        async with user_session_factory() as session:
+            event.listen(session.sync_session, "do_orm_execute", lambda state: statements.append(state.statement))
+            user = await clerk_auth.get_user_from_clerk_token(session, payload)
+            assert statements == [] and clerk_auth.identity_cache.stats["hits"] == 1
+            
+            # Still a persistent row in this session
+            user.is_admin = True
+            await session.commit()
+        async with user_session_factory() as session:
+            assert (await session.get(User, user.id)).is_admin is True
+    
+    @pytest.mark.asyncio
+    async def test_existing_email_user_is_linked(self, user_session_factory):
+        from datetime import datetime, timezone
+        from models.user import User
+        from services import clerk_auth
+        
+        async with user_session_factory() as session:
+            now = datetime.now(timezone.utc)
+            session.add(User(email="old@example.com", hashed_password="x", created_at=now, updated_at=now))
+            await session.commit()
+            user = await clerk_auth.get_user_from_clerk_token(session, {"sub": "user_old", "email": "old@example.com"})
+            assert user.clerk_id == "user_old" and clerk_auth.identity_cache.stats["linked"] == 1
+            
+            # The email now belongs to another Clerk user
+            assert await clerk_auth.get_user_from_clerk_token(session, {"sub": "user_new", "email": "old@example.com"}) is None
+    
+    @pytest.mark.asyncio
+    async def test_clerk_id_is_added_by_migration(self, tmp_path):
+        from sqlalchemy import inspect
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel import SQLModel
+        from migrations import run_migrations
+        
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL, "
+                "is_active BOOLEAN, is_verified BOOLEAN, is_admin BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+            )
+            await conn.run_sync(SQLModel.metadata.create_all)
+            assert "users_clerk_id" in await conn.run_sync(run_migrations)
+            columns = await conn.run_sync(lambda c: [col["name"] for col in inspect(c).get_columns("users")])
+            indexes = await conn.run_sync(lambda c: {i["name"]: i["unique"] for i in inspect(c).get_indexes("users")})
+        await engine.dispose()
+        assert "clerk_id" in columns
+        assert indexes["ix_users_clerk_id"]
+
+# ============= DAY WINDOW TESTS =============
+
+class TestDayWindow:
+    """Test local day windows in services/day_window.py"""
+    
+    def test_windows_are_local_midnights_in_utc(self):
+        from datetime import date, datetime, timezone
+        from services.day_window import day_window, get_timezone, local_day
+        
+        kolkata = get_timezone("Asia/Kolkata")
+        start, end = day_window(date(2025, 6, 1), kolkata)
+        assert (start, end) == (datetime(2025, 5, 31, 18, 30, tzinfo=timezone.utc), datetime(2025, 6, 1, 18, 30, tzinfo=timezone.utc))
+        assert local_day(datetime(2025, 5, 31, 20, 0), kolkata) == date(2025, 6, 1)
+        
+        # The spring-forward day in New York has 23 hours
+        start, end = day_window(date(2025, 3, 9), get_timezone("America/New_York"))
+        assert (end - start).total_seconds() == 23 * 3600
+        assert get_timezone("Not/AZone").key == "UTC"
+    
+    def test_offset_changes_find_dst_transitions(self):
+        from datetime import datetime, timezone
+        from services.day_window import get_timezone, offset_changes
+        
+        changes = offset_changes(
+            get_timezone("America/New_York"),
+            datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 12, 31, tzinfo=timezone.utc)
+        )
+        assert changes == [
+            (datetime(2025, 3, 9, 7, 0, tzinfo=timezone.utc), -300),
+            (datetime(2025, 11, 2, 6, 0, tzinfo=timezone.utc), -240),
+            (None, -300),
+        ]
+
+
 # ============= DASHBOARD TESTS =============
 
 class TestDashboard:
@@ -207,6 +469,152 @@ class TestMeals:
                 "items": []
             })
             assert response.status_code == 401
+    
+    @pytest.mark.asyncio
+    async def test_items_are_stored_per_food(self, meal_session_factory):
+        from datetime import datetime, timedelta, timezone
+        from sqlmodel import select
+        from models.user import User
+        from models.meal_log import MealLogItem, MealLogCreate
+        from routes import meals
+        
+        now = datetime.now(timezone.utc)
+        async with meal_session_factory() as session:
+            user = User(email="foods@example.com", hashed_password="", created_at=now, updated_at=now)
+            session.add(user)
+            await session.commit()
+            
+            async def log(days_ago, *items):
+                meal = MealLogCreate(logged_at=now - timedelta(days=days_ago), items=[
+                    {"food_name": name, "grams": grams, "calories": calories, "protein_g": 1, "carbs_g": 1, "fats_g": 1}
+                    for name, grams, calories in items
+                ])
+                return await meals.log_meal(meal, current_user=user, session=session)
+            
+            first = await log(1, ("Paneer", 100, 265), ("Rice", 150, 195))
+            await log(2, ("paneer ", 50, 132))
+            await log(60, ("Paneer", 200, 530))  # outside the window
+            assert [item["food_name"] for item in first.items] == ["Paneer", "Rice"]
+            assert first.calories_total == 460
+            
+            paneer = await meals.get_food_intake("PANEER", days=30, current_user=user, session=session)
+            assert (paneer.food_name, paneer.times_logged, paneer.grams, paneer.calories) == ("paneer", 2, 150, 397)
+            top = await meals.get_top_foods(days=30, limit=10, current_user=user, session=session)
+            assert [food.food_name for food in top] == ["paneer", "rice"]
+            
+            listed = await meals.get_meals(date_filter=None, limit=20, current_user=user, session=session)
+            assert [m.items for m in listed if m.id == first.id] == [first.items]
+            
+            await meals.delete_meal(first.id, current_user=user, session=session)
+            remaining = (await session.execute(select(MealLogItem.meal_id))).scalars().all()
+            assert first.id not in remaining and len(remaining) == 2
+    
+    @pytest.mark.asyncio
+    async def test_daily_rollups_follow_meal_writes(self, meal_session_factory):
+        from datetime import datetime, timedelta, timezone
+        from sqlmodel import select
+        from models.user import User
+        from models.meal_log import MealLogCreate
+        from models.daily_nutrition import DailyNutrition
+        from routes import dashboard, goals, meals
+        from services.daily_nutrition import daily_nutrition
+        
+        now = datetime.now(timezone.utc)
+        async with meal_session_factory() as session:
+            user = User(email="rollups@example.com", hashed_password="", created_at=now, updated_at=now)
+            session.add(user)
+            await session.commit()
+            
+            async def log(days_ago, calories, protein):
+                meal = MealLogCreate(logged_at=now - timedelta(days=days_ago), items=[
+                    {"food_name": "Dal", "calories": calories, "protein_g": protein, "carbs_g": 10, "fats_g": 2.1}
+                ])
+                return await meals.log_meal(meal, current_user=user, session=session)
+            
+            breakfast = await log(0, 300, 12.1)
+            await log(0, 500, 20.2)
+            await log(3, 700, 30)
+            
+            today = await meals.get_today_meals(current_user=user, session=session)
+            assert (today.calories_total, today.protein_total, today.meals_count, len(today.meals)) == (800, 32.3, 2, 2)
+            progress = await goals.get_goal_progress(current_user=user, session=session)
+            assert progress.daily_calories == 800
+            trends = await dashboard.get_nutrition_trends(days=7, current_user=user, session=session)
+            assert [d["calories"] for d in trends["daily"]] == [0, 0, 0, 700, 0, 0, 800]
+            assert (trends["total_meals"], trends["active_days"]) == (3, 2)
+            
+            await meals.delete_meal(breakfast.id, current_user=user, session=session)
+            today = await meals.get_today_meals(current_user=user, session=session)
+            assert (today.calories_total, today.protein_total, today.meals_count) == (500, 20.2, 1)
+            
+            # A rebuild from meal_logs gives the same rows
+            select_rows = select(DailyNutrition).order_by(DailyNutrition.day)
+            incremental = [r.model_dump() for r in (await session.execute(select_rows)).scalars()]
+            await (await session.connection()).run_sync(daily_nutrition.rebuild)
+            session.expire_all()
+            assert [r.model_dump() for r in (await session.execute(select_rows)).scalars()] == incremental
+            assert len(incremental) == 2
+            
+            # Totals with more than 2 decimals are stored rounded, the same way by both paths
+            await session.refresh(user)
+            await log(1, 100, 12.3456)
+            await log(1, 100, 12.3456)
+            incremental = [r.model_dump() for r in (await session.execute(select_rows)).scalars()]
+            assert [r["protein_g"] for r in incremental] == [30, 24.7, 20.2]
+            await (await session.connection()).run_sync(daily_nutrition.rebuild)
+            session.expire_all()
+            assert [r.model_dump() for r in (await session.execute(select_rows)).scalars()] == incremental
+    
+    @pytest.mark.asyncio
+    async def test_days_follow_user_timezone(self, meal_session_factory):
+        from datetime import date, datetime, timedelta, timezone
+        from sqlmodel import select
+        from models.user import User, UserProfile, UserProfileUpdate
+        from models.meal_log import MealLogCreate
+        from models.daily_nutrition import DailyNutrition
+        from routes import auth, meals
+        from services.daily_nutrition import daily_nutrition
+        from services.day_window import day_window, get_timezone, local_today
+        
+        now = datetime.now(timezone.utc)
+        async with meal_session_factory() as session:
+            user = User(email="tz@example.com", hashed_password="", created_at=now, updated_at=now)
+            session.add(user)
+            await session.flush()
+            session.add(UserProfile(user_id=user.id, timezone="America/New_York", created_at=now, updated_at=now))
+            await session.commit()
+            
+            async def log(logged_at, calories):
+                meal = MealLogCreate(logged_at=logged_at, items=[
+                    {"food_name": "Dal", "calories": calories, "protein_g": 1, "carbs_g": 1, "fats_g": 1}
+                ])
+                return await meals.log_meal(meal, current_user=user, session=session)
+            
+            # Around the spring-forward change: 03:30 UTC on the 9th is still the 8th in New York
+            await log(datetime(2025, 3, 8, 12, 0, tzinfo=timezone.utc), 100)
+            await log(datetime(2025, 3, 9, 3, 30, tzinfo=timezone.utc), 200)
+            await log(datetime(2025, 3, 9, 12, 0, tzinfo=timezone.utc), 400)
+            await log(datetime(2025, 3, 10, 3, 30, tzinfo=timezone.utc), 800)  # 23:30 on the 9th (EDT)
+            
+            # Just before and after the user's local midnight today
+            start, _ = day_window(local_today(get_timezone("America/New_York")), get_timezone("America/New_York"))
+            await log(start - timedelta(minutes=1), 1000)
+            await log(start + timedelta(seconds=1), 2000)
+            
+            select_rows = select(DailyNutrition.day, DailyNutrition.calories).order_by(DailyNutrition.day)
+            incremental = (await session.execute(select_rows)).all()
+            assert incremental[:2] == [(date(2025, 3, 8), 300), (date(2025, 3, 9), 1200)]
+            today = await meals.get_today_meals(current_user=user, session=session)
+            assert (today.calories_total, today.meals_count, len(today.meals)) == (2000, 1, 1)
+            
+            # SQL GROUP BY on the local date gives the same rows
+            await (await session.connection()).run_sync(daily_nutrition.rebuild)
+            assert (await session.execute(select_rows)).all() == incremental
+            
+            # Moving to Kolkata (UTC+5:30) re-buckets the user's meals
+            await auth.update_profile(UserProfileUpdate(timezone="Asia/Kolkata"), current_user=user, session=session)
+            moved = (await session.execute(select_rows)).all()
+            assert moved[:3] == [(date(2025, 3, 8), 100), (date(2025, 3, 9), 600), (date(2025, 3, 10), 800)]
 
 
 # ============= FAVORITES TESTS =============